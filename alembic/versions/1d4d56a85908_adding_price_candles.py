@@ -0,0 +1,69 @@
+"""Adding price candles
+
+Revision ID: 1d4d56a85908
+Revises: 847f66bc53b8
+Create Date: 2026-10-18 12:12:11.849695
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1d4d56a85908"
+down_revision: Union[str, None] = "847f66bc53b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Open / high / low / close of every stock per minute, hour and day,
+    # updated by every tick as it is written (see src/api/candles.py)
+    op.create_table(
+        "price_candles",
+        sa.Column(
+            "stock_id", sa.Integer, sa.ForeignKey("stocks.stock_id"), nullable=False
+        ),
+        sa.Column("resolution", sa.String, nullable=False),
+        sa.Column("bucket", sa.TIMESTAMP, nullable=False),
+        sa.Column("open", sa.Numeric(10, 2), nullable=False),
+        sa.Column("high", sa.Numeric(10, 2), nullable=False),
+        sa.Column("low", sa.Numeric(10, 2), nullable=False),
+        sa.Column("close", sa.Numeric(10, 2), nullable=False),
+        sa.Column("tick_count", sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint("stock_id", "resolution", "bucket"),
+        sa.CheckConstraint(
+            "resolution IN ('1m', '1h', '1d')", name="ck_price_candles_resolution"
+        ),
+    )
+    # Every tick rewrites the open candles; free space on each page lets those
+    # updates stay on the page (HOT) without touching the primary key
+    op.execute("ALTER TABLE price_candles SET (fillfactor = 70)")
+
+    # Backfill from the ticks recorded so far
+    op.execute(
+        """
+        INSERT INTO price_candles (stock_id, resolution, bucket, open, high, low, close, tick_count)
+        SELECT
+            h.stock_id,
+            r.resolution,
+            date_trunc(r.unit, h.ts),
+            (array_agg(h.price ORDER BY h.ts))[1],
+            MAX(h.price),
+            MIN(h.price),
+            (array_agg(h.price ORDER BY h.ts DESC))[1],
+            COUNT(*)
+        FROM price_history h
+        CROSS JOIN (VALUES ('1m', 'minute'), ('1h', 'hour'), ('1d', 'day')) AS r (resolution, unit)
+        GROUP BY h.stock_id, r.resolution, date_trunc(r.unit, h.ts)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("price_candles")
@@ -0,0 +1,86 @@
+"""Adding sell triggers
+
+Revision ID: 2871ec303cc6
+Revises: c163324dad2e
+Create Date: 2026-10-18 11:24:52.652990
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2871ec303cc6"
+down_revision: Union[str, None] = "c163324dad2e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stop-loss and take-profit sells on holdings. Nothing is escrowed; a
+    # trigger sells what is left of its num_shares when it fires.
+    op.create_table(
+        "sell_triggers",
+        sa.Column("trigger_id", sa.BigInteger, primary_key=True, autoincrement=True),
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "port_id",
+            sa.Integer,
+            sa.ForeignKey("portfolios.port_id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "stock_id", sa.Integer, sa.ForeignKey("stocks.stock_id"), nullable=False
+        ),
+        sa.Column("kind", sa.String(11), nullable=False),
+        sa.Column("trigger_price", sa.Numeric(10, 2), nullable=False),
+        sa.Column("num_shares", sa.Numeric(20, 2), nullable=False),
+        sa.Column("status", sa.String(9), nullable=False, server_default="active"),
+        sa.Column("fill_price", sa.Numeric(10, 2), nullable=True),
+        sa.Column("num_sold", sa.Numeric(20, 2), nullable=True),
+        sa.Column(
+            "created_at", sa.TIMESTAMP, nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column("closed_at", sa.TIMESTAMP, nullable=True),
+        sa.CheckConstraint(
+            "kind IN ('stop_loss', 'take_profit')", name="ck_sell_triggers_kind"
+        ),
+        sa.CheckConstraint(
+            "status IN ('active', 'triggered', 'cancelled')",
+            name="ck_sell_triggers_status",
+        ),
+    )
+    # The trigger index: active triggers of each kind sorted by price within a
+    # stock, so a tick reads only the range its new price crossed
+    op.create_index(
+        "ix_sell_triggers_stop_loss",
+        "sell_triggers",
+        ["stock_id", "trigger_price"],
+        postgresql_where=sa.text("status = 'active' AND kind = 'stop_loss'"),
+    )
+    op.create_index(
+        "ix_sell_triggers_take_profit",
+        "sell_triggers",
+        ["stock_id", "trigger_price"],
+        postgresql_where=sa.text("status = 'active' AND kind = 'take_profit'"),
+    )
+    op.create_index(
+        "ix_sell_triggers_port_id", "sell_triggers", ["port_id", "trigger_id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_sell_triggers_port_id", table_name="sell_triggers")
+    op.drop_index("ix_sell_triggers_take_profit", table_name="sell_triggers")
+    op.drop_index("ix_sell_triggers_stop_loss", table_name="sell_triggers")
+    op.drop_table("sell_triggers")
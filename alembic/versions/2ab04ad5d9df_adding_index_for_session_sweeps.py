@@ -0,0 +1,37 @@
+"""Adding index for session sweeps
+
+Revision ID: 2ab04ad5d9df
+Revises: 4847abf3b636
+Create Date: 2026-10-18 10:40:30.118863
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2ab04ad5d9df"
+down_revision: Union[str, None] = "4847abf3b636"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lets the session sweeper find expired rows without scanning the whole table
+    op.create_index(
+        "ix_temp_user_tokens_generated_at", "temp_user_tokens", ["generated_at"]
+    )
+    op.create_index(
+        "ix_revoked_session_tokens_expires_at", "revoked_session_tokens", ["expires_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_revoked_session_tokens_expires_at", table_name="revoked_session_tokens"
+    )
+    op.drop_index("ix_temp_user_tokens_generated_at", table_name="temp_user_tokens")
@@ -0,0 +1,83 @@
+"""Adding queued orders
+
+Revision ID: 3df01f932ff5
+Revises: 2871ec303cc6
+Create Date: 2026-10-18 11:34:16.655366
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3df01f932ff5"
+down_revision: Union[str, None] = "2871ec303cc6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Market orders submitted through /orders/submit, executed later by the
+    # order queue workers. The ticker is kept as given; an unknown one is
+    # rejected when the order runs, like a trade would be.
+    op.create_table(
+        "queued_orders",
+        sa.Column("order_id", sa.BigInteger, primary_key=True, autoincrement=True),
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "port_id",
+            sa.Integer,
+            sa.ForeignKey("portfolios.port_id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("side", sa.String(4), nullable=False),
+        sa.Column("stock_ticker", sa.String, nullable=False),
+        sa.Column("num_shares", sa.Numeric(20, 2), nullable=True),
+        sa.Column("dollars", sa.Numeric(15, 2), nullable=True),
+        sa.Column("status", sa.String(8), nullable=False, server_default="queued"),
+        sa.Column("shares_traded", sa.Numeric, nullable=True),
+        sa.Column("amount", sa.Numeric(20, 2), nullable=True),
+        sa.Column("transaction_id", sa.Integer, nullable=True),
+        sa.Column("detail", sa.String, nullable=True),
+        sa.Column(
+            "created_at", sa.TIMESTAMP, nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column("processed_at", sa.TIMESTAMP, nullable=True),
+        sa.CheckConstraint("side IN ('buy', 'sell')", name="ck_queued_orders_side"),
+        sa.CheckConstraint(
+            "status IN ('queued', 'filled', 'rejected')", name="ck_queued_orders_status"
+        ),
+        sa.CheckConstraint(
+            "(num_shares IS NULL) <> (dollars IS NULL)", name="ck_queued_orders_amount"
+        ),
+    )
+    # The queue itself: what is still waiting, oldest first (to pick the next
+    # portfolio) and per portfolio in submission order (to take its batch)
+    op.create_index(
+        "ix_queued_orders_queued",
+        "queued_orders",
+        ["order_id"],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.create_index(
+        "ix_queued_orders_port_id",
+        "queued_orders",
+        ["port_id", "order_id"],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_queued_orders_port_id", table_name="queued_orders")
+    op.drop_index("ix_queued_orders_queued", table_name="queued_orders")
+    op.drop_table("queued_orders")
@@ -0,0 +1,38 @@
+"""Adding version columns for optimistic trades
+
+Revision ID: 415ec6181519
+Revises: b15eec067cb1
+Create Date: 2026-10-18 11:05:54.667643
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "415ec6181519"
+down_revision: Union[str, None] = "b15eec067cb1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Bumped by every trade write; optimistic trades only write if the version they read is unchanged
+    op.add_column(
+        "portfolios",
+        sa.Column("version", sa.BigInteger, nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "portfolio_holdings",
+        sa.Column("version", sa.BigInteger, nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("portfolio_holdings", "version")
+    op.drop_column("portfolios", "version")
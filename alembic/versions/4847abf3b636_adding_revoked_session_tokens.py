@@ -0,0 +1,37 @@
+"""Adding revoked session tokens
+
+Revision ID: 4847abf3b636
+Revises: 80cecdbd8ece
+Create Date: 2026-10-18 10:37:09.844811
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4847abf3b636"
+down_revision: Union[str, None] = "80cecdbd8ece"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Revoked signed session tokens; rows are only needed until the token expires
+    op.create_table(
+        "revoked_session_tokens",
+        sa.Column("jti", sa.String, primary_key=True),
+        sa.Column("expires_at", sa.TIMESTAMP, nullable=False),
+        sa.Column(
+            "revoked_at", sa.TIMESTAMP, nullable=False, server_default=sa.func.now()
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("revoked_session_tokens")
@@ -0,0 +1,90 @@
+"""Adding price history
+
+Revision ID: 847f66bc53b8
+Revises: a0ff343076d9
+Create Date: 2026-10-18 12:09:15.525233
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "847f66bc53b8"
+down_revision: Union[str, None] = "a0ff343076d9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Every price a tick wrote, append-only, in one partition per day so old
+    # days are dropped whole instead of deleted row by row. No foreign key to
+    # stocks: it would be checked for every row of every tick.
+    op.create_table(
+        "price_history",
+        sa.Column("stock_id", sa.Integer, nullable=False),
+        sa.Column("ts", sa.TIMESTAMP, nullable=False),
+        sa.Column("price", sa.Numeric(10, 2), nullable=False),
+        postgresql_partition_by="RANGE (ts)",
+    )
+    op.create_index("ix_price_history_stock_id_ts", "price_history", ["stock_id", "ts"])
+
+    # Creates today's and tomorrow's partitions (price_history_YYYYMMDD) if
+    # missing and drops those older than keep_days (0 keeps all). Called by
+    # the price updater; the advisory lock serializes workers doing it at once.
+    op.execute(
+        """
+        CREATE FUNCTION maintain_price_history_partitions(keep_days integer) RETURNS integer
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            day date;
+            old_partition regclass;
+            dropped integer := 0;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('price_history'));
+
+            FOREACH day IN ARRAY ARRAY[CURRENT_DATE, CURRENT_DATE + 1] LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF price_history FOR VALUES FROM (%L) TO (%L)',
+                    'price_history_' || to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+            END LOOP;
+
+            IF keep_days > 0 THEN
+                FOR old_partition IN
+                    SELECT inhrelid::regclass
+                    FROM pg_inherits
+                    WHERE inhparent = 'price_history'::regclass
+                      AND to_date(right(inhrelid::regclass::text, 8), 'YYYYMMDD') < CURRENT_DATE - keep_days
+                LOOP
+                    EXECUTE format('DROP TABLE %s', old_partition);
+                    dropped := dropped + 1;
+                END LOOP;
+            END IF;
+
+            RETURN dropped;
+        END
+        $$
+        """
+    )
+
+    # Start every stock's history at its current price
+    op.execute("SELECT maintain_price_history_partitions(0)")
+    op.execute(
+        """
+        INSERT INTO price_history (stock_id, ts, price)
+        SELECT stock_id, LOCALTIMESTAMP, price_per_share
+        FROM stock_state
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION maintain_price_history_partitions(integer)")
+    op.drop_index("ix_price_history_stock_id_ts", table_name="price_history")
+    op.drop_table("price_history")
@@ -0,0 +1,72 @@
+"""Adding transaction totals
+
+Revision ID: 9b20887575cd
+Revises: 3df01f932ff5
+Create Date: 2026-10-18 11:38:37.865822
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b20887575cd"
+down_revision: Union[str, None] = "3df01f932ff5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Running buy / sell totals of the ledger per portfolio and stock, kept up
+    # to date by every statement that writes to transactions. One row per
+    # portfolio (not per user) so updating it never needs a lock beyond the
+    # portfolio lock those statements already hold.
+    op.create_table(
+        "transaction_totals",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("port_id", sa.Integer, nullable=True),
+        sa.Column(
+            "stock_id", sa.Integer, sa.ForeignKey("stocks.stock_id"), nullable=False
+        ),
+        sa.Column("bought", sa.Numeric(20, 2), nullable=False, server_default="0"),
+        sa.Column("sold", sa.Numeric(20, 2), nullable=False, server_default="0"),
+        sa.Column(
+            "transaction_count", sa.BigInteger, nullable=False, server_default="0"
+        ),
+    )
+    # Ledger rows from before portfolios existed have no port_id; they share
+    # one row per user and stock
+    op.create_index(
+        "ux_transaction_totals",
+        "transaction_totals",
+        ["user_id", "stock_id", "port_id"],
+        unique=True,
+        postgresql_nulls_not_distinct=True,
+    )
+
+    # Backfill from the existing ledger (python -m src.api.transaction_totals
+    # rebuilds it again later if needed)
+    op.execute(
+        """
+        INSERT INTO transaction_totals (user_id, port_id, stock_id, bought, sold, transaction_count)
+        SELECT
+            user_id,
+            port_id,
+            stock_id,
+            COALESCE(SUM(change) FILTER (WHERE transaction_type = 'buy'), 0),
+            COALESCE(SUM(change) FILTER (WHERE transaction_type = 'sell'), 0),
+            COUNT(*)
+        FROM transactions
+        GROUP BY user_id, port_id, stock_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_transaction_totals", table_name="transaction_totals")
+    op.drop_table("transaction_totals")
@@ -0,0 +1,43 @@
+"""Adding price model parameters
+
+Revision ID: a0ff343076d9
+Revises: 9b20887575cd
+Create Date: 2026-10-18 11:46:45.784715
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a0ff343076d9"
+down_revision: Union[str, None] = "9b20887575cd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Per-stock parameters of the price simulator, per price tick: the
+    # expected log return (drift) and its standard deviation (volatility).
+    # 0.02 moves a stock about as much as the old uniform +-5 step did.
+    op.add_column(
+        "stock_state", sa.Column("drift", sa.Double, nullable=False, server_default="0")
+    )
+    op.add_column(
+        "stock_state",
+        sa.Column("volatility", sa.Double, nullable=False, server_default="0.02"),
+    )
+    op.create_check_constraint(
+        "ck_stock_state_volatility", "stock_state", "volatility >= 0"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("ck_stock_state_volatility", "stock_state")
+    op.drop_column("stock_state", "volatility")
+    op.drop_column("stock_state", "drift")
@@ -0,0 +1,52 @@
+"""Adding idempotency keys
+
+Revision ID: b15eec067cb1
+Revises: 2ab04ad5d9df
+Create Date: 2026-10-18 11:03:36.237562
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b15eec067cb1"
+down_revision: Union[str, None] = "2ab04ad5d9df"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored responses of trade/portfolio requests sent with an Idempotency-Key;
+    # the session sweeper deletes rows older than IDEMPOTENCY_TTL_SECONDS
+    op.create_table(
+        "idempotency_keys",
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("idempotency_key", sa.String(255), primary_key=True),
+        sa.Column("endpoint", sa.String, nullable=False),
+        sa.Column("request_hash", sa.LargeBinary, nullable=False),
+        sa.Column("status_code", sa.SmallInteger, nullable=True),
+        sa.Column("response", postgresql.JSONB, nullable=True),
+        sa.Column(
+            "created_at", sa.TIMESTAMP, nullable=False, server_default=sa.func.now()
+        ),
+    )
+    op.create_index(
+        "ix_idempotency_keys_created_at", "idempotency_keys", ["created_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_idempotency_keys_created_at", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
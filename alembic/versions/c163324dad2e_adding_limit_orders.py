@@ -0,0 +1,73 @@
+"""Adding limit orders
+
+Revision ID: c163324dad2e
+Revises: 415ec6181519
+Create Date: 2026-10-18 11:11:09.163406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c163324dad2e"
+down_revision: Union[str, None] = "415ec6181519"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Resting limit orders. Placing one escrows its funds (buys) or shares
+    # (sells) in `reserved`; fills and cancels settle the escrow.
+    op.create_table(
+        "limit_orders",
+        sa.Column("order_id", sa.BigInteger, primary_key=True, autoincrement=True),
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "port_id",
+            sa.Integer,
+            sa.ForeignKey("portfolios.port_id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "stock_id", sa.Integer, sa.ForeignKey("stocks.stock_id"), nullable=False
+        ),
+        sa.Column("side", sa.String(4), nullable=False),
+        sa.Column("limit_price", sa.Numeric(10, 2), nullable=False),
+        sa.Column("num_shares", sa.Numeric(20, 2), nullable=False),
+        sa.Column("reserved", sa.Numeric(15, 2), nullable=False),
+        sa.Column("status", sa.String(9), nullable=False, server_default="open"),
+        sa.Column("fill_price", sa.Numeric(10, 2), nullable=True),
+        sa.Column(
+            "created_at", sa.TIMESTAMP, nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column("closed_at", sa.TIMESTAMP, nullable=True),
+        sa.CheckConstraint("side IN ('buy', 'sell')", name="ck_limit_orders_side"),
+        sa.CheckConstraint(
+            "status IN ('open', 'filled', 'cancelled')", name="ck_limit_orders_status"
+        ),
+    )
+    # Loading the order books only reads open orders
+    op.create_index(
+        "ix_limit_orders_open",
+        "limit_orders",
+        ["stock_id", "order_id"],
+        postgresql_where=sa.text("status = 'open'"),
+    )
+    op.create_index("ix_limit_orders_port_id", "limit_orders", ["port_id", "order_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_limit_orders_port_id", table_name="limit_orders")
+    op.drop_index("ix_limit_orders_open", table_name="limit_orders")
+    op.drop_table("limit_orders")
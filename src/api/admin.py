@@ -1,23 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import sqlalchemy
+from src import statements
 from sqlalchemy.orm import Session
 from src import database as db
 from src.database import SessionLocal
-from src.api import auth
+from src.api import (
+    auth,
+    candles,
+    group_commit,
+    hashing,
+    idempotency,
+    order_queue,
+    price_cache,
+    retry,
+    sessions,
+    signed_tokens,
+    sweeper,
+    transaction_totals,
+)
 
 router = APIRouter(
     tags=["admin"],
     dependencies=[Depends(auth.get_api_key)],
 )
 
+
 class AdminResetPortfolioRequest(BaseModel):
     session_token: str
 
+
 class AdminResetPortfolioResponse(BaseModel):
     message: str
     user_id: int
 
+
 def get_db():
     db_inst = SessionLocal()
     try:
@@ -26,8 +43,49 @@ def get_db():
         db_inst.close()
 
 
+# Same lock order as trade_engine: portfolios before portfolio_holdings
+LOCK_USER_PORTFOLIOS = statements.register(
+    "admin.lock_user_portfolios",
+    """
+    SELECT port_id FROM portfolios
+    WHERE user_id = :user_id
+    ORDER BY port_id
+    FOR UPDATE
+    """,
+)
+
+DELETE_USER_HOLDINGS = statements.register(
+    "admin.delete_user_holdings",
+    """
+    DELETE FROM portfolio_holdings 
+    WHERE port_id IN (SELECT port_id FROM portfolios WHERE user_id = :user_id)
+    """,
+)
+
+DELETE_USER_CURRENT_PORTFOLIO = statements.register(
+    "admin.delete_user_current_portfolio",
+    """
+    DELETE FROM user_current_portfolio
+    WHERE user_id = :user_id
+    """,
+)
+
+DELETE_USER_PORTFOLIOS = statements.register(
+    "admin.delete_user_portfolios",
+    """
+    DELETE FROM portfolios
+    WHERE user_id = :user_id
+    """,
+)
+
+
 @router.post("/reset_portfolios", response_model=AdminResetPortfolioResponse)
-def admin_reset_portfolios(request: AdminResetPortfolioRequest):
+@retry.on_conflict
+@idempotency.replayable
+async def admin_reset_portfolios(
+    request: AdminResetPortfolioRequest,
+    ctx: sessions.SessionContext = Depends(sessions.session_context),
+):
     """
     Admin endpoint to reset (delete) all portfolio information for a user.
     This deletes records from:
@@ -36,57 +94,232 @@ def admin_reset_portfolios(request: AdminResetPortfolioRequest):
       - portfolios (all portfolios belonging to the user)
     The user is identified via the provided session token.
     """
-    with db.engine.begin() as connection:
-        # Verify session token using raw SQL
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :session_token
-                """
-            ),
-            {"session_token": request.session_token}
-        ).first()
-
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session token")
-
-        user_id = logged_in[0]
-
-        # Delete portfolio holdings for portfolios that belong to this user.
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM portfolio_holdings 
-                WHERE port_id IN (SELECT port_id FROM portfolios WHERE user_id = :user_id)
-                """
-            ),
-            {"user_id": user_id}
-        )
-        
-        # Delete the user's current portfolio selection.
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM user_current_portfolio
-                WHERE user_id = :user_id
-                """
-            ),
-            {"user_id": user_id}
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Lock the user's portfolios before their holdings, like a trade would
+    await connection.execute(LOCK_USER_PORTFOLIOS, {"user_id": user_id})
+
+    # Delete portfolio holdings for portfolios that belong to this user.
+    await connection.execute(DELETE_USER_HOLDINGS, {"user_id": user_id})
+
+    # Delete the user's current portfolio selection.
+    await connection.execute(DELETE_USER_CURRENT_PORTFOLIO, {"user_id": user_id})
+
+    # Delete all portfolios for this user.
+    await connection.execute(DELETE_USER_PORTFOLIOS, {"user_id": user_id})
+
+    # Drop the user's cached sessions so they are re-validated on next use
+    sessions.invalidate_user(user_id)
+
+    return AdminResetPortfolioResponse(
+        message="All portfolio data for the user has been reset.", user_id=user_id
+    )
+
+
+class AdminRevokeSessionRequest(BaseModel):
+    session_token: str
+
+
+class AdminRevokeSessionResponse(BaseModel):
+    message: str
+    user_id: int
+
+
+@router.post("/revoke_session", response_model=AdminRevokeSessionResponse)
+@retry.on_conflict
+async def admin_revoke_session(
+    request: AdminRevokeSessionRequest,
+) -> AdminRevokeSessionResponse:
+    """
+    Admin endpoint to force-end any user's session. Signed tokens are added to
+    the revocation set, database tokens are deleted.
+    """
+    async with db.begin() as connection:
+        user_id = await sessions.end_session(connection, request.session_token)
+
+    if user_id is None:
+        raise HTTPException(
+            status_code=404, detail="Session not found or already revoked"
         )
 
-        # Delete all portfolios for this user.
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM portfolios
-                WHERE user_id = :user_id
-                """
-            ),
-            {"user_id": user_id}
+    return AdminRevokeSessionResponse(message="Session revoked", user_id=user_id)
+
+
+class SessionMetricsResponse(BaseModel):
+    token_mode: str
+    session_ttl_seconds: int
+    session_cache: dict
+    revoked_tokens: int
+    temp_user_tokens: dict
+    last_sweep: dict
+
+
+@router.get("/metrics/sessions", response_model=SessionMetricsResponse)
+async def session_metrics() -> SessionMetricsResponse:
+    """
+    Reports this worker's session cache counters, revocation set size, the
+    current size of temp_user_tokens and the table size before/after the last sweep
+    """
+    async with db.begin() as connection:
+        temp_user_tokens = await connection.run_sync(
+            sweeper.table_stats, "temp_user_tokens"
         )
 
-    return AdminResetPortfolioResponse(
-        message="All portfolio data for the user has been reset.", 
-        user_id=user_id
+    return SessionMetricsResponse(
+        token_mode=sessions.settings.SESSION_TOKEN_MODE,
+        session_ttl_seconds=sessions.settings.SESSION_TTL_SECONDS,
+        session_cache=sessions.session_cache.stats(),
+        revoked_tokens=len(signed_tokens.revocations),
+        temp_user_tokens=temp_user_tokens,
+        last_sweep=sweeper.last_sweep,
     )
+
+
+@router.post("/sweep_sessions")
+async def admin_sweep_sessions() -> dict:
+    """
+    Runs the expired session sweep now instead of waiting for the background sweeper
+    """
+    # Runs batch after batch of blocking deletes, so keep it off the event loop
+    sweeper.last_sweep = await run_in_threadpool(sweeper.sweep_expired_sessions)
+    return sweeper.last_sweep
+
+
+class RebuildTotalsRequest(BaseModel):
+    user_id: int | None = None
+
+
+@router.post("/rebuild_transaction_totals")
+async def admin_rebuild_transaction_totals(request: RebuildTotalsRequest) -> dict:
+    """
+    Recomputes transaction_totals (behind /transactions/net-transaction-summary)
+    from the ledger, for one user or everyone. Trades wait while it runs.
+    """
+    # One long blocking statement on the whole ledger, so keep it off the event loop
+    return await run_in_threadpool(transaction_totals.rebuild_all, request.user_id)
+
+
+class RebuildCandlesRequest(BaseModel):
+    stock_id: int | None = None
+
+
+@router.post("/rebuild_candles")
+async def admin_rebuild_candles(request: RebuildCandlesRequest) -> dict:
+    """
+    Recomputes price_candles (behind /stocks/{ticker}/candles) from
+    price_history, for one stock or every stock. Price ticks wait while it runs.
+    """
+    return await run_in_threadpool(candles.rebuild_all, request.stock_id)
+
+
+class HashingMetricsResponse(BaseModel):
+    hashing_pool: dict
+
+
+@router.get("/metrics/hashing", response_model=HashingMetricsResponse)
+async def hashing_metrics() -> HashingMetricsResponse:
+    """
+    Reports the password hashing pool's queue depth and rejected requests
+    """
+    return HashingMetricsResponse(hashing_pool=hashing.stats())
+
+
+class PoolMetricsResponse(BaseModel):
+    db_mode: str
+    pools: dict
+    read_routing: dict
+
+
+@router.get("/metrics/pool", response_model=PoolMetricsResponse)
+async def pool_metrics() -> PoolMetricsResponse:
+    """
+    Reports this worker's connection pools (primary and read replicas): checked-out
+    connections, overflow, pool timeouts, histograms of pool wait time and checkout
+    latency, and how many read-only transactions went to a replica or the primary
+    """
+    return PoolMetricsResponse(
+        db_mode=db.settings.DB_MODE, pools=db.pool_stats(), read_routing=db.read_routing
+    )
+
+
+class RetryMetricsResponse(BaseModel):
+    max_attempts: int
+    endpoints: dict
+
+
+@router.get("/metrics/retries", response_model=RetryMetricsResponse)
+async def retry_metrics() -> RetryMetricsResponse:
+    """
+    Reports, per write endpoint, how many serialization failures and deadlocks
+    this worker hit, how many retries it made, and how many requests recovered
+    or gave up with 409
+    """
+    return RetryMetricsResponse(
+        max_attempts=retry.settings.RETRY_MAX_ATTEMPTS, endpoints=retry.counters
+    )
+
+
+class GroupCommitMetricsResponse(BaseModel):
+    group_commit: dict
+
+
+@router.get("/metrics/group_commit", response_model=GroupCommitMetricsResponse)
+async def group_commit_metrics() -> GroupCommitMetricsResponse:
+    """
+    Reports the group commit window and max batch size, and this worker's
+    histograms of trades per batch and batch commit time, plus how many trades
+    and whole batches failed
+    """
+    return GroupCommitMetricsResponse(group_commit=group_commit.stats())
+
+
+class OrderQueueMetricsResponse(BaseModel):
+    workers: int
+    batch_size: int
+    queued: int
+    oldest_queued_seconds: float | None
+    counters: dict
+
+
+QUEUE_DEPTH = statements.register(
+    "admin.queue_depth",
+    """
+    SELECT COUNT(*) AS queued, EXTRACT(EPOCH FROM LOCALTIMESTAMP - MIN(created_at)) AS oldest_seconds
+    FROM queued_orders
+    WHERE status = 'queued'
+    """,
+)
+
+
+@router.get("/metrics/order_queue", response_model=OrderQueueMetricsResponse)
+async def order_queue_metrics() -> OrderQueueMetricsResponse:
+    """
+    Reports how many submitted orders are waiting (across all workers) and how
+    long the oldest has waited, plus this worker's counts of drained batches
+    and filled, rejected and requeued orders
+    """
+    async with db.begin() as connection:
+        depth = (await connection.execute(QUEUE_DEPTH)).one()
+
+    return OrderQueueMetricsResponse(
+        workers=order_queue.settings.ORDER_QUEUE_WORKERS,
+        batch_size=order_queue.settings.ORDER_QUEUE_BATCH_SIZE,
+        queued=depth.queued,
+        oldest_queued_seconds=depth.oldest_seconds,
+        counters=order_queue.counters,
+    )
+
+
+class PriceCacheMetricsResponse(BaseModel):
+    price_cache: dict
+
+
+@router.get("/metrics/price_cache", response_model=PriceCacheMetricsResponse)
+async def price_cache_metrics() -> PriceCacheMetricsResponse:
+    """
+    Reports this worker's price cache: how old the table is, how many requests
+    it served, how often it was reloaded (on a tick, or by a request that
+    found it stale) and listener errors
+    """
+    return PriceCacheMetricsResponse(price_cache=price_cache.stats())
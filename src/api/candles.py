@@ -0,0 +1,152 @@
+import argparse
+import time
+
+from sqlalchemy.engine import Connection
+
+from src import database as db
+from src import statements
+
+# Open / high / low / close candles per stock at a few fixed resolutions,
+# read by /stocks/{ticker}/candles instead of aggregating raw ticks. Every
+# tick adds itself to the candles it falls in (see UPSERT_CANDLES) in the same
+# statement that writes it. If the candles ever drift from price_history,
+# rebuild them:
+#
+#     python -m src.api.candles [--stock-id N]
+
+# Resolution -> date_trunc unit
+RESOLUTIONS = {
+    "1m": "minute",
+    "1h": "hour",
+    "1d": "day",
+}
+
+_RESOLUTION_UNITS = ", ".join(
+    f"('{resolution}', '{unit}')" for resolution, unit in RESOLUTIONS.items()
+)
+
+# Adds the ticks a statement just wrote to their candles. Used as a CTE after
+# the tick; {ticks} names a CTE returning the stock_id, updated_at and
+# price_per_share written. A stock's ticks are at least a price update
+# interval apart and never concurrent, so the incoming tick is the candle's
+# latest and becomes its close.
+UPSERT_CANDLES = f"""
+    INSERT INTO price_candles (stock_id, resolution, bucket, open, high, low, close, tick_count)
+    SELECT
+        t.stock_id,
+        r.resolution,
+        date_trunc(r.unit, t.updated_at),
+        t.price_per_share,
+        t.price_per_share,
+        t.price_per_share,
+        t.price_per_share,
+        1
+    FROM {{ticks}} t
+    CROSS JOIN (VALUES {_RESOLUTION_UNITS}) AS r (resolution, unit)
+    ON CONFLICT (stock_id, resolution, bucket) DO UPDATE
+    SET high = GREATEST(price_candles.high, EXCLUDED.high),
+        low = LEAST(price_candles.low, EXCLUDED.low),
+        close = EXCLUDED.close,
+        tick_count = price_candles.tick_count + 1"""
+
+# The ticker's latest `limit` candles with a bucket between start and end
+# (the candle start falls in is included), newest first. One row with a NULL
+# bucket if the stock has none, no row if the ticker does not exist.
+STOCK_CANDLES = statements.register(
+    "candles.stock_candles",
+    """
+    SELECT c.bucket, c.open, c.high, c.low, c.close, c.tick_count
+    FROM stocks s
+    LEFT JOIN LATERAL (
+        SELECT bucket, open, high, low, close, tick_count
+        FROM price_candles
+        WHERE stock_id = s.stock_id
+          AND resolution = :resolution
+          AND bucket >= COALESCE(date_trunc(:unit, CAST(CAST(:start AS timestamptz) AS timestamp)), '-infinity')
+          AND bucket <= COALESCE(CAST(CAST(:end AS timestamptz) AS timestamp), 'infinity')
+        ORDER BY bucket DESC
+        LIMIT :limit
+    ) c ON true
+    WHERE s.ticker_symbol = :ticker_symbol
+    """,
+    prepare=True,
+)
+
+# Ticks take ROW EXCLUSIVE on price_history, so holding SHARE keeps it still
+# while the candles are recomputed; the price updater waits for the rebuild
+LOCK_HISTORY = statements.register(
+    "candles.lock_history", "LOCK TABLE price_history IN SHARE MODE"
+)
+
+# Candles from the oldest tick kept on are replaced. History is dropped a
+# whole day at a time, so the oldest tick starts a day and none of these
+# candles lost ticks; older candles stay as they are.
+DELETE_CANDLES = statements.register(
+    "candles.delete_candles",
+    f"""
+    DELETE FROM price_candles c
+    USING (
+        SELECT stock_id, MIN(ts) AS since
+        FROM price_history
+        WHERE stock_id = :stock_id OR CAST(:stock_id AS integer) IS NULL
+        GROUP BY stock_id
+    ) h, (VALUES {_RESOLUTION_UNITS}) AS r (resolution, unit)
+    WHERE c.stock_id = h.stock_id
+      AND c.resolution = r.resolution
+      AND c.bucket >= date_trunc(r.unit, h.since)
+    """,
+)
+
+INSERT_CANDLES = statements.register(
+    "candles.insert_candles",
+    f"""
+    INSERT INTO price_candles (stock_id, resolution, bucket, open, high, low, close, tick_count)
+    SELECT
+        h.stock_id,
+        r.resolution,
+        date_trunc(r.unit, h.ts),
+        (array_agg(h.price ORDER BY h.ts))[1],
+        MAX(h.price),
+        MIN(h.price),
+        (array_agg(h.price ORDER BY h.ts DESC))[1],
+        COUNT(*)
+    FROM price_history h
+    CROSS JOIN (VALUES {_RESOLUTION_UNITS}) AS r (resolution, unit)
+    WHERE h.stock_id = :stock_id OR CAST(:stock_id AS integer) IS NULL
+    GROUP BY h.stock_id, r.resolution, date_trunc(r.unit, h.ts)
+    """,
+)
+
+
+def rebuild(connection: Connection, stock_id: int | None = None) -> dict:
+    """
+    Recomputes the candles covered by price_history, for one stock or every
+    stock, inside the caller's transaction. Returns how many rows were
+    replaced.
+    """
+
+    started = time.monotonic()
+    connection.execute(LOCK_HISTORY)
+    deleted = connection.execute(DELETE_CANDLES, {"stock_id": stock_id}).rowcount
+    inserted = connection.execute(INSERT_CANDLES, {"stock_id": stock_id}).rowcount
+    return {
+        "stock_id": stock_id,
+        "rows_deleted": deleted,
+        "rows_inserted": inserted,
+        "duration_ms": round((time.monotonic() - started) * 1000, 2),
+    }
+
+
+def rebuild_all(stock_id: int | None = None) -> dict:
+    with db.engine.begin() as connection:
+        return rebuild(connection, stock_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild price_candles from price_history"
+    )
+    parser.add_argument(
+        "--stock-id", type=int, default=None, help="only rebuild this stock's candles"
+    )
+    print(rebuild_all(parser.parse_args().stock_id))
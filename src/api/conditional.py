@@ -0,0 +1,69 @@
+import math
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+from src import config
+
+settings = config.get_settings()
+
+# Conditional GET for data that only changes on a price tick. The validator is
+# the time of the tick the response reflects: the ETag is that time in
+# microseconds, Last-Modified the same time in HTTP date format. Clients may
+# reuse a response until the next tick is due (Cache-Control max-age) and
+# revalidate it with If-None-Match / If-Modified-Since after that, which costs
+# a 304 without a body until the tick has happened.
+
+
+def etag(ticked_at: float) -> str:
+    return f'"{round(ticked_at * 1_000_000):x}"'
+
+
+def _matches(if_none_match: str, tag: str) -> bool:
+    # Weak comparison (RFC 9110 13.1.2), as recommended for If-None-Match
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or tag in (
+        candidate.removeprefix("W/") for candidate in candidates
+    )
+
+
+def _not_modified_since(if_modified_since: str, ticked_at: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole seconds
+    return since.tzinfo is not None and math.floor(ticked_at) <= since.timestamp()
+
+
+def validate(
+    request: Request, response: Response, ticked_at: float, now: float
+) -> Response | None:
+    """
+    Sets the validators and Cache-Control for a response reflecting the price
+    tick at ticked_at, given the database's current time (both Unix
+    timestamps). Returns a 304 response when the request's validators match
+    it, None when the full response should be sent.
+    """
+
+    remaining = settings.PRICE_UPDATE_INTERVAL_SECONDS - (now - ticked_at)
+    headers = {
+        "ETag": etag(ticked_at),
+        "Last-Modified": formatdate(ticked_at, usegmt=True),
+        "Cache-Control": f"private, max-age={max(math.floor(remaining), 0)}",
+    }
+
+    # If-Modified-Since is only considered without If-None-Match (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _matches(if_none_match, headers["ETag"])
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(
+            if_modified_since, ticked_at
+        )
+
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import inspect
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from fastapi import Depends, HTTPException
+
+from src import config
+from src import database as db
+from src.api import sessions, trade_engine
+from src.metrics import Histogram
+
+settings = config.get_settings()
+
+# Group commit (TRADE_GROUP_COMMIT_WINDOW_MS > 0): trades arriving within the
+# window share one transaction, and so one WAL flush at commit, instead of
+# committing one by one. Each trade runs under its own savepoint, so a trade
+# that fails is rolled back alone and only its own request sees the error.
+
+
+@dataclass
+class _Pending:
+    token: str
+    run: Callable[[sessions.SessionContext], Awaitable[Any]]
+    future: asyncio.Future
+    ctx: sessions.SessionContext | None = None
+    result: Any = None
+    error: BaseException | None = None
+
+
+# Trades waiting for the current window to close, per worker process
+_pending: list[_Pending] = []
+_flush_timer: asyncio.TimerHandle | None = None
+# Batches being committed; kept so their tasks are not garbage collected mid-flight
+_in_flight: set[asyncio.Task] = set()
+
+# Reported by /admin/metrics/group_commit
+batch_sizes = Histogram(buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+batch_commit_ms = Histogram()
+counters = {
+    "batches": 0,
+    "trades": 0,
+    "trades_failed": 0,
+    "batches_failed": 0,
+}
+
+
+def _flush() -> None:
+    global _pending, _flush_timer
+    if _flush_timer is not None:
+        _flush_timer.cancel()
+        _flush_timer = None
+
+    batch, _pending = _pending, []
+    if batch:
+        task = asyncio.get_running_loop().create_task(_commit(batch))
+        _in_flight.add(task)
+        task.add_done_callback(_in_flight.discard)
+
+
+async def _run_batch(connection, batch: list[_Pending]) -> None:
+    resolved: list[tuple[sessions.SessionContext, _Pending]] = []
+    for item in batch:
+        ctx = await sessions.resolve_session(connection, item.token)
+        if ctx is None:
+            item.error = HTTPException(status_code=401, detail="Invalid session token")
+        else:
+            item.ctx = ctx
+            resolved.append((ctx, item))
+
+    # Trades lock their portfolio first, so taking the batch in port_id order
+    # keeps concurrent batches from deadlocking each other
+    resolved.sort(key=lambda pair: pair[0].portfolio_id or 0)
+    for ctx, item in resolved:
+        try:
+            item.result = await trade_engine.isolated(connection, item.run(ctx))
+        except Exception as e:
+            item.error = e
+
+
+async def _commit(batch: list[_Pending]) -> None:
+    started = time.perf_counter()
+    try:
+        async with db.begin() as connection:
+            await _run_batch(connection, batch)
+    except Exception as e:
+        # Nothing in the batch committed, so every trade in it failed
+        counters["batches_failed"] += 1
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(e)
+        return
+    finally:
+        batch_sizes.observe(len(batch))
+        batch_commit_ms.observe((time.perf_counter() - started) * 1000)
+        counters["batches"] += 1
+        counters["trades"] += len(batch)
+
+    for item in batch:
+        if item.future.done():
+            # The request went away while waiting
+            continue
+        if item.error is not None:
+            counters["trades_failed"] += 1
+            item.future.set_exception(item.error)
+            continue
+
+        # Every trade without an error had its session resolved
+        assert item.ctx is not None
+        sessions.recent_writes.set(item.token, True)
+        for callback in item.ctx.after_commit:
+            callback()
+        item.future.set_result(item.result)
+
+
+async def submit(
+    token: str, run: Callable[[sessions.SessionContext], Awaitable[Any]]
+) -> Any:
+    """
+    Queues run(ctx) for the next group commit and waits until that batch has
+    committed. Returns what run returned, or raises what it raised (or what
+    the commit raised).
+    """
+
+    global _flush_timer
+    future = asyncio.get_running_loop().create_future()
+    _pending.append(_Pending(token, run, future))
+
+    if len(_pending) >= settings.TRADE_GROUP_COMMIT_MAX_BATCH:
+        _flush()
+    elif _flush_timer is None:
+        _flush_timer = asyncio.get_running_loop().call_later(
+            settings.TRADE_GROUP_COMMIT_WINDOW_MS / 1000, _flush
+        )
+
+    return await future
+
+
+def coalesced(handler):
+    """
+    Decorator for trade endpoints: with group commit on, the handler no longer
+    gets its own transaction. Its session dependency is swapped for the bare
+    token, and the handler runs inside the next group commit with a session
+    resolved on the shared connection. Goes between retry.on_conflict and
+    idempotency.replayable, so a batch that fails to commit retries each of its
+    requests. With group commit off the handler is returned unchanged.
+    """
+
+    if settings.TRADE_GROUP_COMMIT_WINDOW_MS <= 0:
+        return handler
+
+    signature = inspect.signature(handler)
+    ctx_name = next(
+        name
+        for name, parameter in signature.parameters.items()
+        if parameter.annotation is sessions.SessionContext
+    )
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = kwargs.pop(ctx_name)
+        return await submit(
+            token, lambda ctx: handler(*args, **kwargs, **{ctx_name: ctx})
+        )
+
+    setattr(
+        wrapper,
+        "__signature__",
+        signature.replace(
+            parameters=[
+                parameter.replace(
+                    annotation=str, default=Depends(sessions.session_token)
+                )
+                if name == ctx_name
+                else parameter
+                for name, parameter in signature.parameters.items()
+            ]
+        ),
+    )
+
+    return wrapper
+
+
+def stats() -> dict:
+    return {
+        "enabled": settings.TRADE_GROUP_COMMIT_WINDOW_MS > 0,
+        "window_ms": settings.TRADE_GROUP_COMMIT_WINDOW_MS,
+        "max_batch": settings.TRADE_GROUP_COMMIT_MAX_BATCH,
+        "pending": len(_pending),
+        "batches_in_flight": len(_in_flight),
+        **counters,
+        "batch_size": batch_sizes.snapshot(),
+        "batch_commit_ms": batch_commit_ms.snapshot(),
+    }
@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+from src import config
+
+settings = config.get_settings()
+
+# bcrypt is CPU bound and holds the GIL for most of its runtime, so it runs in
+# its own process pool instead of the threadpool that serves the other endpoints
+_executor: ProcessPoolExecutor | None = None
+
+# Hash jobs submitted and not yet finished. Only touched from the event loop.
+_pending = 0
+rejected = 0
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, password_hash: bytes) -> bool:
+    return bcrypt.checkpw(password, password_hash)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.HASH_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _submit(fn, *args):
+    global _pending, rejected
+
+    # Admission control: shed load instead of queueing logins without bound
+    if _pending >= settings.HASH_QUEUE_LIMIT:
+        rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent logins, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), fn, *args
+        )
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    hashed = await _submit(_hash, password.encode(), settings.BCRYPT_ROUNDS)
+    return hashed.decode()
+
+
+async def check_password(password: str, password_hash: str) -> bool:
+    return await _submit(_check, password.encode(), password_hash.encode())
+
+
+def stats() -> dict:
+    return {
+        "workers": settings.HASH_POOL_WORKERS,
+        "queue_limit": settings.HASH_QUEUE_LIMIT,
+        "pending": _pending,
+        "rejected": rejected,
+        "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+    }
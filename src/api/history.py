@@ -5,9 +5,8 @@ from typing import List
 from collections import defaultdict
 from datetime import datetime
 
-import sqlalchemy
-from src.api import auth
-from src import database as db
+from src import statements
+from src.api import auth, sessions
 
 
 router = APIRouter(
@@ -19,123 +18,116 @@ router = APIRouter(
 class TransactionHistoryIn(BaseModel):
     session_token: str
 
+
 class TransactionOut(BaseModel):
     transaction_id: int
     port_id: int
     stock_id: int
     transaction_type: str
     change: float
-    timestamp: datetime 
+    timestamp: datetime
+
+
+PORTFOLIO_TRANSACTIONS = statements.register(
+    "history.portfolio_transactions",
+    """
+    SELECT 
+    transaction_id,
+    port_id,
+    stock_id,
+    transaction_type,
+    change,
+    timestamp
+    FROM transactions
+    WHERE user_id = :user_id AND port_id = :port_id
+    ORDER BY transaction_id DESC
+    """,
+)
+
 
 @router.post("/current_portfolio_transactions")
-def get_current_portfolio_transactions(request: TransactionHistoryIn) -> list[TransactionOut]:
+async def get_current_portfolio_transactions(
+    request: TransactionHistoryIn,
+    ctx: sessions.SessionContext = Depends(sessions.read_session_context),
+) -> list[TransactionOut]:
     """
     Returns transactions for the user's current portfolio only.
     """
 
-    with db.engine.begin() as connection:
-        # Validate session and get user_id
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                "SELECT user_id FROM temp_user_tokens WHERE token = :token"
-            ),
-            {"token": request.session_token}
-        ).first()
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session token")
-        user_id = logged_in.user_id
-
-        # Get current portfolio
-        current = connection.execute(
-            sqlalchemy.text(
-                "SELECT current_portfolio FROM user_current_portfolio WHERE user_id = :user_id"
-            ),
-            {"user_id": user_id}
-        ).first()
-        if not current:
-            raise HTTPException(status_code=404, detail="Current portfolio not found")
-        port_id = current.current_portfolio
-
-        # Fetch transactions for current portfolio
-        results = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT 
-                transaction_id,
-                port_id,
-                stock_id,
-                transaction_type,
-                change,
-                timestamp
-                FROM transactions
-                WHERE user_id = :user_id AND port_id = :port_id
-                ORDER BY transaction_id DESC
-                """
-            ),
-            {"user_id": user_id, "port_id": port_id}
-        ).fetchall()
-
-        return [
-            TransactionOut(
-                transaction_id=row.transaction_id,
-                port_id=row.port_id,
-                stock_id=row.stock_id,
-                transaction_type=row.transaction_type,
-                change=float(row.change),
-                timestamp=row.timestamp
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Current portfolio was resolved with the session
+    if ctx.portfolio_id is None:
+        raise HTTPException(status_code=404, detail="Current portfolio not found")
+    port_id = ctx.portfolio_id
+
+    # Fetch transactions for current portfolio
+    results = (
+        await connection.execute(
+            PORTFOLIO_TRANSACTIONS, {"user_id": user_id, "port_id": port_id}
+        )
+    ).fetchall()
+
+    return [
+        TransactionOut(
+            transaction_id=row.transaction_id,
+            port_id=row.port_id,
+            stock_id=row.stock_id,
+            transaction_type=row.transaction_type,
+            change=float(row.change),
+            timestamp=row.timestamp,
+        )
+        for row in results
+    ]
+
+
+USER_TRANSACTIONS = statements.register(
+    "history.user_transactions",
+    """
+    SELECT 
+    transaction_id,
+    port_id,
+    stock_id,
+    transaction_type,
+    change,
+    timestamp
+    FROM transactions
+    WHERE user_id = :user_id AND port_id IS NOT NULL
+    ORDER BY transaction_id DESC
+    """,
+)
 
-            )
-            for row in results
-        ]
 
 @router.post("/my_transactions")
-def get_my_transactions(request: TransactionHistoryIn) -> dict:
+async def get_my_transactions(
+    request: TransactionHistoryIn,
+    ctx: sessions.SessionContext = Depends(sessions.read_session_context),
+) -> dict:
     """
     Returns all transactions for the user, grouped by portfolio (port_id).
     """
 
-    with db.engine.begin() as connection:
-        # Validate session and get user_id
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                "SELECT user_id FROM temp_user_tokens WHERE token = :token"
-            ),
-            {"token": request.session_token}
-        ).first()
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session token")
-        user_id = logged_in.user_id
-
-        # Fetch transactions for this user
-        results = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT 
-                transaction_id,
-                port_id,
-                stock_id,
-                transaction_type,
-                change,
-                timestamp
-                FROM transactions
-                WHERE user_id = :user_id AND port_id IS NOT NULL
-                ORDER BY transaction_id DESC
-                """
-            ),
-            {"user_id": user_id}
-        ).fetchall()
-
-
-        # Group transactions by port_id
-        grouped = defaultdict(list)
-        for row in results:
-            grouped[row.port_id].append(TransactionOut(
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Fetch transactions for this user
+    results = (
+        await connection.execute(USER_TRANSACTIONS, {"user_id": user_id})
+    ).fetchall()
+
+    # Group transactions by port_id
+    grouped = defaultdict(list)
+    for row in results:
+        grouped[row.port_id].append(
+            TransactionOut(
                 transaction_id=row.transaction_id,
                 port_id=row.port_id,
                 stock_id=row.stock_id,
                 transaction_type=row.transaction_type,
                 change=float(row.change),
-                timestamp=row.timestamp
-            ))
+                timestamp=row.timestamp,
+            )
+        )
 
-        return {str(port_id): [t.dict() for t in txns] for port_id, txns in grouped.items()}
+    return {str(port_id): [t.dict() for t in txns] for port_id, txns in grouped.items()}
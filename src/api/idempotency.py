@@ -0,0 +1,202 @@
+import functools
+import hashlib
+import inspect
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import Header, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from src import config
+from src import statements
+from src.api import sessions
+from src.cache import TTLCache
+
+settings = config.get_settings()
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    endpoint: str
+    request_hash: bytes
+    status_code: int
+    body: Any
+
+
+# (user_id, key) -> StoredResponse for keys this worker stored or replayed
+# recently, so repeated replays skip the database lookup. Only filled once the
+# response is committed.
+recent_responses = TTLCache(
+    max_size=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+)
+
+
+# Claims the key inside the handler's transaction. A concurrent request with the
+# same key blocks on the uncommitted row until the first one commits (and then
+# replays it) or rolls back (and then runs itself). Expired rows the sweeper has
+# not deleted yet are claimed again.
+CLAIM_KEY = statements.register(
+    "idempotency.claim_key",
+    """
+    INSERT INTO idempotency_keys (user_id, idempotency_key, endpoint, request_hash)
+    VALUES (:user_id, :idempotency_key, :endpoint, :request_hash)
+    ON CONFLICT (user_id, idempotency_key) DO UPDATE
+    SET endpoint = EXCLUDED.endpoint,
+        request_hash = EXCLUDED.request_hash,
+        status_code = NULL,
+        response = NULL,
+        created_at = now()
+    WHERE idempotency_keys.created_at <= LOCALTIMESTAMP - make_interval(secs => :ttl)
+    RETURNING idempotency_key
+    """,
+    prepare=True,
+)
+
+FIND_RESPONSE = statements.register(
+    "idempotency.find_response",
+    """
+    SELECT endpoint, request_hash, status_code, response
+    FROM idempotency_keys
+    WHERE user_id = :user_id AND idempotency_key = :idempotency_key
+    """,
+)
+
+STORE_RESPONSE = statements.register(
+    "idempotency.store_response",
+    """
+    UPDATE idempotency_keys
+    SET status_code = :status_code, response = CAST(:response AS jsonb)
+    WHERE user_id = :user_id AND idempotency_key = :idempotency_key
+    """,
+)
+
+
+def _request_hash(endpoint: str, kwargs: dict) -> bytes:
+    # The session token is left out so a client can retry after logging in again
+    body = {
+        name: value.model_dump(mode="json", exclude={"session_token"})
+        for name, value in kwargs.items()
+        if isinstance(value, BaseModel)
+    }
+    return hashlib.sha256(
+        f"{endpoint}:{json.dumps(body, sort_keys=True)}".encode()
+    ).digest()
+
+
+def _replay(stored: StoredResponse, endpoint: str, request_hash: bytes) -> JSONResponse:
+    if stored.endpoint != endpoint or stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422, detail=f"{HEADER} was already used for a different request"
+        )
+
+    return JSONResponse(
+        status_code=stored.status_code,
+        content=stored.body,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def replayable(handler):
+    """
+    Decorator for session-authenticated write endpoints: adds an optional
+    Idempotency-Key header. The first request with a key runs normally and its
+    response is stored in the same transaction; later requests with the same
+    key (per user) get the stored response back without running the handler.
+    Requests that fail are not stored, so they can be retried with the same key.
+    Goes below retry.on_conflict, so a retried transaction claims the key again.
+    """
+
+    endpoint = f"{handler.__module__.rsplit('.', 1)[-1]}.{handler.__name__}"
+
+    @functools.wraps(handler)
+    async def wrapper(*args, idempotency_key: str | None = None, **kwargs):
+        if idempotency_key is None:
+            return await handler(*args, **kwargs)
+
+        if not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters",
+            )
+
+        ctx = next(
+            value
+            for value in kwargs.values()
+            if isinstance(value, sessions.SessionContext)
+        )
+        request_hash = _request_hash(endpoint, kwargs)
+        params = {"user_id": ctx.user_id, "idempotency_key": idempotency_key}
+
+        # Fast path: a response this worker already knows about
+        stored = recent_responses.get((ctx.user_id, idempotency_key))
+        if stored is not None:
+            return _replay(stored, endpoint, request_hash)
+
+        claimed = (
+            await ctx.connection.execute(
+                CLAIM_KEY,
+                {
+                    **params,
+                    "endpoint": endpoint,
+                    "request_hash": request_hash,
+                    "ttl": settings.IDEMPOTENCY_TTL_SECONDS,
+                },
+            )
+        ).first()
+
+        if claimed is None:
+            row = (await ctx.connection.execute(FIND_RESPONSE, params)).one()
+            stored = StoredResponse(
+                row.endpoint, bytes(row.request_hash), row.status_code, row.response
+            )
+            recent_responses.set((ctx.user_id, idempotency_key), stored)
+            return _replay(stored, endpoint, request_hash)
+
+        result = await handler(*args, **kwargs)
+
+        # These endpoints all answer 200 on success
+        stored = StoredResponse(
+            endpoint, request_hash, status.HTTP_200_OK, jsonable_encoder(result)
+        )
+        await ctx.connection.execute(
+            STORE_RESPONSE,
+            {
+                **params,
+                "status_code": stored.status_code,
+                "response": json.dumps(stored.body),
+            },
+        )
+        ctx.after_commit.append(
+            functools.partial(
+                recent_responses.set, (ctx.user_id, idempotency_key), stored
+            )
+        )
+
+        return result
+
+    # FastAPI reads the header parameter from the signature
+    signature = inspect.signature(handler)
+    setattr(
+        wrapper,
+        "__signature__",
+        signature.replace(
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(
+                    "idempotency_key",
+                    inspect.Parameter.KEYWORD_ONLY,
+                    default=Header(None, alias=HEADER),
+                    annotation=str | None,
+                ),
+            ]
+        ),
+    )
+
+    return wrapper
@@ -0,0 +1,237 @@
+import threading
+from decimal import Decimal
+
+from sqlalchemy.engine import Connection
+
+from src import statements
+from src.api import transaction_totals
+from src.order_book import OrderBook
+
+# Open limit orders of every stock, by stock_id, mirrored from limit_orders.
+# Orders get in through sync_books() whichever worker placed them, and leave
+# when match() fills them or discard() sees them cancelled. An order filled or
+# cancelled by another worker stays here until the price crosses it; the fill
+# statement then skips it because it is no longer open.
+books: dict[int, OrderBook] = {}
+
+# Guards books: the price updater thread matches while request handlers discard
+_lock = threading.Lock()
+
+# Highest order_id loaded so far, and the ids below it that were missing from a
+# load, most likely because the transaction placing them had not committed yet.
+# Each gap maps to the first transaction id not yet assigned when it was found
+# missing: every transaction that could still commit it started before that.
+# Gaps are looked up on every load until they show up, or until every such
+# transaction has ended (the id was rolled back, or is no longer open).
+_watermark = 0
+_gaps: dict[int, int] = {}
+
+
+def cents(price: Decimal) -> int:
+    return int(price * 100)
+
+
+LOAD_OPEN_ORDERS = statements.register(
+    "matching.load_open_orders",
+    """
+    SELECT order_id, stock_id, side, limit_price
+    FROM limit_orders
+    WHERE status = 'open' AND (order_id > :watermark OR order_id = ANY(:gaps))
+    ORDER BY order_id
+    """,
+)
+
+# The oldest transaction id still running, and the first one not yet assigned
+CURRENT_SNAPSHOT = statements.register(
+    "matching.current_snapshot",
+    """
+    SELECT
+        CAST(CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text) AS bigint) AS xmin,
+        CAST(CAST(pg_snapshot_xmax(pg_current_snapshot()) AS text) AS bigint) AS xmax
+    """,
+)
+
+
+def sync_books(connection: Connection) -> int:
+    """
+    Loads the open orders placed since the last call into the books, returns
+    how many were added
+    """
+
+    global _watermark
+    # Transactions older than this have ended, so the load sees what they wrote
+    settled = connection.execute(CURRENT_SNAPSHOT).one().xmin
+    rows = connection.execute(
+        LOAD_OPEN_ORDERS, {"watermark": _watermark, "gaps": list(_gaps)}
+    ).fetchall()
+    # Any transaction still placing an order the load missed started before this
+    pending = connection.execute(CURRENT_SNAPSHOT).one().xmax
+
+    with _lock:
+        for row in rows:
+            books.setdefault(row.stock_id, OrderBook()).add(
+                row.order_id, row.side, cents(row.limit_price)
+            )
+
+    loaded = {row.order_id for row in rows}
+    for order_id, found_pending in list(_gaps.items()):
+        if order_id in loaded or found_pending <= settled:
+            del _gaps[order_id]
+
+    # The first load has nothing in flight worth remembering
+    newest = max(loaded, default=_watermark)
+    if _watermark > 0:
+        for order_id in range(_watermark + 1, newest):
+            if order_id not in loaded:
+                _gaps[order_id] = pending
+    _watermark = max(_watermark, newest)
+    return len(rows)
+
+
+def discard(stock_id: int, order_id: int) -> None:
+    with _lock:
+        book = books.get(stock_id)
+        if book is not None:
+            book.discard(order_id)
+
+
+def reset() -> None:
+    """
+    Empties the books so the next sync reloads every open order. Used when a
+    match rolled back after its orders had already left the books.
+    """
+
+    global _watermark
+    with _lock:
+        books.clear()
+        _watermark = 0
+        _gaps.clear()
+
+
+# The portfolios of the orders about to be filled
+FILL_PORTFOLIOS = """
+    SELECT o.port_id
+    FROM unnest(CAST(:order_ids AS bigint[])) AS f (order_id)
+    JOIN limit_orders o ON o.order_id = f.order_id"""
+
+# Same lock order as a trade: every portfolio with a fill first, in port_id
+# order, before the orders and holdings
+LOCK_FILL_PORTFOLIOS = statements.register(
+    "matching.lock_fill_portfolios",
+    f"""
+    SELECT port_id
+    FROM portfolios
+    WHERE port_id IN ({FILL_PORTFOLIOS})
+    ORDER BY port_id
+    FOR UPDATE
+    """,
+)
+
+# Fills many orders in one statement, each at the price given for its stock. Funds
+# and shares were escrowed when the order was placed, so fills cannot fail:
+# a buy gets its shares and the part of its reserve the fill did not use back,
+# a sell gets the proceeds. Orders no longer open (cancelled, or filled by
+# another worker) are skipped. Ledger rows are written in the given order.
+FILL_ORDERS = statements.register(
+    "matching.fill_orders",
+    f"""
+    WITH fills AS (
+        UPDATE limit_orders o
+        SET status = 'filled', fill_price = p.price, closed_at = now()
+        FROM unnest(CAST(:order_ids AS bigint[])) WITH ORDINALITY AS f (order_id, priority),
+            unnest(CAST(:stock_ids AS integer[]), CAST(:prices AS numeric[])) AS p (stock_id, price)
+        WHERE o.order_id = f.order_id AND o.stock_id = p.stock_id AND o.status = 'open'
+        RETURNING
+            o.order_id, o.port_id, o.user_id, o.stock_id, o.side, o.num_shares, o.reserved,
+            f.priority, ROUND(o.num_shares * p.price, 2) AS amount
+    ),
+    funds AS (
+        UPDATE portfolios p
+        SET buying_power = p.buying_power + c.credit, version = p.version + 1
+        FROM (
+            SELECT port_id, SUM(CASE WHEN side = 'buy' THEN reserved - amount ELSE amount END) AS credit
+            FROM fills
+            GROUP BY port_id
+        ) c
+        WHERE p.port_id = c.port_id
+    ),
+    holdings AS (
+        INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+        SELECT port_id, stock_id, SUM(num_shares), SUM(amount)
+        FROM fills
+        WHERE side = 'buy'
+        GROUP BY port_id, stock_id
+        ON CONFLICT (port_id, stock_id) DO UPDATE
+        SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
+            total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value,
+            version = portfolio_holdings.version + 1
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT port_id, user_id, stock_id, side, amount
+        FROM fills
+        ORDER BY priority
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    SELECT order_id FROM fills
+    """,
+)
+
+
+def fill_params(order_ids: list[int], prices: dict[int, Decimal]) -> dict:
+    return {
+        "order_ids": order_ids,
+        "stock_ids": list(prices),
+        "prices": list(prices.values()),
+    }
+
+
+def crossed(connection: Connection, prices: dict[int, Decimal]) -> list[int]:
+    """
+    Takes every resting order the new prices (by stock_id) cross out of the
+    books and returns their ids, best price first within each stock. Call
+    reset() if the transaction filling them does not commit.
+    """
+
+    sync_books(connection)
+
+    order_ids = []
+    with _lock:
+        for stock_id, price in prices.items():
+            book = books.get(stock_id)
+            if book is not None:
+                order_ids.extend(book.crossed(cents(price)))
+    return order_ids
+
+
+def fill(
+    connection: Connection, order_ids: list[int], prices: dict[int, Decimal]
+) -> int:
+    """
+    Fills the given orders at the new prices, inside the caller's
+    transaction, which must already hold their portfolios' locks. Returns how
+    many were filled.
+    """
+
+    if not order_ids:
+        return 0
+    return len(
+        connection.execute(FILL_ORDERS, fill_params(order_ids, prices)).fetchall()
+    )
+
+
+def match(connection: Connection, prices: dict[int, Decimal]) -> int:
+    """
+    Fills every resting order the new prices (by stock_id) cross, at those
+    prices, inside the caller's transaction. Returns how many were filled.
+    Call reset() if the transaction does not commit.
+    """
+
+    order_ids = crossed(connection, prices)
+    if not order_ids:
+        return 0
+
+    connection.execute(LOCK_FILL_PORTFOLIOS, {"order_ids": order_ids})
+    return fill(connection, order_ids, prices)
@@ -0,0 +1,273 @@
+import asyncio
+from dataclasses import dataclass
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+
+from src import config
+from src import database as db
+from src import statements
+from src.api import retry, sessions, trade_engine
+
+settings = config.get_settings()
+
+# Orders submitted through /orders/submit are committed to queued_orders and
+# answered with 202 straight away. Background tasks in every worker drain the
+# queue one portfolio at a time: a task locks a portfolio that has queued
+# orders (skipping portfolios another task or a trade holds), runs up to
+# ORDER_QUEUE_BATCH_SIZE of its orders in submission order, each under a
+# savepoint, records every outcome and commits once for the whole batch.
+
+# Set when an order is submitted in this worker, so idle tasks start on it
+# instead of waiting for their next poll
+_wakeup = asyncio.Event()
+# order_id -> set once this worker has executed the order, for long polls
+_waiters: dict[int, asyncio.Event] = {}
+_workers: list[asyncio.Task] = []
+
+# Reported by /admin/metrics/order_queue
+counters = {
+    "batches": 0,
+    "filled": 0,
+    "rejected": 0,
+    "requeued": 0,
+    "errors": 0,
+}
+
+
+ENQUEUE_ORDER = statements.register(
+    "order_queue.enqueue_order",
+    """
+    INSERT INTO queued_orders (user_id, port_id, side, stock_ticker, num_shares, dollars)
+    VALUES (:user_id, :port_id, :side, :stock_ticker, :num_shares, :dollars)
+    RETURNING order_id, created_at
+    """,
+    prepare=True,
+)
+
+# The portfolio of the oldest queued order nobody is working on. Locking the
+# portfolio row is what a trade does first anyway, so while a batch runs no
+# other task or trade touches the portfolio, and its orders run in order.
+CLAIM_PORTFOLIO = statements.register(
+    "order_queue.claim_portfolio",
+    """
+    SELECT p.port_id
+    FROM (
+        SELECT port_id, MIN(order_id) AS oldest
+        FROM (
+            SELECT port_id, order_id
+            FROM queued_orders
+            WHERE status = 'queued'
+            ORDER BY order_id
+            LIMIT :scan
+        ) queued
+        GROUP BY port_id
+    ) candidates
+    JOIN portfolios p ON p.port_id = candidates.port_id
+    ORDER BY candidates.oldest
+    LIMIT 1
+    FOR UPDATE OF p SKIP LOCKED
+    """,
+)
+
+NEXT_ORDERS = statements.register(
+    "order_queue.next_orders",
+    """
+    SELECT order_id, user_id, side, stock_ticker, num_shares, dollars
+    FROM queued_orders
+    WHERE port_id = :port_id AND status = 'queued'
+    ORDER BY order_id
+    LIMIT :batch_size
+    """,
+)
+
+COMPLETE_ORDERS = statements.register(
+    "order_queue.complete_orders",
+    """
+    UPDATE queued_orders q
+    SET status = r.status,
+        shares_traded = r.shares_traded,
+        amount = r.amount,
+        transaction_id = r.transaction_id,
+        detail = r.detail,
+        processed_at = now()
+    FROM unnest(
+        CAST(:order_ids AS bigint[]),
+        CAST(:statuses AS text[]),
+        CAST(:shares_traded AS numeric[]),
+        CAST(:amounts AS numeric[]),
+        CAST(:transaction_ids AS integer[]),
+        CAST(:details AS text[])
+    ) AS r (order_id, status, shares_traded, amount, transaction_id, detail)
+    WHERE q.order_id = r.order_id
+    """,
+)
+
+FIND_ORDER = statements.register(
+    "order_queue.find_order",
+    """
+    SELECT order_id, status, side, stock_ticker, num_shares, dollars, shares_traded, amount,
+           transaction_id, detail, created_at, processed_at
+    FROM queued_orders
+    WHERE order_id = :order_id AND user_id = :user_id
+    """,
+)
+
+
+@dataclass
+class Outcome:
+    order_id: int
+    status: str
+    shares_traded: Decimal | None = None
+    amount: Decimal | None = None
+    transaction_id: int | None = None
+    detail: str | None = None
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, retry.VersionConflict):
+        return True
+    return (
+        isinstance(e, DBAPIError)
+        and getattr(e.orig, "sqlstate", None) in retry.RETRYABLE_SQLSTATES
+    )
+
+
+async def _execute(connection, port_id: int, order) -> Outcome | None:
+    ctx = sessions.SessionContext(
+        token="",
+        user_id=order.user_id,
+        portfolio_id=port_id,
+        watchlist_id=None,
+        connection=connection,
+    )
+    execute = trade_engine.buy if order.side == "buy" else trade_engine.sell
+
+    try:
+        trade = await trade_engine.isolated(
+            connection,
+            execute(
+                ctx,
+                order.stock_ticker,
+                num_shares=order.num_shares,
+                dollars=order.dollars,
+            ),
+        )
+    except HTTPException as e:
+        return Outcome(order.order_id, "rejected", detail=e.detail)
+    except Exception as e:
+        if _retryable(e):
+            return None
+        print(f"Error executing queued order {order.order_id}:", e)
+        return Outcome(order.order_id, "rejected", detail="Order could not be executed")
+
+    return Outcome(
+        order.order_id, "filled", trade.num_shares, trade.amount, trade.transaction_id
+    )
+
+
+async def drain_batch() -> int:
+    """
+    Runs the next batch of one portfolio's queued orders in one transaction.
+    Returns how many orders were executed, 0 if there was nothing to claim.
+    """
+
+    async with db.begin() as connection:
+        port_id = (
+            await connection.execute(
+                CLAIM_PORTFOLIO, {"scan": settings.ORDER_QUEUE_BATCH_SIZE * 4}
+            )
+        ).scalar()
+        if port_id is None:
+            return 0
+
+        orders = (
+            await connection.execute(
+                NEXT_ORDERS,
+                {"port_id": port_id, "batch_size": settings.ORDER_QUEUE_BATCH_SIZE},
+            )
+        ).fetchall()
+
+        outcomes: list[Outcome] = []
+        for order in orders:
+            outcome = await _execute(connection, port_id, order)
+            if outcome is None:
+                # Keep the portfolio's orders in order: this one and the rest
+                # wait for the next batch
+                counters["requeued"] += len(orders) - len(outcomes)
+                break
+            outcomes.append(outcome)
+
+        if outcomes:
+            await connection.execute(
+                COMPLETE_ORDERS,
+                {
+                    "order_ids": [o.order_id for o in outcomes],
+                    "statuses": [o.status for o in outcomes],
+                    "shares_traded": [o.shares_traded for o in outcomes],
+                    "amounts": [o.amount for o in outcomes],
+                    "transaction_ids": [o.transaction_id for o in outcomes],
+                    "details": [o.detail for o in outcomes],
+                },
+            )
+
+    counters["batches"] += 1
+    for outcome in outcomes:
+        counters[outcome.status] += 1
+        waiter = _waiters.get(outcome.order_id)
+        if waiter is not None:
+            waiter.set()
+    return len(outcomes)
+
+
+async def _drain_forever() -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            executed = await drain_batch()
+        except Exception as e:
+            counters["errors"] += 1
+            print("Error draining the order queue:", e)
+            executed = 0
+
+        if not executed:
+            try:
+                await asyncio.wait_for(
+                    _wakeup.wait(), settings.ORDER_QUEUE_POLL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                pass
+
+
+def notify_submitted() -> None:
+    _wakeup.set()
+
+
+async def wait_for(order_id: int, timeout: float) -> None:
+    """
+    Sleeps until this worker executes order_id or timeout seconds pass,
+    whichever comes first. Orders executed by another worker are not seen
+    here, so callers re-check the table after waking up.
+    """
+
+    waiter = _waiters.setdefault(order_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(waiter.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        if _waiters.get(order_id) is waiter:
+            del _waiters[order_id]
+
+
+def start_workers() -> None:
+    for _ in range(settings.ORDER_QUEUE_WORKERS):
+        _workers.append(asyncio.get_running_loop().create_task(_drain_forever()))
+
+
+async def stop_workers() -> None:
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
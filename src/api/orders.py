@@ -0,0 +1,872 @@
+import asyncio
+import functools
+from decimal import Decimal
+from typing import List, Literal
+
+from fastapi import APIRouter, HTTPException, Depends, status
+from pydantic import BaseModel, field_validator, model_validator
+
+from src import config
+from src import database as db
+from src import statements
+from src.api import auth, idempotency, matching, order_queue, retry, sessions
+
+settings = config.get_settings()
+
+
+router = APIRouter(
+    tags=["orders"],
+    dependencies=[Depends(auth.get_api_key)],
+)
+
+
+class LimitOrderRequest(BaseModel):
+    session_token: str
+    side: Literal["buy", "sell"]
+    stock_ticker: str
+    num_shares: float
+    limit_price: float
+
+    @field_validator("num_shares", "limit_price")
+    @classmethod
+    def validate_amount_decimal(cls, value: float) -> float:
+        if value <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and limit price must be greater than 0",
+            )
+        decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
+        if decimal_places > 2:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and limit price cannot exceed 2 decimal places",
+            )
+        return value
+
+    @field_validator("limit_price")
+    @classmethod
+    def validate_limit_price_range(cls, value: float) -> float:
+        # stock_state.price_per_share is numeric(10, 2)
+        if value >= 10**8:
+            raise HTTPException(
+                status_code=400, detail="Limit price must be less than 100000000"
+            )
+        return value
+
+
+class LimitOrderResponse(BaseModel):
+    message: str
+    order_id: int
+    status: str
+    side: str
+    stock_ticker: str
+    num_shares: float
+    limit_price: float
+    reserved: float
+    fill_price: float | None = None
+
+
+# Placing an order escrows what a fill needs, so fills never have to check
+# anything: a buy debits num_shares * limit_price from buying power, a sell
+# moves num_shares (and the same value) out of the holding. The portfolio is
+# locked first, like a trade. An order the current price already crosses is
+# still placed and is then filled straight away at that price.
+_PLACE_QUOTE = """
+    locked_portfolio AS (
+        SELECT port_id
+        FROM portfolios
+        WHERE port_id = :port_id
+        FOR UPDATE
+    ),
+    quote AS (
+        SELECT
+            s.stock_id,
+            s.ticker_symbol,
+            ss.price_per_share,
+            ROUND(CAST(:num_shares AS numeric) * CAST(:limit_price AS numeric), 2) AS reserved
+        FROM stocks s
+        LEFT JOIN stock_state ss ON ss.stock_id = s.stock_id
+        WHERE s.ticker_symbol = :ticker
+    )"""
+
+_PLACE_RESULT = """
+    SELECT
+        CASE
+            WHEN q.stock_id IS NULL THEN 'stock_not_found'
+            WHEN q.price_per_share IS NULL THEN 'price_unavailable'
+            WHEN o.order_id IS NULL THEN '{refused}'
+            ELSE 'ok'
+        END AS status,
+        q.stock_id,
+        q.ticker_symbol,
+        q.price_per_share,
+        q.price_per_share {crosses} CAST(:limit_price AS numeric) AS marketable,
+        q.reserved,
+        o.order_id
+    FROM (VALUES (1)) AS one (x)
+    LEFT JOIN quote q ON true
+    LEFT JOIN placed o ON true
+    """
+
+
+PLACE_BUY = statements.register(
+    "orders.place_buy",
+    f"""
+    WITH {_PLACE_QUOTE},
+    debit AS (
+        UPDATE portfolios p
+        SET buying_power = p.buying_power - q.reserved, version = p.version + 1
+        FROM locked_portfolio lp CROSS JOIN quote q
+        WHERE p.port_id = lp.port_id AND q.price_per_share IS NOT NULL AND p.buying_power >= q.reserved
+        RETURNING p.port_id
+    ),
+    placed AS (
+        INSERT INTO limit_orders (user_id, port_id, stock_id, side, limit_price, num_shares, reserved)
+        SELECT :user_id, d.port_id, q.stock_id, 'buy', :limit_price, :num_shares, q.reserved
+        FROM debit d CROSS JOIN quote q
+        RETURNING order_id
+    )
+    {_PLACE_RESULT.format(refused="insufficient_funds", crosses="<=")}
+    """,
+    prepare=True,
+)
+
+PLACE_SELL = statements.register(
+    "orders.place_sell",
+    f"""
+    WITH {_PLACE_QUOTE},
+    reduced AS (
+        UPDATE portfolio_holdings h
+        SET num_shares = h.num_shares - :num_shares,
+            total_shares_value = h.total_shares_value - q.reserved,
+            version = h.version + 1
+        FROM locked_portfolio lp CROSS JOIN quote q
+        WHERE h.port_id = lp.port_id AND h.stock_id = q.stock_id
+          AND q.price_per_share IS NOT NULL AND h.num_shares > :num_shares
+        RETURNING h.port_id
+    ),
+    emptied AS (
+        DELETE FROM portfolio_holdings h
+        USING locked_portfolio lp CROSS JOIN quote q
+        WHERE h.port_id = lp.port_id AND h.stock_id = q.stock_id
+          AND q.price_per_share IS NOT NULL AND h.num_shares = :num_shares
+        RETURNING h.port_id
+    ),
+    placed AS (
+        INSERT INTO limit_orders (user_id, port_id, stock_id, side, limit_price, num_shares, reserved)
+        SELECT :user_id, e.port_id, q.stock_id, 'sell', :limit_price, :num_shares, q.reserved
+        FROM (SELECT port_id FROM reduced UNION ALL SELECT port_id FROM emptied) e CROSS JOIN quote q
+        RETURNING order_id
+    )
+    {_PLACE_RESULT.format(refused="insufficient_shares", crosses=">=")}
+    """,
+    prepare=True,
+)
+
+PLACE_FAILURES = {
+    "stock_not_found": (404, "Stock not found"),
+    "price_unavailable": (404, "Stock price unavailable"),
+    "insufficient_funds": (400, "Insufficient funds"),
+    "insufficient_shares": (400, "Not enough shares to sell"),
+}
+
+
+@router.post("/limit", response_model=LimitOrderResponse)
+@retry.on_conflict
+@idempotency.replayable
+async def place_limit_order(
+    request: LimitOrderRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> LimitOrderResponse:
+    """
+    Places a limit order for the current portfolio: a buy fills once the price
+    drops to limit_price or below, a sell once it rises to limit_price or above,
+    at the price it moved to. Funds (buys) or shares (sells) are reserved until
+    the order fills or is cancelled. An order the current price already crosses
+    fills immediately.
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    limit_price = Decimal(str(request.limit_price))
+    placed = (
+        await ctx.connection.execute(
+            PLACE_BUY if request.side == "buy" else PLACE_SELL,
+            {
+                "port_id": ctx.portfolio_id,
+                "user_id": ctx.user_id,
+                "ticker": request.stock_ticker.upper(),
+                "num_shares": Decimal(str(request.num_shares)),
+                "limit_price": limit_price,
+            },
+        )
+    ).one()
+
+    if placed.status in PLACE_FAILURES:
+        status_code, detail = PLACE_FAILURES[placed.status]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    fill_price = None
+    if placed.marketable:
+        fill_price = placed.price_per_share
+        await ctx.connection.execute(
+            matching.FILL_ORDERS,
+            matching.fill_params([placed.order_id], {placed.stock_id: fill_price}),
+        )
+
+    return LimitOrderResponse(
+        message="Limit order filled" if placed.marketable else "Limit order placed",
+        order_id=placed.order_id,
+        status="filled" if placed.marketable else "open",
+        side=request.side,
+        stock_ticker=placed.ticker_symbol,
+        num_shares=request.num_shares,
+        limit_price=limit_price,
+        reserved=placed.reserved,
+        fill_price=fill_price,
+    )
+
+
+class CancelOrderRequest(BaseModel):
+    session_token: str
+    order_id: int
+
+
+class CancelOrderResponse(BaseModel):
+    message: str
+    order_id: int
+    side: str
+    num_shares: float
+    released: float
+
+
+# Hands the escrow back: buying power for a buy, the shares (and their value)
+# for a sell. The order's portfolio is locked first, so a fill of the same
+# order waits for the cancel or the other way round.
+CANCEL_ORDER = statements.register(
+    "orders.cancel_order",
+    """
+    WITH locked_portfolio AS (
+        SELECT port_id
+        FROM portfolios
+        WHERE port_id = (SELECT port_id FROM limit_orders WHERE order_id = :order_id AND user_id = :user_id)
+        FOR UPDATE
+    ),
+    cancelled AS (
+        UPDATE limit_orders o
+        SET status = 'cancelled', closed_at = now()
+        FROM locked_portfolio lp
+        WHERE o.order_id = :order_id AND o.port_id = lp.port_id AND o.status = 'open'
+        RETURNING o.order_id, o.port_id, o.stock_id, o.side, o.num_shares, o.reserved
+    ),
+    refund AS (
+        UPDATE portfolios p
+        SET buying_power = p.buying_power + c.reserved, version = p.version + 1
+        FROM cancelled c
+        WHERE p.port_id = c.port_id AND c.side = 'buy'
+    ),
+    returned AS (
+        INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+        SELECT port_id, stock_id, num_shares, reserved
+        FROM cancelled
+        WHERE side = 'sell'
+        ON CONFLICT (port_id, stock_id) DO UPDATE
+        SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
+            total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value,
+            version = portfolio_holdings.version + 1
+    )
+    SELECT
+        CASE
+            WHEN o.order_id IS NULL THEN 'order_not_found'
+            WHEN c.order_id IS NULL THEN 'not_open'
+            ELSE 'ok'
+        END AS status,
+        o.stock_id,
+        o.side,
+        o.num_shares,
+        o.reserved
+    FROM (VALUES (1)) AS one (x)
+    LEFT JOIN limit_orders o ON o.order_id = :order_id AND o.user_id = :user_id
+    LEFT JOIN cancelled c ON true
+    """,
+    prepare=True,
+)
+
+
+@router.post("/cancel", response_model=CancelOrderResponse)
+@retry.on_conflict
+@idempotency.replayable
+async def cancel_limit_order(
+    request: CancelOrderRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> CancelOrderResponse:
+    """
+    Cancels one of the user's open limit orders, from any of their portfolios,
+    and releases what it reserved
+    """
+
+    cancelled = (
+        await ctx.connection.execute(
+            CANCEL_ORDER, {"order_id": request.order_id, "user_id": ctx.user_id}
+        )
+    ).one()
+
+    if cancelled.status == "order_not_found":
+        raise HTTPException(status_code=404, detail="Order not found")
+    if cancelled.status == "not_open":
+        raise HTTPException(
+            status_code=400, detail="Order is already filled or cancelled"
+        )
+
+    ctx.after_commit.append(
+        functools.partial(matching.discard, cancelled.stock_id, request.order_id)
+    )
+
+    return CancelOrderResponse(
+        message="Limit order cancelled",
+        order_id=request.order_id,
+        side=cancelled.side,
+        num_shares=cancelled.num_shares,
+        released=cancelled.reserved,
+    )
+
+
+class ListOrdersRequest(BaseModel):
+    session_token: str
+    include_closed: bool = False
+
+
+class LimitOrderSummary(BaseModel):
+    order_id: int
+    status: str
+    side: str
+    stock_ticker: str
+    num_shares: float
+    limit_price: float
+    fill_price: float | None
+    created_at: str
+
+
+class ListOrdersResponse(BaseModel):
+    orders: List[LimitOrderSummary]
+
+
+LIST_ORDERS = statements.register(
+    "orders.list_orders",
+    """
+    SELECT o.order_id, o.status, o.side, s.ticker_symbol, o.num_shares, o.limit_price, o.fill_price, o.created_at
+    FROM limit_orders o
+    JOIN stocks s ON s.stock_id = o.stock_id
+    WHERE o.port_id = :port_id AND (o.status = 'open' OR :include_closed)
+    ORDER BY o.order_id DESC
+    LIMIT 100
+    """,
+)
+
+
+@router.post("/list_orders", response_model=ListOrdersResponse)
+async def list_orders(
+    request: ListOrdersRequest,
+    ctx: sessions.SessionContext = Depends(sessions.read_session_context),
+) -> ListOrdersResponse:
+    """
+    Lists the current portfolio's 100 most recent open limit orders, or filled
+    and cancelled ones too with include_closed
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    orders = (
+        await ctx.connection.execute(
+            LIST_ORDERS,
+            {"port_id": ctx.portfolio_id, "include_closed": request.include_closed},
+        )
+    ).fetchall()
+
+    return ListOrdersResponse(
+        orders=[
+            LimitOrderSummary(
+                order_id=o.order_id,
+                status=o.status,
+                side=o.side,
+                stock_ticker=o.ticker_symbol,
+                num_shares=o.num_shares,
+                limit_price=o.limit_price,
+                fill_price=o.fill_price,
+                created_at=o.created_at.isoformat(),
+            )
+            for o in orders
+        ]
+    )
+
+
+class TriggerRequest(BaseModel):
+    session_token: str
+    kind: Literal["stop_loss", "take_profit"]
+    stock_ticker: str
+    num_shares: float
+    trigger_price: float
+
+    @field_validator("num_shares", "trigger_price")
+    @classmethod
+    def validate_amount_decimal(cls, value: float) -> float:
+        if value <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and trigger price must be greater than 0",
+            )
+        decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
+        if decimal_places > 2:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and trigger price cannot exceed 2 decimal places",
+            )
+        return value
+
+    @field_validator("trigger_price")
+    @classmethod
+    def validate_trigger_price_range(cls, value: float) -> float:
+        if value >= 10**8:
+            raise HTTPException(
+                status_code=400, detail="Trigger price must be less than 100000000"
+            )
+        return value
+
+
+class TriggerResponse(BaseModel):
+    message: str
+    trigger_id: int
+    kind: str
+    stock_ticker: str
+    num_shares: float
+    trigger_price: float
+
+
+# Triggers are checked against the holding when created, but nothing is
+# reserved: when one fires it sells whatever is left of num_shares
+CREATE_TRIGGER = statements.register(
+    "orders.create_trigger",
+    """
+    WITH quote AS (
+        SELECT s.stock_id, s.ticker_symbol, ss.price_per_share, COALESCE(h.num_shares, 0) AS held_shares
+        FROM stocks s
+        LEFT JOIN stock_state ss ON ss.stock_id = s.stock_id
+        LEFT JOIN portfolio_holdings h ON h.port_id = :port_id AND h.stock_id = s.stock_id
+        WHERE s.ticker_symbol = :ticker
+    ),
+    created AS (
+        INSERT INTO sell_triggers (user_id, port_id, stock_id, kind, trigger_price, num_shares)
+        SELECT :user_id, :port_id, stock_id, :kind, :trigger_price, :num_shares
+        FROM quote
+        WHERE held_shares >= :num_shares
+          AND CASE
+                WHEN CAST(:kind AS varchar) = 'stop_loss' THEN price_per_share > :trigger_price
+                ELSE price_per_share < :trigger_price
+              END
+        RETURNING trigger_id
+    )
+    SELECT
+        CASE
+            WHEN q.stock_id IS NULL THEN 'stock_not_found'
+            WHEN q.price_per_share IS NULL THEN 'price_unavailable'
+            WHEN q.held_shares < :num_shares THEN 'insufficient_shares'
+            WHEN c.trigger_id IS NULL THEN 'already_crossed'
+            ELSE 'ok'
+        END AS status,
+        q.ticker_symbol,
+        c.trigger_id
+    FROM (VALUES (1)) AS one (x)
+    LEFT JOIN quote q ON true
+    LEFT JOIN created c ON true
+    """,
+    prepare=True,
+)
+
+TRIGGER_FAILURES = {
+    "stock_not_found": (404, "Stock not found"),
+    "price_unavailable": (404, "Stock price unavailable"),
+    "insufficient_shares": (400, "Not enough shares to sell"),
+    "already_crossed": (400, "The current price has already reached the trigger price"),
+}
+
+
+@router.post("/trigger", response_model=TriggerResponse)
+@retry.on_conflict
+@idempotency.replayable
+async def create_trigger(
+    request: TriggerRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> TriggerResponse:
+    """
+    Sets a stop-loss (sell once the price drops to trigger_price or below) or
+    take-profit (sell once it rises to trigger_price or above) on a holding of
+    the current portfolio. The sell runs at the price that crossed the trigger.
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    created = (
+        await ctx.connection.execute(
+            CREATE_TRIGGER,
+            {
+                "port_id": ctx.portfolio_id,
+                "user_id": ctx.user_id,
+                "ticker": request.stock_ticker.upper(),
+                "kind": request.kind,
+                "num_shares": Decimal(str(request.num_shares)),
+                "trigger_price": Decimal(str(request.trigger_price)),
+            },
+        )
+    ).one()
+
+    if created.status in TRIGGER_FAILURES:
+        status_code, detail = TRIGGER_FAILURES[created.status]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return TriggerResponse(
+        message="Trigger created",
+        trigger_id=created.trigger_id,
+        kind=request.kind,
+        stock_ticker=created.ticker_symbol,
+        num_shares=request.num_shares,
+        trigger_price=request.trigger_price,
+    )
+
+
+class CancelTriggerRequest(BaseModel):
+    session_token: str
+    trigger_id: int
+
+
+class CancelTriggerResponse(BaseModel):
+    message: str
+    trigger_id: int
+
+
+CANCEL_TRIGGER = statements.register(
+    "orders.cancel_trigger",
+    """
+    WITH cancelled AS (
+        UPDATE sell_triggers
+        SET status = 'cancelled', closed_at = now()
+        WHERE trigger_id = :trigger_id AND user_id = :user_id AND status = 'active'
+        RETURNING trigger_id
+    )
+    SELECT
+        CASE
+            WHEN t.trigger_id IS NULL THEN 'trigger_not_found'
+            WHEN c.trigger_id IS NULL THEN 'not_active'
+            ELSE 'ok'
+        END AS status
+    FROM (VALUES (1)) AS one (x)
+    LEFT JOIN sell_triggers t ON t.trigger_id = :trigger_id AND t.user_id = :user_id
+    LEFT JOIN cancelled c ON true
+    """,
+)
+
+
+@router.post("/cancel_trigger", response_model=CancelTriggerResponse)
+@retry.on_conflict
+async def cancel_trigger(
+    request: CancelTriggerRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> CancelTriggerResponse:
+    """
+    Cancels one of the user's active stop-loss / take-profit triggers
+    """
+
+    cancelled = (
+        await ctx.connection.execute(
+            CANCEL_TRIGGER, {"trigger_id": request.trigger_id, "user_id": ctx.user_id}
+        )
+    ).one()
+
+    if cancelled.status == "trigger_not_found":
+        raise HTTPException(status_code=404, detail="Trigger not found")
+    if cancelled.status == "not_active":
+        raise HTTPException(
+            status_code=400, detail="Trigger has already fired or been cancelled"
+        )
+
+    return CancelTriggerResponse(
+        message="Trigger cancelled", trigger_id=request.trigger_id
+    )
+
+
+class TriggerSummary(BaseModel):
+    trigger_id: int
+    status: str
+    kind: str
+    stock_ticker: str
+    num_shares: float
+    trigger_price: float
+    fill_price: float | None
+    num_sold: float | None
+    created_at: str
+
+
+class ListTriggersResponse(BaseModel):
+    triggers: List[TriggerSummary]
+
+
+LIST_TRIGGERS = statements.register(
+    "orders.list_triggers",
+    """
+    SELECT
+        t.trigger_id, t.status, t.kind, s.ticker_symbol, t.num_shares, t.trigger_price,
+        t.fill_price, t.num_sold, t.created_at
+    FROM sell_triggers t
+    JOIN stocks s ON s.stock_id = t.stock_id
+    WHERE t.port_id = :port_id AND (t.status = 'active' OR :include_closed)
+    ORDER BY t.trigger_id DESC
+    LIMIT 100
+    """,
+)
+
+
+@router.post("/list_triggers", response_model=ListTriggersResponse)
+async def list_triggers(
+    request: ListOrdersRequest,
+    ctx: sessions.SessionContext = Depends(sessions.read_session_context),
+) -> ListTriggersResponse:
+    """
+    Lists the current portfolio's 100 most recent active triggers, or fired and
+    cancelled ones too with include_closed
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    rows = (
+        await ctx.connection.execute(
+            LIST_TRIGGERS,
+            {"port_id": ctx.portfolio_id, "include_closed": request.include_closed},
+        )
+    ).fetchall()
+
+    return ListTriggersResponse(
+        triggers=[
+            TriggerSummary(
+                trigger_id=t.trigger_id,
+                status=t.status,
+                kind=t.kind,
+                stock_ticker=t.ticker_symbol,
+                num_shares=t.num_shares,
+                trigger_price=t.trigger_price,
+                fill_price=t.fill_price,
+                num_sold=t.num_sold,
+                created_at=t.created_at.isoformat(),
+            )
+            for t in rows
+        ]
+    )
+
+
+class SubmitOrderRequest(BaseModel):
+    session_token: str
+    side: Literal["buy", "sell"]
+    stock_ticker: str
+    num_shares: float | None = None
+    dollars: float | None = None
+
+    @field_validator("num_shares", "dollars")
+    @classmethod
+    def validate_amount_decimal(cls, value: float | None) -> float | None:
+        if value is None:
+            return value
+        if value <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and dollars must be greater than 0",
+            )
+        decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
+        if decimal_places > 2:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and dollars cannot exceed 2 decimal places",
+            )
+        return value
+
+    @model_validator(mode="after")
+    def validate_one_amount(self) -> "SubmitOrderRequest":
+        if (self.num_shares is None) == (self.dollars is None):
+            raise HTTPException(
+                status_code=400,
+                detail="An order needs exactly one of num_shares or dollars",
+            )
+        return self
+
+
+class SubmitOrderResponse(BaseModel):
+    message: str
+    order_id: int
+    status: str
+    submitted_at: str
+
+
+@router.post(
+    "/submit", response_model=SubmitOrderResponse, status_code=status.HTTP_202_ACCEPTED
+)
+@retry.on_conflict
+async def submit_order(
+    request: SubmitOrderRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> SubmitOrderResponse:
+    """
+    Queues a market buy or sell (num_shares or dollars) for the current
+    portfolio and answers 202 with its order id without waiting for it to
+    run. Queued orders of a portfolio run in submission order; follow one with
+    /orders/submission_status or /orders/submission_status/wait.
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    queued = (
+        await ctx.connection.execute(
+            order_queue.ENQUEUE_ORDER,
+            {
+                "user_id": ctx.user_id,
+                "port_id": ctx.portfolio_id,
+                "side": request.side,
+                "stock_ticker": request.stock_ticker.upper(),
+                "num_shares": Decimal(str(request.num_shares))
+                if request.num_shares is not None
+                else None,
+                "dollars": Decimal(str(request.dollars))
+                if request.dollars is not None
+                else None,
+            },
+        )
+    ).one()
+
+    ctx.after_commit.append(order_queue.notify_submitted)
+
+    return SubmitOrderResponse(
+        message="Order queued",
+        order_id=queued.order_id,
+        status="queued",
+        submitted_at=queued.created_at.isoformat(),
+    )
+
+
+class SubmissionStatusRequest(BaseModel):
+    session_token: str
+    order_id: int
+
+
+class SubmissionWaitRequest(SubmissionStatusRequest):
+    wait_seconds: float = 10
+
+
+class SubmissionStatusResponse(BaseModel):
+    order_id: int
+    status: str  # "queued", "filled" or "rejected"
+    side: str
+    stock_ticker: str
+    num_shares: float | None
+    dollars: float | None
+    shares_traded: float | None
+    amount: float | None
+    transaction_id: int | None
+    detail: str | None
+    submitted_at: str
+    processed_at: str | None
+
+
+def _submission_status(order) -> SubmissionStatusResponse:
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    return SubmissionStatusResponse(
+        order_id=order.order_id,
+        status=order.status,
+        side=order.side,
+        stock_ticker=order.stock_ticker,
+        num_shares=order.num_shares,
+        dollars=order.dollars,
+        shares_traded=order.shares_traded,
+        amount=order.amount,
+        transaction_id=order.transaction_id,
+        detail=order.detail,
+        submitted_at=order.created_at.isoformat(),
+        processed_at=order.processed_at.isoformat() if order.processed_at else None,
+    )
+
+
+@router.post("/submission_status", response_model=SubmissionStatusResponse)
+async def submission_status(
+    request: SubmissionStatusRequest,
+    ctx: sessions.SessionContext = Depends(sessions.read_session_context),
+) -> SubmissionStatusResponse:
+    """
+    Reports whether a submitted order is still queued, filled (with what it
+    traded) or rejected (with the reason a trade would have failed with)
+    """
+
+    order = (
+        await ctx.connection.execute(
+            order_queue.FIND_ORDER,
+            {"order_id": request.order_id, "user_id": ctx.user_id},
+        )
+    ).first()
+
+    return _submission_status(order)
+
+
+async def _find_submitted_order(token: str, order_id: int):
+    # A short transaction per look, so a waiting request holds no connection
+    async with db.begin_read(use_primary=True) as connection:
+        ctx = await sessions.resolve_session(connection, token)
+        if ctx is None:
+            raise HTTPException(status_code=401, detail="Invalid session token")
+
+        return (
+            await connection.execute(
+                order_queue.FIND_ORDER, {"order_id": order_id, "user_id": ctx.user_id}
+            )
+        ).first()
+
+
+@router.post("/submission_status/wait", response_model=SubmissionStatusResponse)
+async def wait_for_submission(
+    request: SubmissionWaitRequest,
+    token: str = Depends(sessions.session_token),
+) -> SubmissionStatusResponse:
+    """
+    Long-poll version of /orders/submission_status: answers as soon as the
+    order is no longer queued, or with its current status after wait_seconds
+    (at most ORDER_STATUS_MAX_WAIT_SECONDS)
+    """
+
+    if request.wait_seconds < 0:
+        raise HTTPException(status_code=400, detail="wait_seconds cannot be negative")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(
+        request.wait_seconds, settings.ORDER_STATUS_MAX_WAIT_SECONDS
+    )
+    while True:
+        order = await _find_submitted_order(token, request.order_id)
+        remaining = deadline - loop.time()
+        if order is None or order.status != "queued" or remaining <= 0:
+            return _submission_status(order)
+
+        # Woken early if this worker runs the order; another worker's run is
+        # noticed on the next look
+        await order_queue.wait_for(
+            request.order_id, min(remaining, settings.ORDER_QUEUE_POLL_SECONDS)
+        )
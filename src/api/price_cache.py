@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import TypeGuard
+
+import psycopg
+from sqlalchemy.engine import Connection
+
+from src import config
+from src import database as db
+from src import statements
+
+settings = config.get_settings()
+
+# Every stock's price, served to /stocks/price and /stocks/prices from memory.
+# Prices only change when the price updater ticks, and every tick sends a
+# NOTIFY on CHANNEL in the same transaction. Each worker LISTENs on it and
+# reloads the table once the tick has committed. A table older than
+# PRICE_CACHE_MAX_AGE_SECONDS is reloaded by the next request instead, which
+# bounds staleness when notifications stop arriving (listener down or
+# reconnecting).
+
+CHANNEL = "stock_prices"
+
+
+@dataclass(frozen=True)
+class StockPrice:
+    ticker_symbol: str
+    stock_name: str
+    price_per_share: Decimal
+    # Unix time of the tick that set the price
+    ticked_at: float
+
+
+@dataclass(frozen=True)
+class PriceTable:
+    by_ticker: dict[str, StockPrice]
+    loaded_at: float
+    # The database's Unix time when the table was loaded
+    loaded_db_time: float
+
+    @property
+    def ticked_at(self) -> float:
+        return max((stock.ticked_at for stock in self.by_ticker.values()), default=0.0)
+
+    def db_time(self) -> float:
+        # The database's current time, without asking it
+        return self.loaded_db_time + time.monotonic() - self.loaded_at
+
+
+# Replaced as a whole on every reload, so readers never see half a tick
+_table: PriceTable | None = None
+_reload_lock = asyncio.Lock()
+
+# Reported by /admin/metrics/price_cache
+counters = {
+    "hits": 0,
+    "reloads": 0,
+    "stale_reloads": 0,
+    "notifications": 0,
+    "listener_errors": 0,
+}
+
+
+LOAD_PRICES = statements.register(
+    "price_cache.load_prices",
+    """
+    SELECT
+        s.ticker_symbol,
+        s.stock_name,
+        ss.price_per_share,
+        EXTRACT(EPOCH FROM CAST(ss.updated_at AS timestamptz)) AS ticked_at,
+        EXTRACT(EPOCH FROM now()) AS db_time
+    FROM stocks s
+    JOIN stock_state ss ON s.stock_id = ss.stock_id
+    ORDER BY s.stock_id
+    """,
+)
+
+NOTIFY_PRICES = statements.register("price_cache.notify_prices", f"NOTIFY {CHANNEL}")
+
+
+def _build(rows) -> PriceTable:
+    return PriceTable(
+        by_ticker={
+            row.ticker_symbol: StockPrice(
+                row.ticker_symbol,
+                row.stock_name,
+                row.price_per_share,
+                float(row.ticked_at),
+            )
+            for row in rows
+        },
+        loaded_at=time.monotonic(),
+        loaded_db_time=float(rows[0].db_time) if rows else time.time(),
+    )
+
+
+def reload(connection: Connection) -> None:
+    global _table
+    _table = _build(connection.execute(LOAD_PRICES).fetchall())
+    counters["reloads"] += 1
+
+
+def _fresh(table: PriceTable | None) -> TypeGuard[PriceTable]:
+    return (
+        table is not None
+        and time.monotonic() - table.loaded_at < settings.PRICE_CACHE_MAX_AGE_SECONDS
+    )
+
+
+async def prices() -> PriceTable:
+    """
+    The current price table, loaded from the database first if this worker
+    has none or it is older than PRICE_CACHE_MAX_AGE_SECONDS
+    """
+
+    global _table
+    table = _table
+    if _fresh(table):
+        counters["hits"] += 1
+        return table
+
+    # One request reloads, the others waiting here get its result
+    async with _reload_lock:
+        table = _table
+        if not _fresh(table):
+            async with db.begin_read() as connection:
+                table = _build((await connection.execute(LOAD_PRICES)).fetchall())
+            _table = table
+            counters["reloads"] += 1
+            counters["stale_reloads"] += 1
+    return table
+
+
+def _listen_url() -> str:
+    # psycopg wants a plain libpq URL, not SQLAlchemy's postgresql+psycopg://
+    return db.engine.url.set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+
+
+def listen_for_ticks():
+    """
+    Reloads the table as soon as a price tick commits, and every half
+    PRICE_CACHE_MAX_AGE_SECONDS without one, so requests rarely find it stale.
+    Runs forever on its own connection (outside the pool), reconnecting
+    after errors.
+    """
+
+    while True:
+        try:
+            with psycopg.connect(_listen_url(), autocommit=True) as listener:
+                listener.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    with db.engine.connect() as connection:
+                        reload(connection)
+                    for _ in listener.notifies(
+                        timeout=settings.PRICE_CACHE_MAX_AGE_SECONDS / 2, stop_after=1
+                    ):
+                        counters["notifications"] += 1
+        except Exception as e:
+            counters["listener_errors"] += 1
+            print("Error listening for price ticks:", e)
+        time.sleep(settings.PRICE_CACHE_MAX_AGE_SECONDS)
+
+
+def start_listener():
+    threading.Thread(target=listen_for_ticks, daemon=True).start()
+
+
+def stats() -> dict:
+    table = _table
+    return {
+        "enabled": settings.PRICE_CACHE_ENABLED,
+        "max_age_seconds": settings.PRICE_CACHE_MAX_AGE_SECONDS,
+        "stocks": len(table.by_ticker) if table else 0,
+        "age_seconds": round(time.monotonic() - table.loaded_at, 3) if table else None,
+        **counters,
+    }
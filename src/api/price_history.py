@@ -0,0 +1,92 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src import config
+from src import database as db
+from src import statements
+from src.downsample import lttb
+
+settings = config.get_settings()
+
+# Every tick appends the prices it wrote to price_history (see
+# state.MOVE_PRICES), which is partitioned by day. The price updater keeps
+# today's and tomorrow's partitions in place and drops the ones older than
+# PRICE_HISTORY_RETENTION_DAYS, at most once per MAINTENANCE_INTERVAL_SECONDS.
+
+MAINTENANCE_INTERVAL_SECONDS = 3600
+
+# When this worker last maintained the partitions (monotonic)
+_maintained_at: float | None = None
+
+
+MAINTAIN_PARTITIONS = statements.register(
+    "price_history.maintain_partitions",
+    "SELECT maintain_price_history_partitions(:keep_days) AS dropped",
+)
+
+# A stock's history between start and end (both optional and inclusive), as
+# one row of arrays in time order; no row if the ticker does not exist. The
+# bounds are converted to the database's local time, like the stored ts.
+STOCK_HISTORY = statements.register(
+    "price_history.stock_history",
+    """
+    SELECT h.timestamps, h.prices
+    FROM stocks s
+    CROSS JOIN LATERAL (
+        SELECT
+            array_agg(CAST(EXTRACT(EPOCH FROM ph.ts) AS double precision) ORDER BY ph.ts) AS timestamps,
+            array_agg(CAST(ph.price AS double precision) ORDER BY ph.ts) AS prices
+        FROM price_history ph
+        WHERE ph.stock_id = s.stock_id
+          AND ph.ts >= COALESCE(CAST(CAST(:start AS timestamptz) AS timestamp), '-infinity')
+          AND ph.ts <= COALESCE(CAST(CAST(:end AS timestamptz) AS timestamp), 'infinity')
+    ) h
+    WHERE s.ticker_symbol = :ticker_symbol
+    """,
+    prepare=True,
+)
+
+
+def maintain() -> int:
+    """
+    Creates the partitions the next ticks need and drops expired ones, in its
+    own transaction, unless this worker did so recently. Returns how many
+    partitions were dropped.
+    """
+
+    global _maintained_at
+    if (
+        _maintained_at is not None
+        and time.monotonic() - _maintained_at < MAINTENANCE_INTERVAL_SECONDS
+    ):
+        return 0
+
+    with db.engine.begin() as connection:
+        dropped = (
+            connection.execute(
+                MAINTAIN_PARTITIONS,
+                {"keep_days": settings.PRICE_HISTORY_RETENTION_DAYS},
+            )
+            .one()
+            .dropped
+        )
+    _maintained_at = time.monotonic()
+    return dropped
+
+
+def downsample(
+    timestamps: list[float], prices: list[float], points: int
+) -> list[tuple[datetime, float]]:
+    """
+    At most `points` (timestamp, price) pairs of the series, picked with LTTB.
+    Timestamps come back as the naive local times they were stored as.
+    """
+
+    x = np.array(timestamps, dtype=np.float64)
+    y = np.array(prices, dtype=np.float64)
+    return [
+        (datetime.fromtimestamp(x[i], timezone.utc).replace(tzinfo=None), float(y[i]))
+        for i in lttb(x, y, points)
+    ]
@@ -0,0 +1,131 @@
+import asyncio
+import functools
+import random
+from typing import Any, Callable, Coroutine, ParamSpec, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+
+from src import config
+from src.api import sessions
+
+settings = config.get_settings()
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# SQLSTATEs that mean "run the whole transaction again", by counter name
+RETRYABLE_SQLSTATES = {
+    "40001": "serialization_failures",
+    "40P01": "deadlocks",
+}
+
+
+class VersionConflict(Exception):
+    """
+    Raised when an optimistic write finds that a row changed since it was read.
+    Retried like a serialization failure.
+    """
+
+
+# Per endpoint counters for this worker, reported by /admin/metrics/retries
+counters: dict[str, dict[str, int]] = {}
+
+
+def backoff_seconds(attempt: int) -> float:
+    """
+    Full jitter: a random delay between 0 and the exponential backoff for this
+    attempt, capped at RETRY_MAX_DELAY_MS, so retrying requests spread out
+    """
+
+    ceiling = min(
+        settings.RETRY_MAX_DELAY_MS, settings.RETRY_BASE_DELAY_MS * 2 ** (attempt - 1)
+    )
+    return random.uniform(0, ceiling) / 1000
+
+
+async def _restart(ctx: sessions.SessionContext):
+    # The session is re-resolved in the new transaction, in case the current
+    # portfolio or watchlist changed while waiting
+    fresh = await sessions.resolve_session(ctx.connection, ctx.token)
+    if fresh is None:
+        raise HTTPException(status_code=401, detail="Invalid session token")
+
+    ctx.user_id = fresh.user_id
+    ctx.portfolio_id = fresh.portfolio_id
+    ctx.watchlist_id = fresh.watchlist_id
+
+
+def on_conflict(
+    handler: Callable[P, Coroutine[Any, Any, T]],
+) -> Callable[P, Coroutine[Any, Any, T]]:
+    """
+    Decorator for write endpoints: re-runs the handler in a fresh transaction
+    when Postgres aborts it with a serialization failure or deadlock, or an
+    optimistic write raises VersionConflict. Handlers using a session
+    dependency get their transaction rolled back and restarted on the same
+    connection; handlers that open their own transaction are simply called
+    again. Gives up with 409 after RETRY_MAX_ATTEMPTS attempts.
+    """
+
+    name = f"{handler.__module__.rsplit('.', 1)[-1]}.{handler.__name__}"
+    stats = counters.setdefault(
+        name,
+        {
+            "serialization_failures": 0,
+            "deadlocks": 0,
+            "version_conflicts": 0,
+            "retries": 0,
+            "recovered": 0,
+            "exhausted": 0,
+        },
+    )
+
+    @functools.wraps(handler)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        ctx = next(
+            (
+                value
+                for value in kwargs.values()
+                if isinstance(value, sessions.SessionContext)
+            ),
+            None,
+        )
+
+        attempt = 1
+        while True:
+            try:
+                result = await handler(*args, **kwargs)
+            except (DBAPIError, VersionConflict) as e:
+                reason: str | None
+                if isinstance(e, VersionConflict):
+                    reason = "version_conflicts"
+                else:
+                    reason = RETRYABLE_SQLSTATES.get(getattr(e.orig, "sqlstate", ""))
+                if reason is None:
+                    raise
+                stats[reason] += 1
+
+                if attempt >= settings.RETRY_MAX_ATTEMPTS:
+                    stats["exhausted"] += 1
+                    raise HTTPException(
+                        status_code=409,
+                        detail="Request conflicted with a concurrent update, please try again",
+                    ) from e
+
+                # Release this transaction's locks before waiting
+                if ctx is not None:
+                    await ctx.connection.rollback()
+                await asyncio.sleep(backoff_seconds(attempt))
+                if ctx is not None:
+                    await _restart(ctx)
+
+                stats["retries"] += 1
+                attempt += 1
+                continue
+
+            if attempt > 1:
+                stats["recovered"] += 1
+            return result
+
+    return wrapper
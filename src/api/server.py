@@ -1,17 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from src import config
+from src import database as db
 from src.api.stocks import router as stocks_router
 from src.api.user import router as user_router
 from src.api.watchlists import router as watchlists_router
 from src.api.portfolio import router as portfolio_router
 from src.api.transactions import router as transactions_router
-from src.api.history import router as history_router 
+from src.api.history import router as history_router
 from src.api.admin import router as admin_router
+from src.api.orders import router as orders_router
+from src.api import hashing, order_queue, price_cache, signed_tokens, state, sweeper
 from starlette.middleware.cors import CORSMiddleware
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background jobs shared by every request in this worker
+    if config.get_settings().SESSION_TOKEN_MODE == "signed":
+        signed_tokens.start_revocation_refresher()
+    sweeper.start_sweeper()
+    if config.get_settings().PRICE_UPDATER_ENABLED:
+        state.start_price_updater()
+    if config.get_settings().PRICE_CACHE_ENABLED:
+        price_cache.start_listener()
+    order_queue.start_workers()
+    yield
+    await order_queue.stop_workers()
+    hashing.shutdown()
+    await db.dispose()
+
+
 app = FastAPI(
     title="Mini Stock Market",
     description="A miniature stock market API with buy, sell, and price endpoints. Create a user, login, and you will receive a session token that will be used for any endpoints you plan to use that involve your account. Once you log out, the session token will no longer be active and you will have to log back in to receive another active token.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 origins = ["*"]
@@ -20,7 +44,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"], 
+    allow_methods=["*"],
     allow_headers=["*"],
 )
 
@@ -29,6 +53,7 @@ app.include_router(user_router, prefix="/users", tags=["users"])
 app.include_router(watchlists_router, prefix="/watchlists", tags=["watchlists"])
 app.include_router(portfolio_router, prefix="/portfolio", tags=["portfolio"])
 app.include_router(transactions_router, prefix="/transactions", tags=["transactions"])
+app.include_router(orders_router, prefix="/orders", tags=["orders"])
 app.include_router(history_router, prefix="/history", tags=["history"])
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
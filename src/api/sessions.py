@@ -0,0 +1,296 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src import config
+from src import database as db
+from src import statements
+from src.api import signed_tokens
+from src.cache import TTLCache
+
+settings = config.get_settings()
+
+# Maps session token -> user_id. Entries are per worker process, so a logout
+# handled by another worker (or a session expiring) is only seen here once the
+# entry's TTL runs out.
+session_cache = TTLCache(
+    max_size=settings.SESSION_CACHE_SIZE,
+    ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS,
+)
+
+# Sessions that wrote within READ_YOUR_WRITES_SECONDS; their reads skip the replicas.
+# Per worker process, like session_cache.
+recent_writes = TTLCache(
+    max_size=settings.SESSION_CACHE_SIZE
+    if settings.READ_YOUR_WRITES_SECONDS > 0
+    else 0,
+    ttl_seconds=settings.READ_YOUR_WRITES_SECONDS,
+)
+
+
+@dataclass
+class SessionContext:
+    """
+    Everything an authenticated handler needs about the caller, plus the
+    connection (with an open transaction) the handler should keep using.
+    """
+
+    token: str
+    user_id: int
+    portfolio_id: int | None
+    watchlist_id: int | None
+    connection: AsyncConnection | db.ThreadedConnection
+    # Run by the session dependency once the handler's transaction has committed
+    after_commit: list[Callable[[], None]] = field(default_factory=list)
+
+
+RESOLVE_SESSION_BY_USER = statements.register(
+    "sessions.resolve_session_by_user",
+    """
+    SELECT u.id AS user_id, ucp.current_portfolio, ucw.current_watchlist
+    FROM users u
+    LEFT JOIN user_current_portfolio ucp ON ucp.user_id = u.id
+    LEFT JOIN user_current_watchlist ucw ON ucw.user_id = u.id
+    WHERE u.id = :user_id
+    """,
+    prepare=True,
+)
+
+RESOLVE_SESSION_BY_TOKEN = statements.register(
+    "sessions.resolve_session_by_token",
+    """
+    SELECT t.user_id, ucp.current_portfolio, ucw.current_watchlist
+    FROM temp_user_tokens t
+    LEFT JOIN user_current_portfolio ucp ON ucp.user_id = t.user_id
+    LEFT JOIN user_current_watchlist ucw ON ucw.user_id = t.user_id
+    WHERE t.token = :token
+      AND t.generated_at > LOCALTIMESTAMP - make_interval(secs => :ttl)
+    """,
+    prepare=True,
+)
+
+
+async def resolve_session(
+    connection: AsyncConnection | db.ThreadedConnection, token: str
+) -> SessionContext | None:
+    """
+    Resolves the user, their current portfolio and their current watchlist in
+    a single query. Returns None if the token is not an active session.
+    """
+
+    user_id: int | None
+    if settings.SESSION_TOKEN_MODE == "signed":
+        # Signed tokens are validated without touching the database
+        claims = signed_tokens.verify(token)
+        if claims is None:
+            return None
+        user_id = claims.user_id
+    else:
+        user_id = session_cache.get(token)
+
+    if user_id is not None:
+        # Token already validated, only the current selections are needed
+        row = (
+            await connection.execute(RESOLVE_SESSION_BY_USER, {"user_id": user_id})
+        ).first()
+    else:
+        row = (
+            await connection.execute(
+                RESOLVE_SESSION_BY_TOKEN,
+                {"token": token, "ttl": settings.SESSION_TTL_SECONDS},
+            )
+        ).first()
+
+        if row:
+            session_cache.set(token, row.user_id)
+
+    if not row:
+        return None
+
+    return SessionContext(
+        token=token,
+        user_id=row.user_id,
+        portfolio_id=row.current_portfolio,
+        watchlist_id=row.current_watchlist,
+        connection=connection,
+    )
+
+
+async def session_token(request: Request) -> str:
+    """
+    Pulls session_token out of the JSON body (POST endpoints) or the query string (GET endpoints)
+    """
+
+    token = request.query_params.get("session_token")
+
+    if token is None and await request.body():
+        body = await request.json()
+        if isinstance(body, dict):
+            token = body.get("session_token")
+
+    if not isinstance(token, str):
+        raise HTTPException(status_code=401, detail="Invalid session token")
+
+    return token
+
+
+def _session_dependency(
+    isolation_level: str | None = None, records_write: bool = False
+):
+    async def dependency(
+        token: str = Depends(session_token),
+    ) -> AsyncIterator[SessionContext]:
+        # Commits once the handler returns, rolls back if it raises
+        async with db.begin(isolation_level) as connection:
+            ctx = await resolve_session(connection, token)
+            if ctx is None:
+                raise HTTPException(status_code=401, detail="Invalid session token")
+            yield ctx
+
+        # Only reached once the write has committed
+        if records_write:
+            recent_writes.set(token, True)
+        for callback in ctx.after_commit:
+            callback()
+
+    return dependency
+
+
+async def read_session_context(
+    token: str = Depends(session_token),
+) -> AsyncIterator[SessionContext]:
+    """
+    Session dependency for read-only handlers: runs them in a READ ONLY
+    transaction on a read replica, or on the primary right after this session wrote
+    """
+
+    use_primary = recent_writes.get(token) is not None
+
+    async with db.begin_read(use_primary) as connection:
+        ctx = await resolve_session(connection, token)
+        if ctx is not None:
+            yield ctx
+            return
+
+    if use_primary or not db.read_engines:
+        raise HTTPException(status_code=401, detail="Invalid session token")
+
+    # The replica may not have replayed a login that just happened yet
+    db.read_routing["session_fallbacks"] += 1
+    async with db.begin_read(use_primary=True) as connection:
+        ctx = await resolve_session(connection, token)
+        if ctx is None:
+            raise HTTPException(status_code=401, detail="Invalid session token")
+        yield ctx
+
+
+# FastAPI dependencies injected into every authenticated endpoint
+session_context = _session_dependency()
+write_session_context = _session_dependency(records_write=True)
+# Trades are single guarded statements (see trade_engine), which are
+# race-free under the default READ COMMITTED and never fail to serialize
+trade_session_context = write_session_context
+
+
+INSERT_SESSION = statements.register(
+    "sessions.insert_session",
+    """
+    INSERT INTO temp_user_tokens (token, user_id) 
+    VALUES (:token, :user_id)
+    """,
+)
+
+
+async def create_session(connection: AsyncConnection, user_id: int) -> str:
+    """
+    Starts a session for the user and returns its token
+    """
+
+    if settings.SESSION_TOKEN_MODE == "signed":
+        return signed_tokens.issue(user_id)
+
+    # Generate temporary token & insert into temp_user_tokens table
+    token = str(uuid.uuid4())
+    await connection.execute(INSERT_SESSION, {"token": token, "user_id": user_id})
+    return token
+
+
+FIND_USER_ID = statements.register(
+    "sessions.find_user_id",
+    """
+    SELECT id FROM users WHERE username = :username
+    """,
+)
+
+DELETE_USER_SESSION = statements.register(
+    "sessions.delete_user_session",
+    """
+    DELETE FROM temp_user_tokens
+    WHERE token = :token AND user_id = (
+        SELECT id FROM users WHERE username = :username
+    )
+    RETURNING user_id
+    """,
+)
+
+DELETE_SESSION = statements.register(
+    "sessions.delete_session",
+    """
+    DELETE FROM temp_user_tokens
+    WHERE token = :token
+    RETURNING user_id
+    """,
+)
+
+
+async def end_session(
+    connection: AsyncConnection, token: str, username: str | None = None
+) -> int | None:
+    """
+    Ends a session (optionally only if it belongs to username).
+    Returns the session's user_id, or None if there was no such active session.
+    """
+
+    if settings.SESSION_TOKEN_MODE == "signed":
+        claims = signed_tokens.verify(token)
+        if claims is None:
+            return None
+
+        if username is not None:
+            owner = (
+                await connection.execute(FIND_USER_ID, {"username": username})
+            ).first()
+            if not owner or owner.id != claims.user_id:
+                return None
+
+        await signed_tokens.revoke(connection, claims)
+        return claims.user_id
+
+    if username is not None:
+        res = (
+            await connection.execute(
+                DELETE_USER_SESSION, {"username": username, "token": token}
+            )
+        ).first()
+    else:
+        res = (await connection.execute(DELETE_SESSION, {"token": token})).first()
+
+    if not res:
+        return None
+
+    # Stop serving the token from the session cache
+    invalidate_token(token)
+    return res.user_id
+
+
+def invalidate_token(token: str) -> None:
+    session_cache.invalidate(token)
+
+
+def invalidate_user(user_id: int) -> int:
+    return session_cache.invalidate_where(
+        lambda cached_user_id: cached_user_id == user_id
+    )
@@ -0,0 +1,215 @@
+import base64
+import hashlib
+import hmac
+import math
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src import config
+from src import database as db
+from src import statements
+
+settings = config.get_settings()
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    user_id: int
+    expires_at: int
+    jti: str
+
+
+def _sign(payload: str, secret: str) -> str:
+    digest = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue(
+    user_id: int, secret: str | None = None, ttl_seconds: int | None = None
+) -> str:
+    """
+    Issues a token of the form "<user_id>.<expires_at>.<jti>.<signature>"
+    """
+
+    secret = secret or settings.SESSION_SECRET
+    # Settings refuses to start in signed mode without SESSION_SECRET
+    assert secret is not None
+    ttl_seconds = ttl_seconds or settings.SIGNED_TOKEN_TTL_SECONDS
+
+    expires_at = int(time.time()) + ttl_seconds
+    jti = secrets.token_urlsafe(12)
+    payload = f"{user_id}.{expires_at}.{jti}"
+
+    return f"{payload}.{_sign(payload, secret)}"
+
+
+def decode(token: str, secret: str | None = None) -> TokenClaims | None:
+    """
+    Checks the signature and expiry of a token, without consulting revocations
+    """
+
+    secret = secret or settings.SESSION_SECRET
+    # Settings refuses to start in signed mode without SESSION_SECRET
+    assert secret is not None
+
+    parts = token.split(".")
+    if len(parts) != 4:
+        return None
+
+    user_id, expires_at, jti, signature = parts
+    if not hmac.compare_digest(
+        signature, _sign(f"{user_id}.{expires_at}.{jti}", secret)
+    ):
+        return None
+
+    claims = TokenClaims(user_id=int(user_id), expires_at=int(expires_at), jti=jti)
+    if claims.expires_at <= time.time():
+        return None
+
+    return claims
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized for the given capacity and false positive rate
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.num_bits = max(
+            64, int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: derive every probe from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevocationSet:
+    """
+    Revoked token ids (jti -> expires_at). The Bloom filter answers the common
+    "not revoked" case, the exact map settles the filter's false positives.
+    """
+
+    def __init__(self, min_capacity: int = 1024):
+        self.min_capacity = min_capacity
+        self._exact: dict[str, int] = {}
+        self._bloom_capacity = min_capacity
+        self._bloom = BloomFilter(min_capacity)
+        self._lock = threading.Lock()
+
+    def add(self, jti: str, expires_at: int) -> None:
+        with self._lock:
+            self._exact[jti] = expires_at
+            if len(self._exact) > self._bloom_capacity:
+                self._rebuild()
+            else:
+                self._bloom.add(jti)
+
+    def merge(self, entries: dict[str, int]) -> None:
+        """
+        Adds revocations loaded from the database and forgets expired ones
+        """
+        with self._lock:
+            self._exact.update(entries)
+            now = time.time()
+            self._exact = {jti: exp for jti, exp in self._exact.items() if exp > now}
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._bloom_capacity = max(self.min_capacity, 2 * len(self._exact))
+        bloom = BloomFilter(self._bloom_capacity)
+        for jti in self._exact:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def __contains__(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            return False
+        return jti in self._exact
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+
+revocations = RevocationSet()
+
+
+def verify(token: str) -> TokenClaims | None:
+    """
+    Validates a signed token with no database access
+    """
+
+    claims = decode(token)
+    if claims is None or claims.jti in revocations:
+        return None
+    return claims
+
+
+INSERT_REVOCATION = statements.register(
+    "signed_tokens.insert_revocation",
+    """
+    INSERT INTO revoked_session_tokens (jti, expires_at)
+    VALUES (:jti, to_timestamp(:expires_at) AT TIME ZONE 'UTC')
+    ON CONFLICT (jti) DO NOTHING
+    """,
+)
+
+
+async def revoke(connection: AsyncConnection, claims: TokenClaims) -> None:
+    await connection.execute(
+        INSERT_REVOCATION, {"jti": claims.jti, "expires_at": claims.expires_at}
+    )
+
+    # Takes effect in this worker right away, other workers pick it up on refresh
+    revocations.add(claims.jti, claims.expires_at)
+
+
+LOAD_REVOCATIONS = statements.register(
+    "signed_tokens.load_revocations",
+    """
+    SELECT jti, EXTRACT(EPOCH FROM expires_at AT TIME ZONE 'UTC')::bigint AS expires_at
+    FROM revoked_session_tokens
+    WHERE expires_at > NOW() AT TIME ZONE 'UTC'
+    """,
+)
+
+
+def refresh_revocations(connection: Connection) -> None:
+    rows = connection.execute(LOAD_REVOCATIONS).fetchall()
+
+    revocations.merge({row.jti: row.expires_at for row in rows})
+
+
+def refresh_revocations_periodically():
+    while True:
+        try:
+            with db.engine.begin() as connection:
+                refresh_revocations(connection)
+        except Exception as e:
+            print("Error refreshing revoked session tokens:", e)
+        time.sleep(settings.REVOCATION_REFRESH_SECONDS)
+
+
+def start_revocation_refresher():
+    threading.Thread(target=refresh_revocations_periodically, daemon=True).start()
@@ -1,39 +1,208 @@
 import threading
-import random
 import time
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from src.database import SessionLocal
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy.engine import Connection
+
+from src import config
+from src import database as db
+from src import statements
+from src.api import candles, matching, price_cache, price_history, triggers
+from src.price_model import PriceModel, load_correlation
+
+settings = config.get_settings()
+
+# Result of the most recent price update in this worker
+last_update: dict = {}
+
+
+# Prices due for a move, as one row of arrays ordered by stock_id. Prices that
+# moved less than an interval ago are left alone, so running several workers
+# does not move prices faster; a worker that finds nothing due does nothing.
+DUE_PRICES = statements.register(
+    "state.due_prices",
+    """
+    WITH due AS (
+        SELECT ss.stock_id, s.ticker_symbol, ss.price_per_share, ss.drift, ss.volatility
+        FROM stock_state ss
+        JOIN stocks s ON s.stock_id = ss.stock_id
+        WHERE ss.updated_at <= LOCALTIMESTAMP - make_interval(secs => :interval)
+    )
+    SELECT
+        array_agg(stock_id ORDER BY stock_id) AS stock_ids,
+        array_agg(ticker_symbol ORDER BY stock_id) AS tickers,
+        array_agg(CAST(price_per_share AS double precision) ORDER BY stock_id) AS prices,
+        array_agg(drift ORDER BY stock_id) AS drift,
+        array_agg(volatility ORDER BY stock_id) AS volatility
+    FROM due
+    """,
+)
+
+# Writes a whole tick in one statement, appends it to price_history and adds
+# it to its candles. Prices are rounded to cents and kept within 1.00 and what
+# numeric(10, 2) holds. The due check is repeated here rather than locking the
+# rows when reading them: a row another worker moved in the meantime fails it
+# (once that worker commits) and keeps its price.
+MOVE_PRICES = statements.register(
+    "state.move_prices",
+    f"""
+    WITH moved AS (
+        UPDATE stock_state ss
+        SET price_per_share = LEAST(GREATEST(ROUND(p.price, 2), 1.00), 99999999.99),
+            updated_at = now()
+        FROM unnest(CAST(:stock_ids AS integer[]), CAST(:prices AS numeric[])) AS p (stock_id, price)
+        WHERE ss.stock_id = p.stock_id
+          AND ss.updated_at <= LOCALTIMESTAMP - make_interval(secs => :interval)
+        RETURNING ss.stock_id, ss.price_per_share, ss.updated_at
+    ),
+    history AS (
+        INSERT INTO price_history (stock_id, ts, price)
+        SELECT stock_id, updated_at, price_per_share
+        FROM moved
+    ),
+    candles AS ({candles.UPSERT_CANDLES.format(ticks="moved")}
+    )
+    SELECT array_agg(stock_id) AS stock_ids, array_agg(price_per_share) AS prices
+    FROM moved
+    """,
+)
+
+_model: PriceModel | None = None
+
+
+def build_model() -> PriceModel:
+    matrix = (
+        load_correlation(settings.PRICE_CORRELATION_FILE)
+        if settings.PRICE_CORRELATION_FILE
+        else None
+    )
+    return PriceModel(
+        correlation=settings.PRICE_CORRELATION,
+        matrix=matrix,
+        jump_probability=settings.PRICE_JUMP_PROBABILITY,
+        jump_mean=settings.PRICE_JUMP_MEAN,
+        jump_stddev=settings.PRICE_JUMP_STDDEV,
+        seed=settings.PRICE_SEED,
+    )
+
+
+def move_prices(connection: Connection) -> dict[int, Decimal]:
+    """
+    Moves every price that is due one step of the price model, inside the
+    caller's transaction. Returns the new prices by stock_id.
+    """
+
+    global _model
+    if _model is None:
+        _model = build_model()
+
+    interval = settings.PRICE_UPDATE_INTERVAL_SECONDS
+    due = connection.execute(DUE_PRICES, {"interval": interval}).one()
+    if not due.stock_ids:
+        return {}
+
+    prices = _model.step(
+        due.tickers,
+        np.array(due.prices, dtype=np.float64),
+        np.array(due.drift, dtype=np.float64),
+        np.array(due.volatility, dtype=np.float64),
+    )
+    moved = connection.execute(
+        MOVE_PRICES,
+        {"stock_ids": due.stock_ids, "prices": prices.tolist(), "interval": interval},
+    ).one()
+    return dict(zip(moved.stock_ids or [], moved.prices or []))
+
+
+# Every portfolio the tick writes to, locked at once in port_id order like a
+# trade: those of the crossed orders and those of the crossed triggers. Locking
+# them in two rounds could deadlock against a trade batch holding portfolios
+# from both sets.
+LOCK_TICK_PORTFOLIOS = statements.register(
+    "state.lock_tick_portfolios",
+    f"""
+    SELECT port_id
+    FROM portfolios
+    WHERE port_id IN ({matching.FILL_PORTFOLIOS})
+       OR port_id IN (SELECT port_id FROM ({triggers.CROSSED}) crossed)
+    ORDER BY port_id
+    FOR UPDATE
+    """,
+)
+
+
+def fill_and_fire(
+    connection: Connection, prices: dict[int, Decimal]
+) -> tuple[int, int]:
+    """
+    Fills the resting limit orders and fires the triggers the new prices (by
+    stock_id) cross, inside the caller's transaction. Returns how many orders
+    filled and how many triggers fired. Call matching.reset() if the
+    transaction does not commit.
+    """
+
+    order_ids = matching.crossed(connection, prices)
+    port_ids = list(
+        connection.execute(
+            LOCK_TICK_PORTFOLIOS,
+            {
+                "order_ids": order_ids,
+                "stock_ids": list(prices),
+                "prices": list(prices.values()),
+            },
+        ).scalars()
+    )
+    if not port_ids:
+        return 0, 0
+
+    return matching.fill(connection, order_ids, prices), triggers.fire(
+        connection, prices, port_ids
+    )
+
+
+def update_prices() -> dict:
+    """
+    Moves every stock's price, fills the resting limit orders and fires the
+    stop-loss / take-profit triggers the new prices cross, in one transaction.
+    Returns a summary of the run.
+    """
+
+    started = time.monotonic()
+
+    price_history.maintain()
+    with db.engine.begin() as connection:
+        prices = move_prices(connection)
+        orders_filled, triggers_fired = (
+            fill_and_fire(connection, prices) if prices else (0, 0)
+        )
+        # Delivered to every worker's price cache when this transaction commits
+        if prices:
+            connection.execute(price_cache.NOTIFY_PRICES)
+
+    return {
+        "ran_at": time.time(),
+        "duration_ms": round((time.monotonic() - started) * 1000, 2),
+        "prices_moved": len(prices),
+        "orders_filled": orders_filled,
+        "triggers_fired": triggers_fired,
+    }
+
 
 def update_price_periodically():
+    global last_update
     while True:
-        db: Session = SessionLocal()
         try:
-            # Fetch all stocks already in the DB
-            results = db.execute(text("SELECT id, price FROM stock_state")).fetchall()
-            for row in results:
-                stock_id, current_price = row
-                # Random change between -5 and +5; new price will be at least 1.0
-                change = random.uniform(-5, 5)
-                new_price = max(current_price + change, 1.0)
-                db.execute(
-                    text("UPDATE stock_state SET price = :new_price, updated_at = NOW() WHERE id = :stock_id"),
-                    {"new_price": new_price, "stock_id": stock_id}
-                )
-            db.commit()
+            last_update = update_prices()
         except Exception as e:
             print("Error updating prices:", e)
-        finally:
-            db.close()
-        # Sleep for 10 minutes (600 seconds) on production, 1 second for local/dev
-        sleep_seconds = 600 if not is_render() else 60
-        time.sleep(sleep_seconds)
-
-def is_render():
-    # Render sets the RENDER environment variable
-    import os
-    return os.environ.get("RENDER", "").lower() == "true"
-
-# Only start the background thread if NOT running on Render
-if not is_render():
-    threading.Thread(target=update_price_periodically, daemon=True).start()
\ No newline at end of file
+            # Crossed orders already left the books, reload them
+            matching.reset()
+        time.sleep(settings.PRICE_UPDATE_INTERVAL_SECONDS)
+
+
+def start_price_updater():
+    global _model
+    # Fails at startup rather than on every tick if the model is misconfigured
+    _model = build_model()
+    threading.Thread(target=update_price_periodically, daemon=True).start()
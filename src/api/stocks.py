@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, field_validator
 from decimal import Decimal
-from typing import List
+from typing import List, Literal
 from collections import defaultdict
 from datetime import datetime
 
-import sqlalchemy
-from src.api import auth
+from src import config
+from src import statements
+from src.api import auth, candles, conditional, price_cache, price_history
 from src import database as db
 
+settings = config.get_settings()
+
 
 router = APIRouter(
     tags=["stocks"],
@@ -21,62 +25,245 @@ class GetPriceResponse(BaseModel):
     stock_name: str
     price_per_share: float
 
+
+GET_PRICE = statements.register(
+    "stocks.get_price",
+    """
+    SELECT
+        s.ticker_symbol,
+        s.stock_name,
+        ss.price_per_share,
+        EXTRACT(EPOCH FROM CAST(ss.updated_at AS timestamptz)) AS ticked_at,
+        EXTRACT(EPOCH FROM now()) AS db_time
+    FROM stocks s
+    JOIN stock_state ss ON  s.stock_id = ss.stock_id 
+    WHERE s.ticker_symbol = :ticker_symbol
+    """,
+    prepare=True,
+)
+
+
 @router.get("/price", response_model=GetPriceResponse)
-def get_price(stock_ticker: str) -> GetPriceResponse:
+async def get_price(
+    stock_ticker: str, request: Request, response: Response
+) -> GetPriceResponse | Response:
     """
-    Returns the info of the specified stock based on ticker symbol
+    Returns the info of the specified stock based on ticker symbol, or 304
+    if the client's copy is from the stock's latest price tick
     """
-    
+
+    if price_cache.settings.PRICE_CACHE_ENABLED:
+        table = await price_cache.prices()
+        stock = table.by_ticker.get(stock_ticker.upper())
+        if stock is None:
+            raise HTTPException(status_code=404, detail="Stock not found")
+
+        not_modified = conditional.validate(
+            request, response, stock.ticked_at, table.db_time()
+        )
+        if not_modified:
+            return not_modified
+
+        return GetPriceResponse(
+            stock_ticker=stock.ticker_symbol,
+            stock_name=stock.stock_name,
+            price_per_share=float(stock.price_per_share),
+        )
+
     # Retrieve the stock information
-    with db.engine.begin() as connection:
-        result = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT s.ticker_symbol, s.stock_name, ss.price_per_share 
-                FROM stocks s
-                JOIN stock_state ss ON  s.stock_id = ss.stock_id 
-                WHERE s.ticker_symbol = :ticker_symbol
-                """
-            ),
-            {"ticker_symbol": stock_ticker.upper()}
+    async with db.begin_read() as connection:
+        result = (
+            await connection.execute(GET_PRICE, {"ticker_symbol": stock_ticker.upper()})
         ).first()
-        
+
         if not result:
             raise HTTPException(status_code=404, detail="Stock not found")
-        
+
+        not_modified = conditional.validate(
+            request, response, float(result.ticked_at), float(result.db_time)
+        )
+        if not_modified:
+            return not_modified
+
         stock_ticker = result.ticker_symbol
         stock_name = result.stock_name
         price_per_share = result.price_per_share
 
         return GetPriceResponse(
-            stock_ticker = stock_ticker,
-            stock_name = stock_name,
-            price_per_share = float(price_per_share)
+            stock_ticker=stock_ticker,
+            stock_name=stock_name,
+            price_per_share=float(price_per_share),
         )
 
 
-@router.get("/prices")
-def get_all_prices() -> list[GetPriceResponse]:
+GET_ALL_PRICES = statements.register(
+    "stocks.get_all_prices",
+    """
+    SELECT
+        s.ticker_symbol,
+        s.stock_name,
+        ss.price_per_share,
+        EXTRACT(EPOCH FROM CAST(ss.updated_at AS timestamptz)) AS ticked_at,
+        EXTRACT(EPOCH FROM now()) AS db_time
+    FROM stocks s
+    JOIN stock_state ss ON  s.stock_id = ss.stock_id 
+    ORDER BY s.stock_id
+    """,
+)
+
+
+@router.get("/prices", response_model=list[GetPriceResponse])
+async def get_all_prices(
+    request: Request, response: Response
+) -> list[GetPriceResponse] | Response:
     """
-    Retrieves every stock from the available catalog
+    Retrieves every stock from the available catalog, or 304 if the client's
+    copy is from the latest price tick
     """
 
-    with db.engine.begin() as connection:
-        results = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT s.ticker_symbol, s.stock_name, ss.price_per_share 
-                FROM stocks s
-                JOIN stock_state ss ON  s.stock_id = ss.stock_id 
-                """
+    if price_cache.settings.PRICE_CACHE_ENABLED:
+        table = await price_cache.prices()
+        not_modified = conditional.validate(
+            request, response, table.ticked_at, table.db_time()
+        )
+        if not_modified:
+            return not_modified
+
+        return [
+            GetPriceResponse(
+                stock_ticker=stock.ticker_symbol,
+                stock_name=stock.stock_name,
+                price_per_share=float(stock.price_per_share),
             )
-        ).fetchall()
-        
+            for stock in table.by_ticker.values()
+        ]
+
+    async with db.begin_read() as connection:
+        results = (await connection.execute(GET_ALL_PRICES)).fetchall()
+
+        if results:
+            not_modified = conditional.validate(
+                request,
+                response,
+                max(float(row.ticked_at) for row in results),
+                float(results[0].db_time),
+            )
+            if not_modified:
+                return not_modified
+
         return [
-            GetPriceResponse( 
-                stock_ticker = row.ticker_symbol,
-                stock_name = row.stock_name,
-                price_per_share = float(row.price_per_share)
-            ) 
+            GetPriceResponse(
+                stock_ticker=row.ticker_symbol,
+                stock_name=row.stock_name,
+                price_per_share=float(row.price_per_share),
+            )
             for row in results
         ]
+
+
+class PricePoint(BaseModel):
+    timestamp: datetime
+    price: float
+
+
+@router.get("/{stock_ticker}/history")
+async def get_price_history(
+    stock_ticker: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    points: int = Query(
+        default=settings.PRICE_HISTORY_MAX_POINTS,
+        ge=2,
+        le=settings.PRICE_HISTORY_MAX_POINTS,
+    ),
+) -> list[PricePoint]:
+    """
+    Returns the stock's price at every tick between start and end (both
+    optional, inclusive), downsampled to at most `points` points that keep the
+    shape of the series
+    """
+
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    async with db.begin_read() as connection:
+        history = (
+            await connection.execute(
+                price_history.STOCK_HISTORY,
+                {"ticker_symbol": stock_ticker.upper(), "start": start, "end": end},
+            )
+        ).first()
+
+    if history is None:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    if not history.timestamps:
+        return []
+
+    # Picking points from a long range is CPU work, keep it off the event loop
+    series = await run_in_threadpool(
+        price_history.downsample, history.timestamps, history.prices, points
+    )
+    return [PricePoint(timestamp=timestamp, price=price) for timestamp, price in series]
+
+
+class Candle(BaseModel):
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    tick_count: int
+
+
+@router.get("/{stock_ticker}/candles")
+async def get_candles(
+    stock_ticker: str,
+    resolution: Literal["1m", "1h", "1d"] = "1h",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int = Query(
+        default=settings.PRICE_HISTORY_MAX_POINTS,
+        ge=1,
+        le=settings.PRICE_HISTORY_MAX_POINTS,
+    ),
+) -> list[Candle]:
+    """
+    Returns the stock's open / high / low / close candles at the resolution,
+    oldest first: the latest `limit` of those between start and end (both
+    optional; the candle start falls in is included). Timestamps are the
+    start of each candle.
+    """
+
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    async with db.begin_read() as connection:
+        rows = (
+            await connection.execute(
+                candles.STOCK_CANDLES,
+                {
+                    "ticker_symbol": stock_ticker.upper(),
+                    "resolution": resolution,
+                    "unit": candles.RESOLUTIONS[resolution],
+                    "start": start,
+                    "end": end,
+                    "limit": limit,
+                },
+            )
+        ).fetchall()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Stock not found")
+
+    return [
+        Candle(
+            timestamp=row.bucket,
+            open=float(row.open),
+            high=float(row.high),
+            low=float(row.low),
+            close=float(row.close),
+            tick_count=row.tick_count,
+        )
+        for row in reversed(rows)
+        if row.bucket is not None
+    ]
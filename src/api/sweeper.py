@@ -0,0 +1,134 @@
+import threading
+import time
+
+import sqlalchemy
+from sqlalchemy.engine import Connection
+
+from src import config
+from src import database as db
+from src import statements
+
+settings = config.get_settings()
+
+# Result of the most recent sweep in this worker, reported by /admin/metrics/sessions
+last_sweep: dict = {}
+
+
+def table_stats(connection: Connection, table: str) -> dict:
+    row = connection.execute(
+        sqlalchemy.text(
+            f"""
+            SELECT COUNT(*) AS row_count, pg_total_relation_size('{table}') AS total_bytes
+            FROM {table}
+            """
+        )
+    ).one()
+    return {"rows": row.row_count, "total_bytes": row.total_bytes}
+
+
+def _delete_batch(statement: sqlalchemy.TextClause, params: dict) -> int:
+    # Each batch is its own short transaction so row locks are released quickly
+    with db.engine.begin() as connection:
+        return connection.execute(statement, params).rowcount
+
+
+def _delete_in_batches(statement: sqlalchemy.TextClause, params: dict) -> int:
+    deleted = 0
+    while True:
+        count = _delete_batch(
+            statement, {**params, "batch_size": settings.SESSION_SWEEP_BATCH_SIZE}
+        )
+        deleted += count
+        if count < settings.SESSION_SWEEP_BATCH_SIZE:
+            return deleted
+
+
+# SKIP LOCKED lets several workers sweep at once without waiting on each other
+EXPIRED_SESSIONS = statements.register(
+    "sweeper.expired_sessions",
+    """
+    DELETE FROM temp_user_tokens
+    WHERE token IN (
+        SELECT token
+        FROM temp_user_tokens
+        WHERE generated_at <= LOCALTIMESTAMP - make_interval(secs => :ttl)
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    """,
+)
+
+EXPIRED_REVOCATIONS = statements.register(
+    "sweeper.expired_revocations",
+    """
+    DELETE FROM revoked_session_tokens
+    WHERE jti IN (
+        SELECT jti
+        FROM revoked_session_tokens
+        WHERE expires_at <= NOW() AT TIME ZONE 'UTC'
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    """,
+)
+
+EXPIRED_IDEMPOTENCY_KEYS = statements.register(
+    "sweeper.expired_idempotency_keys",
+    """
+    DELETE FROM idempotency_keys
+    WHERE (user_id, idempotency_key) IN (
+        SELECT user_id, idempotency_key
+        FROM idempotency_keys
+        WHERE created_at <= LOCALTIMESTAMP - make_interval(secs => :ttl)
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    """,
+)
+
+
+def sweep_expired_sessions() -> dict:
+    """
+    Deletes expired session tokens, revocations and idempotency keys, returns a
+    summary of the run
+    """
+
+    started = time.monotonic()
+
+    with db.engine.connect() as connection:
+        before = table_stats(connection, "temp_user_tokens")
+
+    sessions_deleted = _delete_in_batches(
+        EXPIRED_SESSIONS, {"ttl": settings.SESSION_TTL_SECONDS}
+    )
+    revocations_deleted = _delete_in_batches(EXPIRED_REVOCATIONS, {})
+    idempotency_keys_deleted = _delete_in_batches(
+        EXPIRED_IDEMPOTENCY_KEYS, {"ttl": settings.IDEMPOTENCY_TTL_SECONDS}
+    )
+
+    with db.engine.connect() as connection:
+        after = table_stats(connection, "temp_user_tokens")
+
+    return {
+        "ran_at": time.time(),
+        "duration_ms": round((time.monotonic() - started) * 1000, 2),
+        "sessions_deleted": sessions_deleted,
+        "revocations_deleted": revocations_deleted,
+        "idempotency_keys_deleted": idempotency_keys_deleted,
+        "temp_user_tokens_before": before,
+        "temp_user_tokens_after": after,
+    }
+
+
+def sweep_periodically():
+    global last_sweep
+    while True:
+        try:
+            last_sweep = sweep_expired_sessions()
+        except Exception as e:
+            print("Error sweeping expired sessions:", e)
+        time.sleep(settings.SESSION_SWEEP_INTERVAL_SECONDS)
+
+
+def start_sweeper():
+    threading.Thread(target=sweep_periodically, daemon=True).start()
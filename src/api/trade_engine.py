@@ -0,0 +1,663 @@
+from dataclasses import dataclass
+from typing import Awaitable, TypeVar
+from decimal import Decimal, ROUND_HALF_UP
+
+from fastapi import HTTPException
+
+from src import config
+from src import statements
+from src.api import retry, sessions, transaction_totals
+
+settings = config.get_settings()
+
+# Every trade is a single statement: the funds (or shares) check, the portfolio
+# and holdings updates and the ledger insert all happen in one round trip.
+#
+# Lock order is fixed for both sides: the portfolios row first (locked_portfolio),
+# then the portfolio_holdings row. Every data-modifying CTE joins
+# locked_portfolio, so it cannot touch a holding before the portfolio lock is
+# held, and a concurrent buy and sell on one portfolio queue up instead of
+# deadlocking. Anything else that locks both tables must follow the same order.
+#
+# The guarded UPDATEs re-check their conditions after waiting for a lock, so
+# this is safe under READ COMMITTED. Exactly one of :num_shares and :dollars is set.
+_QUOTE = """
+    locked_portfolio AS (
+        SELECT port_id, buying_power
+        FROM portfolios
+        WHERE port_id = :port_id
+        FOR UPDATE
+    ),
+    quote AS (
+        SELECT
+            s.stock_id,
+            s.ticker_symbol,
+            ss.price_per_share,
+            COALESCE(CAST(:num_shares AS numeric), CAST(:dollars AS numeric) / ss.price_per_share) AS num_shares
+        FROM stocks s
+        LEFT JOIN stock_state ss ON ss.stock_id = s.stock_id
+        WHERE s.ticker_symbol = :ticker
+    )"""
+
+# Refusal reasons are checked in the order a caller would want to hear them
+_RESULT = """
+    SELECT
+        CASE
+            WHEN q.stock_id IS NULL THEN 'stock_not_found'
+            WHEN q.price_per_share IS NULL THEN 'price_unavailable'
+            WHEN l.transaction_id IS NULL THEN '{refused}'
+            ELSE 'ok'
+        END AS status,
+        q.ticker_symbol,
+        q.num_shares,
+        t.amount,
+        l.transaction_id
+    FROM (VALUES (1)) AS one (x)
+    LEFT JOIN quote q ON true
+    LEFT JOIN trade t ON true
+    LEFT JOIN ledger l ON true
+    """
+
+
+BUY = statements.register(
+    "trade_engine.buy",
+    f"""
+    WITH {_QUOTE},
+    trade AS (
+        SELECT stock_id, num_shares, ROUND(num_shares * price_per_share, 2) AS amount
+        FROM quote
+        WHERE price_per_share IS NOT NULL
+    ),
+    debit AS (
+        UPDATE portfolios p
+        SET buying_power = p.buying_power - t.amount, version = p.version + 1
+        FROM locked_portfolio lp CROSS JOIN trade t
+        WHERE p.port_id = lp.port_id AND p.buying_power >= t.amount
+        RETURNING p.port_id
+    ),
+    holding AS (
+        INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+        SELECT d.port_id, t.stock_id, t.num_shares, t.amount
+        FROM debit d CROSS JOIN trade t
+        ON CONFLICT (port_id, stock_id) DO UPDATE
+        SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
+            total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value,
+            version = portfolio_holdings.version + 1
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT d.port_id, :user_id, t.stock_id, 'buy', t.amount
+        FROM debit d CROSS JOIN trade t
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    {_RESULT.format(refused="insufficient_funds")}
+    """,
+    prepare=True,
+)
+
+# Holdings store shares to 2 decimal places, so sells compare and subtract the
+# rounded share count. A sell of the whole position deletes the holding.
+SELL = statements.register(
+    "trade_engine.sell",
+    f"""
+    WITH {_QUOTE},
+    trade AS (
+        SELECT
+            stock_id,
+            ROUND(num_shares, 2) AS share_delta,
+            ROUND(num_shares * price_per_share, 2) AS amount
+        FROM quote
+        WHERE price_per_share IS NOT NULL
+    ),
+    reduced AS (
+        UPDATE portfolio_holdings h
+        SET num_shares = h.num_shares - t.share_delta,
+            total_shares_value = h.total_shares_value - t.amount,
+            version = h.version + 1
+        FROM locked_portfolio lp CROSS JOIN trade t
+        WHERE h.port_id = lp.port_id AND h.stock_id = t.stock_id AND h.num_shares > t.share_delta
+        RETURNING h.port_id
+    ),
+    emptied AS (
+        DELETE FROM portfolio_holdings h
+        USING locked_portfolio lp CROSS JOIN trade t
+        WHERE h.port_id = lp.port_id AND h.stock_id = t.stock_id AND h.num_shares = t.share_delta
+        RETURNING h.port_id
+    ),
+    sold AS (
+        SELECT port_id FROM reduced
+        UNION ALL
+        SELECT port_id FROM emptied
+    ),
+    credit AS (
+        UPDATE portfolios p
+        SET buying_power = p.buying_power + t.amount, version = p.version + 1
+        FROM sold CROSS JOIN trade t
+        WHERE p.port_id = sold.port_id
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT sold.port_id, :user_id, t.stock_id, 'sell', t.amount
+        FROM sold CROSS JOIN trade t
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    {_RESULT.format(refused="insufficient_shares")}
+    """,
+    prepare=True,
+)
+
+# Failure statuses returned by BUY / SELL
+TRADE_FAILURES = {
+    "stock_not_found": (404, "Stock not found"),
+    "price_unavailable": (404, "Stock price unavailable"),
+    "insufficient_funds": (400, "Insufficient funds"),
+    "insufficient_shares": (400, "Not enough shares to sell"),
+}
+
+
+@dataclass
+class TradeResult:
+    ticker_symbol: str
+    num_shares: Decimal
+    amount: Decimal
+    transaction_id: int
+
+
+def _price(
+    price: Decimal, num_shares: float | None, dollars: float | None
+) -> tuple[Decimal, Decimal, Decimal]:
+    # Same arithmetic as BUY / SELL: (exact shares, shares rounded for holdings, amount)
+    shares = (
+        Decimal(str(num_shares))
+        if num_shares is not None
+        else Decimal(str(dollars)) / price
+    )
+    amount = (shares * price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return shares, shares.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP), amount
+
+
+# Optimistic mode (TRADE_CONCURRENCY_MODE=optimistic): the trade reads the
+# portfolio and holding without locking them, checks funds / shares in Python,
+# then writes with conditional updates that only apply if both rows still have
+# the version that was read. Every trade write bumps the versions. A lost race
+# writes the ledger row nowhere and raises retry.VersionConflict, which rolls
+# the transaction back and retries it.
+OPTIMISTIC_READ = statements.register(
+    "trade_engine.optimistic_read",
+    """
+    SELECT
+        p.buying_power,
+        p.version AS portfolio_version,
+        s.stock_id,
+        s.ticker_symbol,
+        ss.price_per_share,
+        h.num_shares AS held_shares,
+        h.version AS holding_version
+    FROM portfolios p
+    LEFT JOIN stocks s ON s.ticker_symbol = :ticker
+    LEFT JOIN stock_state ss ON ss.stock_id = s.stock_id
+    LEFT JOIN portfolio_holdings h ON h.port_id = p.port_id AND h.stock_id = s.stock_id
+    WHERE p.port_id = :port_id
+    """,
+    prepare=True,
+)
+
+# A holding that did not exist when read (NULL version) conflicts with one
+# inserted in the meantime through the ON CONFLICT ... WHERE
+OPTIMISTIC_BUY = statements.register(
+    "trade_engine.optimistic_buy",
+    f"""
+    WITH debit AS (
+        UPDATE portfolios
+        SET buying_power = buying_power - :amount, version = version + 1
+        WHERE port_id = :port_id AND version = :portfolio_version
+        RETURNING port_id
+    ),
+    holding AS (
+        INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+        SELECT port_id, :stock_id, :share_delta, :amount
+        FROM debit
+        ON CONFLICT (port_id, stock_id) DO UPDATE
+        SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
+            total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value,
+            version = portfolio_holdings.version + 1
+        WHERE portfolio_holdings.version = CAST(:holding_version AS bigint)
+        RETURNING port_id
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT port_id, :user_id, :stock_id, 'buy', :amount
+        FROM holding
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    SELECT (SELECT transaction_id FROM ledger) AS transaction_id
+    """,
+    prepare=True,
+)
+
+OPTIMISTIC_SELL = statements.register(
+    "trade_engine.optimistic_sell",
+    f"""
+    WITH credit AS (
+        UPDATE portfolios
+        SET buying_power = buying_power + :amount, version = version + 1
+        WHERE port_id = :port_id AND version = :portfolio_version
+        RETURNING port_id
+    ),
+    reduced AS (
+        UPDATE portfolio_holdings h
+        SET num_shares = h.num_shares - :share_delta,
+            total_shares_value = h.total_shares_value - :amount,
+            version = h.version + 1
+        FROM credit c
+        WHERE h.port_id = c.port_id AND h.stock_id = :stock_id
+          AND h.version = :holding_version AND NOT :empties
+        RETURNING h.port_id
+    ),
+    emptied AS (
+        DELETE FROM portfolio_holdings h
+        USING credit c
+        WHERE h.port_id = c.port_id AND h.stock_id = :stock_id
+          AND h.version = :holding_version AND :empties
+        RETURNING h.port_id
+    ),
+    sold AS (
+        SELECT port_id FROM reduced
+        UNION ALL
+        SELECT port_id FROM emptied
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT port_id, :user_id, :stock_id, 'sell', :amount
+        FROM sold
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    SELECT (SELECT transaction_id FROM ledger) AS transaction_id
+    """,
+    prepare=True,
+)
+
+
+async def _execute(
+    statement,
+    ctx: sessions.SessionContext,
+    stock_ticker: str,
+    num_shares: float | None,
+    dollars: float | None,
+) -> TradeResult:
+    trade = (
+        await ctx.connection.execute(
+            statement,
+            {
+                "port_id": ctx.portfolio_id,
+                "user_id": ctx.user_id,
+                "ticker": stock_ticker.upper(),
+                "num_shares": Decimal(str(num_shares))
+                if num_shares is not None
+                else None,
+                "dollars": Decimal(str(dollars)) if dollars is not None else None,
+            },
+        )
+    ).one()
+
+    if trade.status in TRADE_FAILURES:
+        status_code, detail = TRADE_FAILURES[trade.status]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    return TradeResult(
+        trade.ticker_symbol, trade.num_shares, trade.amount, trade.transaction_id
+    )
+
+
+async def _execute_optimistic(
+    side: str,
+    ctx: sessions.SessionContext,
+    stock_ticker: str,
+    num_shares: float | None,
+    dollars: float | None,
+) -> TradeResult:
+    state = (
+        await ctx.connection.execute(
+            OPTIMISTIC_READ,
+            {"port_id": ctx.portfolio_id, "ticker": stock_ticker.upper()},
+        )
+    ).first()
+
+    if state is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    failure = None
+    if state.stock_id is None:
+        failure = "stock_not_found"
+    elif state.price_per_share is None:
+        failure = "price_unavailable"
+    else:
+        shares, share_delta, amount = _price(state.price_per_share, num_shares, dollars)
+        if side == "buy" and state.buying_power < amount:
+            failure = "insufficient_funds"
+        elif side == "sell" and (
+            state.held_shares is None or state.held_shares < share_delta
+        ):
+            failure = "insufficient_shares"
+
+    if failure is not None:
+        status_code, detail = TRADE_FAILURES[failure]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    params = {
+        "port_id": ctx.portfolio_id,
+        "user_id": ctx.user_id,
+        "stock_id": state.stock_id,
+        "share_delta": share_delta,
+        "amount": amount,
+        "portfolio_version": state.portfolio_version,
+        "holding_version": state.holding_version,
+    }
+    if side == "buy":
+        written = (await ctx.connection.execute(OPTIMISTIC_BUY, params)).one()
+    else:
+        written = (
+            await ctx.connection.execute(
+                OPTIMISTIC_SELL, {**params, "empties": state.held_shares == share_delta}
+            )
+        ).one()
+
+    # Part of the write may have applied; the retry rolls the whole transaction back
+    if written.transaction_id is None:
+        raise retry.VersionConflict(
+            f"portfolio {ctx.portfolio_id} changed during a {side}"
+        )
+
+    return TradeResult(state.ticker_symbol, shares, amount, written.transaction_id)
+
+
+async def buy(
+    ctx: sessions.SessionContext,
+    stock_ticker: str,
+    num_shares: float | None = None,
+    dollars: float | None = None,
+) -> TradeResult:
+    """
+    Buys either num_shares or dollars worth of a stock for the caller's current
+    portfolio, locking it (pessimistic) or checking row versions (optimistic)
+    depending on TRADE_CONCURRENCY_MODE. Raises the matching HTTPException if
+    the trade was refused.
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    if settings.TRADE_CONCURRENCY_MODE == "optimistic":
+        return await _execute_optimistic("buy", ctx, stock_ticker, num_shares, dollars)
+    return await _execute(BUY, ctx, stock_ticker, num_shares, dollars)
+
+
+async def sell(
+    ctx: sessions.SessionContext,
+    stock_ticker: str,
+    num_shares: float | None = None,
+    dollars: float | None = None,
+) -> TradeResult:
+    """
+    Sells either num_shares or dollars worth of a stock from the caller's
+    current portfolio, the same way buy() does.
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    if settings.TRADE_CONCURRENCY_MODE == "optimistic":
+        return await _execute_optimistic("sell", ctx, stock_ticker, num_shares, dollars)
+    return await _execute(SELL, ctx, stock_ticker, num_shares, dollars)
+
+
+# Batches lock the same way as single trades: the portfolio row first, then the
+# holdings of every ticker in the batch in stock_id order. Quotes for every
+# ticker come back in the same query. Batches lock in both concurrency modes.
+BATCH_QUOTES = statements.register(
+    "trade_engine.batch_quotes",
+    """
+    WITH locked_portfolio AS (
+        SELECT port_id, buying_power
+        FROM portfolios
+        WHERE port_id = :port_id
+        FOR UPDATE
+    ),
+    locked_holdings AS (
+        SELECT h.stock_id, h.num_shares, h.total_shares_value
+        FROM portfolio_holdings h
+        JOIN locked_portfolio lp ON lp.port_id = h.port_id
+        JOIN stocks s ON s.stock_id = h.stock_id
+        WHERE s.ticker_symbol = ANY(:tickers)
+        ORDER BY h.stock_id
+        FOR UPDATE OF h
+    )
+    SELECT
+        lp.buying_power,
+        s.stock_id,
+        s.ticker_symbol,
+        ss.price_per_share,
+        COALESCE(lh.num_shares, 0) AS held_shares,
+        COALESCE(lh.total_shares_value, 0) AS held_value
+    FROM locked_portfolio lp
+    LEFT JOIN stocks s ON s.ticker_symbol = ANY(:tickers)
+    LEFT JOIN stock_state ss ON ss.stock_id = s.stock_id
+    LEFT JOIN locked_holdings lh ON lh.stock_id = s.stock_id
+    """,
+    prepare=True,
+)
+
+# Writes the outcome of a whole batch: final buying power, final holdings
+# (deleting the ones sold down to zero) and one ledger row per leg, each as a
+# single set-based statement over arrays
+BATCH_APPLY = statements.register(
+    "trade_engine.batch_apply",
+    f"""
+    WITH final_holdings AS (
+        SELECT *
+        FROM unnest(
+            CAST(:holding_stock_ids AS integer[]),
+            CAST(:holding_shares AS numeric[]),
+            CAST(:holding_values AS numeric[])
+        ) AS f (stock_id, num_shares, total_shares_value)
+    ),
+    funds AS (
+        UPDATE portfolios
+        SET buying_power = :buying_power, version = version + 1
+        WHERE port_id = :port_id
+    ),
+    emptied AS (
+        DELETE FROM portfolio_holdings h
+        USING final_holdings f
+        WHERE h.port_id = :port_id AND h.stock_id = f.stock_id AND f.num_shares = 0
+    ),
+    holdings AS (
+        INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+        SELECT :port_id, stock_id, num_shares, total_shares_value
+        FROM final_holdings
+        WHERE num_shares > 0
+        ON CONFLICT (port_id, stock_id) DO UPDATE
+        SET num_shares = EXCLUDED.num_shares,
+            total_shares_value = EXCLUDED.total_shares_value,
+            version = portfolio_holdings.version + 1
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT :port_id, :user_id, l.stock_id, l.transaction_type, l.change
+        FROM unnest(
+            CAST(:leg_stock_ids AS integer[]),
+            CAST(:leg_types AS varchar[]),
+            CAST(:leg_changes AS numeric[])
+        ) WITH ORDINALITY AS l (stock_id, transaction_type, change, leg)
+        ORDER BY l.leg
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    SELECT transaction_id FROM ledger
+    """,
+)
+
+
+@dataclass
+class BatchLegResult:
+    side: str
+    stock_id: int
+    ticker_symbol: str
+    num_shares: Decimal
+    amount: Decimal
+    transaction_id: int | None = None
+
+
+async def batch(
+    ctx: sessions.SessionContext, legs: list
+) -> tuple[list[BatchLegResult], Decimal]:
+    """
+    Executes many buy/sell legs (objects with side, stock_ticker and either
+    num_shares or dollars) against the caller's current portfolio in one
+    transaction. Legs apply in order, so a later leg can sell shares an earlier
+    one bought. Either every leg succeeds or nothing is written; the first leg
+    that would fail raises its HTTPException, prefixed with the leg number.
+    Returns the per-leg results and the final buying power.
+    """
+
+    if ctx.portfolio_id is None:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    # Resolve every ticker and price and lock the portfolio and holdings
+    tickers = sorted({leg.stock_ticker.upper() for leg in legs})
+    rows = (
+        await ctx.connection.execute(
+            BATCH_QUOTES, {"port_id": ctx.portfolio_id, "tickers": tickers}
+        )
+    ).fetchall()
+
+    if not rows:
+        raise HTTPException(
+            status_code=404, detail="No current portfolio set for this user"
+        )
+
+    buying_power = rows[0].buying_power
+    quotes = {row.ticker_symbol: row for row in rows if row.stock_id is not None}
+    holdings = {
+        row.stock_id: [row.held_shares, row.held_value] for row in quotes.values()
+    }
+
+    # Play the legs forward against the locked state
+    results = []
+    for number, leg in enumerate(legs, start=1):
+        quote = quotes.get(leg.stock_ticker.upper())
+        failure = None
+
+        if quote is None:
+            failure = "stock_not_found"
+        elif quote.price_per_share is None:
+            failure = "price_unavailable"
+        else:
+            num_shares, share_delta, amount = _price(
+                quote.price_per_share, leg.num_shares, leg.dollars
+            )
+            holding = holdings[quote.stock_id]
+
+            if leg.side == "buy":
+                if buying_power < amount:
+                    failure = "insufficient_funds"
+                else:
+                    buying_power -= amount
+                    holding[0] += share_delta
+                    holding[1] += amount
+            else:
+                if holding[0] < share_delta:
+                    failure = "insufficient_shares"
+                else:
+                    buying_power += amount
+                    holding[0] -= share_delta
+                    holding[1] -= amount
+
+        if failure is not None:
+            status_code, detail = TRADE_FAILURES[failure]
+            raise HTTPException(
+                status_code=status_code, detail=f"Leg {number}: {detail}"
+            )
+        assert quote is not None
+
+        results.append(
+            BatchLegResult(
+                leg.side, quote.stock_id, quote.ticker_symbol, num_shares, amount
+            )
+        )
+
+    # Write everything back in one statement
+    touched = sorted({result.stock_id for result in results})
+    transaction_ids = (
+        (
+            await ctx.connection.execute(
+                BATCH_APPLY,
+                {
+                    "port_id": ctx.portfolio_id,
+                    "user_id": ctx.user_id,
+                    "buying_power": buying_power,
+                    "holding_stock_ids": touched,
+                    "holding_shares": [holdings[stock_id][0] for stock_id in touched],
+                    "holding_values": [holdings[stock_id][1] for stock_id in touched],
+                    "leg_stock_ids": [result.stock_id for result in results],
+                    "leg_types": [result.side for result in results],
+                    "leg_changes": [result.amount for result in results],
+                },
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+    # transaction_id is a sequence, so ascending ids are insertion (leg) order
+    for result, transaction_id in zip(results, sorted(transaction_ids)):
+        result.transaction_id = transaction_id
+
+    return results, buying_power
+
+
+# Trades that share a transaction with other trades (group commit, the order
+# queue) each run under a savepoint, so a refused or failed one is undone alone
+SAVEPOINT = statements.register("trade_engine.savepoint", "SAVEPOINT isolated_trade")
+RELEASE_SAVEPOINT = statements.register(
+    "trade_engine.release_savepoint", "RELEASE SAVEPOINT isolated_trade"
+)
+ROLLBACK_TO_SAVEPOINT = statements.register(
+    "trade_engine.rollback_to_savepoint", "ROLLBACK TO SAVEPOINT isolated_trade"
+)
+
+T = TypeVar("T")
+
+
+async def isolated(connection, trade: Awaitable[T]) -> T:
+    """
+    Awaits trade under a savepoint on connection. If it raises, everything it
+    wrote is rolled back (the rest of the transaction is kept) and the
+    exception is re-raised.
+    """
+
+    await connection.execute(SAVEPOINT)
+    try:
+        result = await trade
+    except Exception:
+        await connection.execute(ROLLBACK_TO_SAVEPOINT)
+        raise
+    await connection.execute(RELEASE_SAVEPOINT)
+    return result
@@ -0,0 +1,94 @@
+import argparse
+import time
+
+from sqlalchemy.engine import Connection
+
+from src import database as db
+from src import statements
+
+# Running totals of the transactions ledger per portfolio and stock, read by
+# /transactions/net-transaction-summary instead of aggregating the whole
+# ledger. Every statement that writes to transactions also adds its rows to
+# transaction_totals (see UPSERT_TOTALS) in the same statement. If the totals
+# ever drift from the ledger, rebuild them:
+#
+#     python -m src.api.transaction_totals [--user-id N]
+
+# Adds the ledger rows a statement just inserted to their totals rows. Used as
+# a CTE after the ledger insert; {ledger} names a CTE returning the inserted
+# user_id, port_id, stock_id, transaction_type and change. The totals row is
+# per portfolio, so the portfolio lock the writer already holds covers it.
+UPSERT_TOTALS = """
+    INSERT INTO transaction_totals (user_id, port_id, stock_id, bought, sold, transaction_count)
+    SELECT
+        user_id,
+        port_id,
+        stock_id,
+        COALESCE(SUM(change) FILTER (WHERE transaction_type = 'buy'), 0),
+        COALESCE(SUM(change) FILTER (WHERE transaction_type = 'sell'), 0),
+        COUNT(*)
+    FROM {ledger}
+    GROUP BY user_id, port_id, stock_id
+    ON CONFLICT (user_id, stock_id, port_id) DO UPDATE
+    SET bought = transaction_totals.bought + EXCLUDED.bought,
+        sold = transaction_totals.sold + EXCLUDED.sold,
+        transaction_count = transaction_totals.transaction_count + EXCLUDED.transaction_count"""
+
+# Writers take ROW EXCLUSIVE on transactions, so holding SHARE keeps the ledger
+# still while the totals are recomputed; trades wait for the rebuild to commit
+LOCK_LEDGER = statements.register(
+    "transaction_totals.lock_ledger", "LOCK TABLE transactions IN SHARE MODE"
+)
+
+DELETE_TOTALS = statements.register(
+    "transaction_totals.delete_totals",
+    """
+    DELETE FROM transaction_totals
+    WHERE user_id = :user_id OR CAST(:user_id AS integer) IS NULL
+    """,
+)
+
+INSERT_TOTALS = statements.register(
+    "transaction_totals.insert_totals",
+    f"""
+    WITH ledger AS (
+        SELECT user_id, port_id, stock_id, transaction_type, change
+        FROM transactions
+        WHERE user_id = :user_id OR CAST(:user_id AS integer) IS NULL
+    )
+    {UPSERT_TOTALS.format(ledger="ledger")}
+    """,
+)
+
+
+def rebuild(connection: Connection, user_id: int | None = None) -> dict:
+    """
+    Recomputes transaction_totals from the ledger, for one user or everyone,
+    inside the caller's transaction. Returns how many rows were replaced.
+    """
+
+    started = time.monotonic()
+    connection.execute(LOCK_LEDGER)
+    deleted = connection.execute(DELETE_TOTALS, {"user_id": user_id}).rowcount
+    inserted = connection.execute(INSERT_TOTALS, {"user_id": user_id}).rowcount
+    return {
+        "user_id": user_id,
+        "rows_deleted": deleted,
+        "rows_inserted": inserted,
+        "duration_ms": round((time.monotonic() - started) * 1000, 2),
+    }
+
+
+def rebuild_all(user_id: int | None = None) -> dict:
+    with db.engine.begin() as connection:
+        return rebuild(connection, user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild transaction_totals from the transactions ledger"
+    )
+    parser.add_argument(
+        "--user-id", type=int, default=None, help="only rebuild this user's totals"
+    )
+    print(rebuild_all(parser.parse_args().user_id))
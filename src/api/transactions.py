@@ -1,14 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from decimal import Decimal, ROUND_HALF_UP, ROUND_DOWN
 from typing import List, ClassVar
 from decimal import Decimal, ROUND_HALF_UP
-from typing import List, ClassVar, Dict
+from typing import List, ClassVar, Dict, Literal
 from collections import defaultdict
 
-import sqlalchemy
-from src.api import auth
-from src import database as db
+from src import statements
+from src.api import auth, group_commit, idempotency, retry, sessions, trade_engine
 
 
 router = APIRouter(
@@ -20,18 +19,24 @@ router = APIRouter(
 class BuySharesRequest(BaseModel):
     session_token: str
     stock_ticker: str
-    num_shares: float 
+    num_shares: float
 
     @field_validator("num_shares")
     @classmethod
     def validate_num_shares_decimal(cls, value: float) -> float:
         if value <= 0:
-            raise HTTPException(status_code=400, detail="Number of shares must be greater than 0")
+            raise HTTPException(
+                status_code=400, detail="Number of shares must be greater than 0"
+            )
         decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
         if decimal_places > 2:
-            raise HTTPException(status_code=400, detail="Number of shares cannot exceed 2 decimal places")
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares cannot exceed 2 decimal places",
+            )
         return value
 
+
 class BuyResponse(BaseModel):
     message: str
     transaction_id: int
@@ -39,167 +44,31 @@ class BuyResponse(BaseModel):
     num_shares_bought: float
     total_cost: float
 
+
 @router.post("/buy_shares", response_model=BuyResponse)
-def buy_shares(request: BuySharesRequest) -> BuyResponse:
+@retry.on_conflict
+@group_commit.coalesced
+@idempotency.replayable
+async def buy_shares(
+    request: BuySharesRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> BuyResponse:
     """
-    Allows user to buy a stock based on shares (can go up to 2 decimal places), 
-    the ticker symbol, and the current portfolio they are in. 
+    Allows user to buy a stock based on shares (can go up to 2 decimal places),
+    the ticker symbol, and the current portfolio they are in.
     """
 
-    with db.engine.connect() as connection:
-        with connection.execution_options(isolation_level="REPEATABLE READ").begin():
-            # Validate session
-            logged_in = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT user_id FROM temp_user_tokens
-                    WHERE token = :token
-                    """
-                ),
-                {"token": request.session_token}
-            ).first()
-
-            if not logged_in:
-                raise HTTPException(status_code=401, detail="Invalid session token")
-
-            user_id = logged_in.user_id
-
-            # Get the current portfolio
-            current = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT current_portfolio FROM user_current_portfolio
-                    WHERE user_id = :user_id
-                    """
-                ),
-                {"user_id": user_id}
-            ).first()
-
-            port_id = current.current_portfolio
-
-            # Get stock_id from ticker
-            stock = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT stock_id, ticker_symbol FROM stocks
-                    WHERE ticker_symbol = :ticker
-                    """
-                ),
-                {"ticker": request.stock_ticker.upper()}
-            ).first()
-
-            if not stock:
-                raise HTTPException(status_code=404, detail="Stock not found")
-
-            stock_id = stock.stock_id
-            stock_ticker = stock.ticker_symbol
-
-            # Get current stock price
-            price_info = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT price_per_share FROM stock_state
-                    WHERE stock_id = :stock_id
-                    """
-                ),
-                {"stock_id": stock_id}
-            ).first()
-
-            if not price_info:
-                raise HTTPException(status_code=404, detail="Stock price unavailable")
-
-            price = price_info.price_per_share
-            num_shares = Decimal(str(request.num_shares))
-            total_cost = (num_shares * price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            # Check if portfolio has enough buying power
-            buying_power = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT buying_power FROM portfolios 
-                    WHERE port_id = :port_id
-                    FOR UPDATE
-                    """
-                ),
-                {"port_id": port_id}
-            ).first()
-
-            if not buying_power or buying_power.buying_power < total_cost:
-                raise HTTPException(status_code=400, detail="Insufficient funds")
-
-            # Deduct funds from portfolio
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE portfolios
-                    SET buying_power = buying_power - :cost
-                    WHERE port_id = :port_id
-                    """
-                ),
-                {
-                    "cost": total_cost,
-                    "port_id": port_id
-                }
-            )
+    trade = await trade_engine.buy(
+        ctx, request.stock_ticker, num_shares=request.num_shares
+    )
 
-            # Temporarily lock row to avoid a lost update
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT * FROM portfolio_holdings 
-                    WHERE port_id = :port_id AND stock_id = :stock_id
-                    FOR UPDATE
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "stock_id": stock_id
-                }
-            )
-
-            # Record stock into portfolio_holdings table
-            holding = connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
-                    VALUES (:port_id, :stock_id, :num_shares, :total_value)
-                    ON CONFLICT (port_id, stock_id) DO UPDATE
-                    SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
-                        total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "stock_id": stock_id,
-                    "num_shares": request.num_shares,
-                    "total_value": total_cost
-                }
-            )
-
-            # Log transaction into transactions table
-            transaction = connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
-                    VALUES (:port_id, :user_id, :stock_id, 'buy', :change)
-                    RETURNING transaction_id
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "user_id": user_id,
-                    "stock_id": stock_id,
-                    "change": total_cost
-                }
-            ).first()
-
-            return BuyResponse(
-                message = "Stock successfully purchased",
-                transaction_id = transaction.transaction_id,
-                stock_ticker = stock_ticker, 
-                num_shares_bought = request.num_shares,
-                total_cost = total_cost
-            )
+    return BuyResponse(
+        message="Stock successfully purchased",
+        transaction_id=trade.transaction_id,
+        stock_ticker=trade.ticker_symbol,
+        num_shares_bought=request.num_shares,
+        total_cost=trade.amount,
+    )
 
 
 class BuyDollarsRequest(BaseModel):
@@ -211,175 +80,41 @@ class BuyDollarsRequest(BaseModel):
     @classmethod
     def validate_dollars_decimal(cls, value: float) -> float:
         if value <= 0:
-            raise HTTPException(status_code=400, detail="Amount of dollars must be greater than 0")
+            raise HTTPException(
+                status_code=400, detail="Amount of dollars must be greater than 0"
+            )
         decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
         if decimal_places > 2:
-            raise HTTPException(status_code=400, detail="Amount of dollars cannot exceed 2 decimal places")
+            raise HTTPException(
+                status_code=400,
+                detail="Amount of dollars cannot exceed 2 decimal places",
+            )
         return value
 
+
 @router.post("/buy_dollars", response_model=BuyResponse)
-def buy_dollars(request: BuyDollarsRequest) -> BuyResponse:
+@retry.on_conflict
+@group_commit.coalesced
+@idempotency.replayable
+async def buy_dollars(
+    request: BuyDollarsRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> BuyResponse:
     """
     Allows user to buy a stock based on dollars (can go up to 2 decimal places),
     the ticker symbol, and the current portfolio they are in.
     """
 
-    with db.engine.connect() as connection:
-        with connection.execution_options(isolation_level="REPEATABLE READ").begin():
-            # Validate session
-            logged_in = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT user_id FROM temp_user_tokens
-                    WHERE token = :token
-                    """
-                ),
-                {"token": request.session_token}
-            ).first()
-
-            if not logged_in:
-                raise HTTPException(status_code=401, detail="Invalid session token")
-
-            user_id = logged_in.user_id
-
-            # Get the current portfolio
-            current = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT current_portfolio FROM user_current_portfolio
-                    WHERE user_id = :user_id
-                    """
-                ),
-                {"user_id": user_id}
-            ).first()
-
-            port_id = current.current_portfolio
-
-            # Get stock_id from ticker
-            stock = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT stock_id, ticker_symbol FROM stocks
-                    WHERE ticker_symbol = :ticker
-                    """
-                ),
-                {"ticker": request.stock_ticker.upper()}
-            ).first()
-
-            if not stock:
-                raise HTTPException(status_code=404, detail="Stock not found")
-
-            stock_id = stock.stock_id
-            stock_ticker = stock.ticker_symbol
-
-            # Get current stock price
-            price_info = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT price_per_share FROM stock_state
-                    WHERE stock_id = :stock_id
-                    """
-                ),
-                {"stock_id": stock_id}
-            ).first()
-
-            if not price_info:
-                raise HTTPException(status_code=404, detail="Stock price unavailable")
-
-            dollars = Decimal(str(request.dollars))
-            price = Decimal(price_info.price_per_share)
-            num_shares = (dollars / price)
-            total_cost = (price * num_shares).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            # Check if portfolio has enough buying power
-            buying_power = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT buying_power FROM portfolios 
-                    WHERE port_id = :port_id
-                    FOR UPDATE
-                    """
-                ),
-                {"port_id": port_id}
-            ).first()
-
-            if not buying_power or buying_power.buying_power < total_cost:
-                raise HTTPException(status_code=400, detail="Insufficient funds")
-
-            # Deduct funds from portfolio
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE portfolios
-                    SET buying_power = buying_power - :cost
-                    WHERE port_id = :port_id
-                    """
-                ),
-                {
-                    "cost": total_cost,
-                    "port_id": port_id
-                }
-            )
+    trade = await trade_engine.buy(ctx, request.stock_ticker, dollars=request.dollars)
 
-            # Lock portfolio_holdings row to prevent lost update
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT * FROM portfolio_holdings 
-                    WHERE port_id = :port_id AND stock_id = :stock_id
-                    FOR UPDATE
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "stock_id": stock_id
-                }
-            )
+    return BuyResponse(
+        message="Stock successfully purchased",
+        transaction_id=trade.transaction_id,
+        stock_ticker=trade.ticker_symbol,
+        num_shares_bought=trade.num_shares,
+        total_cost=trade.amount,
+    )
 
-            # Record stock into portfolio_holdings table
-            holding = connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
-                    VALUES (:port_id, :stock_id, :num_shares, :total_value)
-                    ON CONFLICT (port_id, stock_id) DO UPDATE
-                    SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
-                        total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "stock_id": stock_id,
-                    "num_shares": num_shares,
-                    "total_value": total_cost
-                }
-            )
-
-            # Log transaction into transactions table
-            transaction = connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
-                    VALUES (:port_id, :user_id, :stock_id, 'buy', :change)
-                    RETURNING transaction_id
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "user_id": user_id,
-                    "stock_id": stock_id,
-                    "change": total_cost
-                }
-            ).first()
-
-            return BuyResponse(
-                message = "Stock successfully purchased",
-                transaction_id = transaction.transaction_id,
-                stock_ticker = stock_ticker, 
-                num_shares_bought = num_shares,
-                total_cost = total_cost
-            )
-        
 
 class SellSharesRequest(BaseModel):
     session_token: str
@@ -390,10 +125,15 @@ class SellSharesRequest(BaseModel):
     @classmethod
     def validate_num_shares_decimal(cls, value: float) -> float:
         if value <= 0:
-            raise HTTPException(status_code=400, detail="Number of shares must be greater than 0")
+            raise HTTPException(
+                status_code=400, detail="Number of shares must be greater than 0"
+            )
         decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
         if decimal_places > 2:
-            raise HTTPException(status_code=400, detail="Number of shares cannot exceed 2 decimal places")
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares cannot exceed 2 decimal places",
+            )
         return value
 
 
@@ -404,173 +144,31 @@ class SellResponse(BaseModel):
     num_shares_sold: float
     total_proceeds: float
 
+
 @router.post("/sell_shares", response_model=SellResponse)
-def sell_shares(request: SellSharesRequest) -> SellResponse:
+@retry.on_conflict
+@group_commit.coalesced
+@idempotency.replayable
+async def sell_shares(
+    request: SellSharesRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> SellResponse:
     """
-    Allows user to buy a stock based on shares (can go up to 2 decimal places),
+    Allows user to sell a stock based on shares (can go up to 2 decimal places),
     the ticker symbol, and the current portfolio they are in.
     """
 
-    with db.engine.connect() as connection:
-        with connection.execution_options(isolation_level="REPEATABLE READ").begin():
-            # Validate session
-            logged_in = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT user_id FROM temp_user_tokens
-                    WHERE token = :token
-                    """
-                ),
-                {"token": request.session_token}
-            ).first()
-
-            if not logged_in:
-                raise HTTPException(status_code=401, detail="Invalid session token")
-
-            user_id = logged_in.user_id
-
-            # Get the current portfolio
-            current = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT current_portfolio FROM user_current_portfolio
-                    WHERE user_id = :user_id
-                    """
-                ),
-                {"user_id": user_id}
-            ).first()
-
-            port_id = current.current_portfolio
-
-            # Get stock_id from ticker
-            stock = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT ss.stock_id, ss.price_per_share, s.ticker_symbol
-                    FROM stock_state ss
-                    JOIN stocks s ON ss.stock_id = s.stock_id
-                    WHERE s.ticker_symbol = :ticker
-                    """
-                ),
-                {"ticker": request.stock_ticker.upper()}
-            ).first()
-
-            if not stock:
-                raise HTTPException(status_code=404, detail="Stock not found")
-
-            stock_id = stock.stock_id
-            stock_ticker = stock.ticker_symbol
-
-            price = Decimal(stock.price_per_share)
-            num_shares = Decimal(str(request.num_shares))
-            total_proceeds = (price * num_shares).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            # Check portfolio holdings
-            holding = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT num_shares FROM portfolio_holdings
-                    WHERE port_id = :port_id AND stock_id = :stock_id
-                    FOR UPDATE
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "stock_id": stock_id
-                }
-            ).first()
-
-            if not holding or holding.num_shares < num_shares:
-                raise HTTPException(status_code=400, detail="Not enough shares to sell")
-
-            # Subtract shares or delete row if shares reach zero
-            new_share_count = holding.num_shares - num_shares
-            if new_share_count > 0: 
-                # Adjust total_shares_value
-                connection.execute(
-                    sqlalchemy.text(
-                        """
-                        UPDATE portfolio_holdings
-                        SET num_shares = num_shares - :requested_shares,
-                            total_shares_value = total_shares_value - :value
-                        WHERE port_id = :port_id AND stock_id = :stock_id
-                        """
-                    ),
-                    {
-                        "requested_shares": num_shares,
-                        "value": total_proceeds,
-                        "port_id": port_id,
-                        "stock_id": stock_id
-                    }
-                )
-            else:
-                # Cleanup for absence of stock ownership 
-                connection.execute(
-                    sqlalchemy.text(
-                        """
-                        DELETE FROM portfolio_holdings
-                        WHERE
-                        port_id = :port_id
-                        AND stock_id = :stock_id
-                        """
-                    ),
-                    {
-                        "port_id": port_id,
-                        "stock_id": stock_id
-                    }
-                )
-
-            # Lock portfolio to prevent lost update
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT buying_power FROM portfolios
-                    WHERE port_id = :port_id
-                    FOR UPDATE
-                    """
-                ),
-                {"port_id": port_id}
-            )
-
-            # Add funds to buying power
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE portfolios
-                    SET buying_power = buying_power + :proceeds
-                    WHERE port_id = :port_id
-                    """
-                ),
-                {
-                    "proceeds": total_proceeds,
-                    "port_id": port_id
-                }
-            )
+    trade = await trade_engine.sell(
+        ctx, request.stock_ticker, num_shares=request.num_shares
+    )
 
-            # Log transaction
-            transaction = connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
-                    VALUES (:port_id, :user_id, :stock_id, 'sell', :change)
-                    RETURNING transaction_id
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "user_id": user_id,
-                    "stock_id": stock_id,
-                    "change": total_proceeds
-                }
-            ).first()
-
-            return SellResponse(
-                message="Stock successfully sold",
-                transaction_id=transaction.transaction_id,
-                stock_ticker=stock_ticker,
-                num_shares_sold=request.num_shares,
-                total_proceeds=total_proceeds
-            )
+    return SellResponse(
+        message="Stock successfully sold",
+        transaction_id=trade.transaction_id,
+        stock_ticker=trade.ticker_symbol,
+        num_shares_sold=request.num_shares,
+        total_proceeds=trade.amount,
+    )
 
 
 class SellDollarsRequest(BaseModel):
@@ -582,180 +180,141 @@ class SellDollarsRequest(BaseModel):
     @classmethod
     def validate_dollars_decimal(cls, value: float) -> float:
         if value <= 0:
-            raise HTTPException(status_code=400, detail="Amount of dollars must be greater than 0")
+            raise HTTPException(
+                status_code=400, detail="Amount of dollars must be greater than 0"
+            )
         decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
         if decimal_places > 2:
-            raise HTTPException(status_code=400, detail="Amount of dollars cannot exceed 2 decimal places")
+            raise HTTPException(
+                status_code=400,
+                detail="Amount of dollars cannot exceed 2 decimal places",
+            )
         return value
 
+
 @router.post("/sell_dollars", response_model=SellResponse)
-def sell_dollars(request: SellDollarsRequest) -> SellResponse:
+@retry.on_conflict
+@group_commit.coalesced
+@idempotency.replayable
+async def sell_dollars(
+    request: SellDollarsRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> SellResponse:
     """
-    Allows user to buy a stock based on shares (can go up to 2 decimal places),
+    Allows user to sell a stock based on dollars (can go up to 2 decimal places),
     the ticker symbol, and the current portfolio they are in.
     """
 
-    with db.engine.connect() as connection:
-        with connection.execution_options(isolation_level="REPEATABLE READ").begin():
-            # Validate session
-            logged_in = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT user_id FROM temp_user_tokens
-                    WHERE token = :token
-                    """
-                ),
-                {"token": request.session_token}
-            ).first()
-
-            if not logged_in:
-                raise HTTPException(status_code=401, detail="Invalid session token")
-
-            user_id = logged_in.user_id
-
-            # Get the current portfolio
-            current = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT current_portfolio FROM user_current_portfolio
-                    WHERE user_id = :user_id
-                    """
-                ),
-                {"user_id": user_id}
-            ).first()
-
-            port_id = current.current_portfolio
-
-            # Get stock_id from ticker
-            stock = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT ss.stock_id, ss.price_per_share, s.ticker_symbol
-                    FROM stock_state ss
-                    JOIN stocks s ON ss.stock_id = s.stock_id
-                    WHERE s.ticker_symbol = :ticker
-                    """
-                ),
-                {"ticker": request.stock_ticker.upper()}
-            ).first()
-
-            if not stock:
-                raise HTTPException(status_code=404, detail="Stock not found")
-
-            stock_id = stock.stock_id
-            stock_ticker = stock.ticker_symbol
-
-            dollars = Decimal(str(request.dollars))
-            price = Decimal(stock.price_per_share)
-            num_shares = (dollars / price)
-            total_proceeds = (price * num_shares).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            # Check portfolio holdings
-            holding = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT num_shares FROM portfolio_holdings
-                    WHERE port_id = :port_id AND stock_id = :stock_id
-                    FOR UPDATE
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "stock_id": stock_id
-                }
-            ).first()
-
-            if not holding or holding.num_shares < num_shares:
-                raise HTTPException(status_code=400, detail="Not enough shares to sell")
-
-            # Subtract shares or delete row if shares reach zero
-            new_share_count = (holding.num_shares - num_shares)
-            if new_share_count > 0: 
-                # Adjust total_shares_value
-                connection.execute(
-                    sqlalchemy.text(
-                        """
-                        UPDATE portfolio_holdings
-                        SET num_shares = num_shares - :requested_shares,
-                            total_shares_value = total_shares_value - :total_proceeds
-                        WHERE port_id = :port_id AND stock_id = :stock_id
-                        """
-                    ),
-                    {
-                        "requested_shares": num_shares, 
-                        "total_proceeds": total_proceeds,
-                        "port_id": port_id,
-                        "stock_id": stock_id
-                    }
-                )
-            else:
-                # Cleanup for absence of stock ownership 
-                connection.execute(
-                    sqlalchemy.text(
-                        """
-                        DELETE FROM portfolio_holdings
-                        WHERE
-                        port_id = :port_id
-                        AND stock_id = :stock_id
-                        """
-                    ),
-                    {
-                        "port_id": port_id,
-                        "stock_id": stock_id
-                    }
-                )
-
-            # Lock portfolio row to prevent lost update
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT buying_power FROM portfolios
-                    WHERE port_id = :port_id
-                    FOR UPDATE
-                    """
-                ),
-                {"port_id": port_id}
+    trade = await trade_engine.sell(ctx, request.stock_ticker, dollars=request.dollars)
+
+    return SellResponse(
+        message="Stock successfully sold",
+        transaction_id=trade.transaction_id,
+        stock_ticker=trade.ticker_symbol,
+        num_shares_sold=trade.num_shares,
+        total_proceeds=trade.amount,
+    )
+
+
+class BatchLeg(BaseModel):
+    side: Literal["buy", "sell"]
+    stock_ticker: str
+    num_shares: float | None = None
+    dollars: float | None = None
+
+    @field_validator("num_shares", "dollars")
+    @classmethod
+    def validate_amount_decimal(cls, value: float | None) -> float | None:
+        if value is None:
+            return value
+        if value <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and dollars must be greater than 0",
+            )
+        decimal_places = abs(Decimal(str(value)).as_tuple().exponent)
+        if decimal_places > 2:
+            raise HTTPException(
+                status_code=400,
+                detail="Number of shares and dollars cannot exceed 2 decimal places",
+            )
+        return value
+
+    @model_validator(mode="after")
+    def validate_one_amount(self) -> "BatchLeg":
+        if (self.num_shares is None) == (self.dollars is None):
+            raise HTTPException(
+                status_code=400,
+                detail="Each leg needs exactly one of num_shares or dollars",
             )
+        return self
 
-            # Add funds to buying power
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE portfolios
-                    SET buying_power = buying_power + :proceeds
-                    WHERE port_id = :port_id
-                    """
-                ),
-                {
-                    "proceeds": total_proceeds,
-                    "port_id": port_id
-                }
+
+class BatchRequest(BaseModel):
+    MAX_LEGS: ClassVar[int] = 100
+
+    session_token: str
+    legs: List[BatchLeg]
+
+    @field_validator("legs")
+    @classmethod
+    def validate_leg_count(cls, value: List[BatchLeg]) -> List[BatchLeg]:
+        if not value:
+            raise HTTPException(
+                status_code=400, detail="A batch needs at least one leg"
             )
+        if len(value) > cls.MAX_LEGS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A batch cannot have more than {cls.MAX_LEGS} legs",
+            )
+        return value
+
+
+class BatchLegResponse(BaseModel):
+    transaction_id: int
+    side: str
+    stock_ticker: str
+    num_shares: float
+    amount: float
+
+
+class BatchResponse(BaseModel):
+    message: str
+    legs: List[BatchLegResponse]
+    buying_power: float
+
+
+@router.post("/batch", response_model=BatchResponse)
+@retry.on_conflict
+@idempotency.replayable
+async def batch_orders(
+    request: BatchRequest,
+    ctx: sessions.SessionContext = Depends(sessions.trade_session_context),
+) -> BatchResponse:
+    """
+    Executes many buy/sell legs for the current portfolio in one transaction.
+    Legs apply in order and either all succeed or none do; a failing leg is
+    reported as "Leg <n>: <reason>". Amounts are "amount" (cost for buys,
+    proceeds for sells).
+    """
 
-            # Log transaction
-            transaction = connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
-                    VALUES (:port_id, :user_id, :stock_id, 'sell', :change)
-                    RETURNING transaction_id
-                    """
-                ),
-                {
-                    "port_id": port_id,
-                    "user_id": user_id,
-                    "stock_id": stock_id,
-                    "change": total_proceeds
-                }
-            ).first()
-
-            return SellResponse(
-                message="Stock successfully sold",
-                transaction_id=transaction.transaction_id,
-                stock_ticker=stock_ticker,
-                num_shares_sold=num_shares,
-                total_proceeds=total_proceeds
+    results, buying_power = await trade_engine.batch(ctx, request.legs)
+
+    return BatchResponse(
+        message="Batch successfully executed",
+        legs=[
+            BatchLegResponse(
+                transaction_id=result.transaction_id,
+                side=result.side,
+                stock_ticker=result.ticker_symbol,
+                num_shares=result.num_shares,
+                amount=result.amount,
             )
+            for result in results
+        ],
+        buying_power=buying_power,
+    )
 
 
 class NetTransactionResult(BaseModel):
@@ -764,61 +323,55 @@ class NetTransactionResult(BaseModel):
     net_amount: float
     result: str  # "positive", "negative", or "neutral"
 
+
+# Reads the running totals (see transaction_totals) instead of the ledger, so
+# the cost depends on how many stocks the user traded, not how many trades
+NET_TRANSACTION_SUMMARY = statements.register(
+    "transactions.net_transaction_summary",
+    """
+    SELECT
+        t.stock_id,
+        s.ticker_symbol,
+        SUM(t.bought - t.sold) AS net_amount
+    FROM transaction_totals t
+    JOIN stocks s ON t.stock_id = s.stock_id
+    WHERE t.user_id = :user_id
+    GROUP BY t.stock_id, s.ticker_symbol
+    """,
+)
+
+
 @router.get("/net-transaction-summary", response_model=List[NetTransactionResult])
-def net_transaction_summary(session_token: str):
+async def net_transaction_summary(
+    session_token: str,
+    ctx: sessions.SessionContext = Depends(sessions.session_context),
+):
     """
     For the current user, summarize all transactions across all portfolios,
     showing the net (buy - sell) amount for each stock and whether it is positive or negative.
     """
-    with db.engine.begin() as connection:
-        # Validate session and get user_id
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                "SELECT user_id FROM temp_user_tokens WHERE token = :token"
-            ),
-            {"token": session_token}
-        ).first()
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session token")
-        user_id = logged_in.user_id
-
-        # Aggregate net transaction amount per stock
-        results = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT
-                    t.stock_id,
-                    s.ticker_symbol,
-                    SUM(
-                        CASE
-                            WHEN t.transaction_type = 'buy' THEN t.change
-                            WHEN t.transaction_type = 'sell' THEN -t.change
-                            ELSE 0
-                        END
-                    ) AS net_amount
-                FROM transactions t
-                JOIN stocks s ON t.stock_id = s.stock_id
-                WHERE t.user_id = :user_id
-                GROUP BY t.stock_id, s.ticker_symbol
-                """
-            ),
-            {"user_id": user_id}
-        ).fetchall()
-
-        summary = []
-        for row in results:
-            if row.net_amount > 0:
-                result = "positive"
-            elif row.net_amount < 0:
-                result = "negative"
-            else:
-                result = "neutral"
-            summary.append(NetTransactionResult(
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Aggregate net transaction amount per stock
+    results = (
+        await connection.execute(NET_TRANSACTION_SUMMARY, {"user_id": user_id})
+    ).fetchall()
+
+    summary = []
+    for row in results:
+        if row.net_amount > 0:
+            result = "positive"
+        elif row.net_amount < 0:
+            result = "negative"
+        else:
+            result = "neutral"
+        summary.append(
+            NetTransactionResult(
                 stock_id=row.stock_id,
                 ticker_symbol=row.ticker_symbol,
                 net_amount=float(row.net_amount),
-                result=result
-            ))
-        return summary
-
-
+                result=result,
+            )
+        )
+    return summary
@@ -0,0 +1,137 @@
+from decimal import Decimal
+
+from sqlalchemy.engine import Connection
+
+from src import statements
+from src.api import transaction_totals
+
+# The active triggers a tick crossed, read as index range scans on
+# ix_sell_triggers_stop_loss / ix_sell_triggers_take_profit: stop-losses at or
+# above the new price and take-profits at or below it. Triggers the price did
+# not reach are never looked at.
+CROSSED = """
+    SELECT t.trigger_id, t.port_id, t.user_id, t.stock_id, t.num_shares, p.price
+    FROM unnest(CAST(:stock_ids AS integer[]), CAST(:prices AS numeric[])) AS p (stock_id, price)
+    CROSS JOIN LATERAL (
+        SELECT trigger_id, port_id, user_id, stock_id, num_shares
+        FROM sell_triggers
+        WHERE stock_id = p.stock_id AND status = 'active' AND kind = 'stop_loss'
+          AND trigger_price >= p.price
+        UNION ALL
+        SELECT trigger_id, port_id, user_id, stock_id, num_shares
+        FROM sell_triggers
+        WHERE stock_id = p.stock_id AND status = 'active' AND kind = 'take_profit'
+          AND trigger_price <= p.price
+    ) t"""
+
+
+# Same lock order as a trade: the portfolios of every crossed trigger first
+LOCK_TRIGGER_PORTFOLIOS = statements.register(
+    "triggers.lock_trigger_portfolios",
+    f"""
+    SELECT port_id
+    FROM portfolios
+    WHERE port_id IN (SELECT port_id FROM ({CROSSED}) crossed)
+    ORDER BY port_id
+    FOR UPDATE
+    """,
+)
+
+# Sells for every crossed trigger of the locked portfolios as one batch, at the
+# tick price. Nothing is escrowed, so each trigger sells what is left of its
+# num_shares after earlier triggers (by trigger_id) on the same holding; one
+# with nothing left to sell is cancelled. Triggers cancelled while waiting for
+# the locks are skipped.
+FIRE_TRIGGERS = statements.register(
+    "triggers.fire_triggers",
+    f"""
+    WITH crossed AS (
+        {CROSSED}
+        WHERE t.port_id = ANY(:port_ids)
+    ),
+    allocated AS (
+        SELECT
+            c.*,
+            GREATEST(
+                LEAST(
+                    c.num_shares,
+                    COALESCE(h.num_shares, 0) - (SUM(c.num_shares) OVER earlier - c.num_shares)
+                ),
+                0
+            ) AS sold
+        FROM crossed c
+        LEFT JOIN portfolio_holdings h ON h.port_id = c.port_id AND h.stock_id = c.stock_id
+        WINDOW earlier AS (PARTITION BY c.port_id, c.stock_id ORDER BY c.trigger_id)
+    ),
+    closed AS (
+        UPDATE sell_triggers t
+        SET status = CASE WHEN a.sold > 0 THEN 'triggered' ELSE 'cancelled' END,
+            fill_price = a.price,
+            num_sold = a.sold,
+            closed_at = now()
+        FROM allocated a
+        WHERE t.trigger_id = a.trigger_id AND t.status = 'active'
+        RETURNING t.trigger_id, t.port_id, t.user_id, t.stock_id, a.sold, ROUND(a.sold * a.price, 2) AS amount
+    ),
+    sales AS (
+        SELECT port_id, stock_id, SUM(sold) AS sold, SUM(amount) AS amount
+        FROM closed
+        WHERE sold > 0
+        GROUP BY port_id, stock_id
+    ),
+    reduced AS (
+        UPDATE portfolio_holdings h
+        SET num_shares = h.num_shares - s.sold,
+            total_shares_value = h.total_shares_value - s.amount,
+            version = h.version + 1
+        FROM sales s
+        WHERE h.port_id = s.port_id AND h.stock_id = s.stock_id AND h.num_shares > s.sold
+    ),
+    emptied AS (
+        DELETE FROM portfolio_holdings h
+        USING sales s
+        WHERE h.port_id = s.port_id AND h.stock_id = s.stock_id AND h.num_shares = s.sold
+    ),
+    funds AS (
+        UPDATE portfolios p
+        SET buying_power = p.buying_power + c.amount, version = p.version + 1
+        FROM (SELECT port_id, SUM(amount) AS amount FROM sales GROUP BY port_id) c
+        WHERE p.port_id = c.port_id
+    ),
+    ledger AS (
+        INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+        SELECT port_id, user_id, stock_id, 'sell', amount
+        FROM closed
+        WHERE sold > 0
+        ORDER BY trigger_id
+        RETURNING transaction_id, port_id, user_id, stock_id, transaction_type, change
+    ),
+    totals AS ({transaction_totals.UPSERT_TOTALS.format(ledger="ledger")}
+    )
+    SELECT COUNT(*) FILTER (WHERE sold > 0) AS fired, COUNT(*) FILTER (WHERE sold = 0) AS cancelled
+    FROM closed
+    """,
+)
+
+
+def fire(
+    connection: Connection,
+    prices: dict[int, Decimal],
+    port_ids: list[int] | None = None,
+) -> int:
+    """
+    Executes the stop-loss and take-profit sells the new prices (by stock_id)
+    cross, as one batch inside the caller's transaction. Returns how many
+    triggers sold something. Pass port_ids if the caller already locked the
+    portfolios (see state.LOCK_TICK_PORTFOLIOS); only their triggers fire.
+    """
+
+    params = {"stock_ids": list(prices), "prices": list(prices.values())}
+    if port_ids is None:
+        port_ids = list(connection.execute(LOCK_TRIGGER_PORTFOLIOS, params).scalars())
+    if not port_ids:
+        return 0
+
+    return (
+        connection.execute(FIRE_TRIGGERS, {**params, "port_ids": port_ids}).one().fired
+    )
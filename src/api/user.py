@@ -1,11 +1,9 @@
 import time
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel, Field, field_validator
-import bcrypt
-import uuid
 
-import sqlalchemy
-from src.api import auth
+from src import statements
+from src.api import auth, hashing, sessions
 from src import database as db
 
 
@@ -19,180 +17,185 @@ class UserCreate(BaseModel):
     username: str
     password: str
 
+
 class CreateUserResponse(BaseModel):
     message: str
     id: int
-    username: str 
+    username: str
 
 
-@router.post("/create", response_model=CreateUserResponse)
-def create_user(new_user: UserCreate):
+USERNAME_TAKEN = statements.register(
+    "user.username_taken",
     """
-    Creates a new user with a hashed password (bcrypt hashing algorithm)
+    SELECT id
+    FROM users
+    WHERE username = :username
+    """,
+)
+
+INSERT_USER = statements.register(
+    "user.insert_user",
     """
+    INSERT INTO users (username, password_hash)
+    VALUES (:username, :password_hash)
+    RETURNING id, username
+    """,
+)
+
+INSERT_CURRENT_PORTFOLIO = statements.register(
+    "user.insert_current_portfolio",
+    """
+    INSERT INTO user_current_portfolio (user_id)
+    VALUES (:user_id)
+    """,
+)
 
-    with db.engine.begin() as connection:
+INSERT_CURRENT_WATCHLIST = statements.register(
+    "user.insert_current_watchlist",
+    """
+    INSERT INTO user_current_watchlist (user_id)
+    VALUES (:user_id)
+    """,
+)
+
+
+async def insert_user(username: str, password_hash: str) -> CreateUserResponse:
+    async with db.begin() as connection:
         # Check for existing user
-        res = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT id
-                FROM users
-                WHERE username = :username
-                """
-            ),
-            {"username": new_user.username}
-        ).first()
+        res = (await connection.execute(USERNAME_TAKEN, {"username": username})).first()
 
         if res:
             raise HTTPException(status_code=400, detail="Username is taken")
 
-        # Generate hash
-        hashed_pw = bcrypt.hashpw(new_user.password.encode(), bcrypt.gensalt()).decode() 
-
-        # Create new user entry 
-        created = connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO users (username, password_hash)
-                VALUES (:username, :password_hash)
-                RETURNING id, username
-                """
-            ),
-            {
-                "username": new_user.username,
-                "password_hash": hashed_pw, 
-            }
+        # Create new user entry
+        created = (
+            await connection.execute(
+                INSERT_USER,
+                {
+                    "username": username,
+                    "password_hash": password_hash,
+                },
+            )
         ).one()
-        
+
         # Add user entry to user_current_portfolio (default is NULL)
-        connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO user_current_portfolio (user_id)
-                VALUES (:user_id)
-                """
-            ),
-            {"user_id": created.id}
-        )
-        
+        await connection.execute(INSERT_CURRENT_PORTFOLIO, {"user_id": created.id})
+
         # Add user entry to user_current_watchlist (default is NULL)
-        connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO user_current_watchlist (user_id)
-                VALUES (:user_id)
-                """
-            ),
-            {"user_id": created.id}
-        )
+        await connection.execute(INSERT_CURRENT_WATCHLIST, {"user_id": created.id})
 
         # Success response
         return CreateUserResponse(
-            message="User successfully created", 
+            message="User successfully created",
             id=created.id,
-            username=created.username
-        ) 
+            username=created.username,
+        )
+
+
+@router.post("/create", response_model=CreateUserResponse)
+async def create_user(new_user: UserCreate):
+    """
+    Creates a new user with a hashed password (bcrypt hashing algorithm)
+    """
+
+    # Generate hash in the hashing pool (503 if the pool is saturated)
+    hashed_pw = await hashing.hash_password(new_user.password)
+
+    return await insert_user(new_user.username, hashed_pw)
 
 
 class UserLogin(BaseModel):
     username: str
     password: str
 
+
 class LoginResponse(BaseModel):
     message: str
     user_id: int
     username: str
     session_token: str
 
+
+FIND_USER = statements.register(
+    "user.find_user",
+    """
+    SELECT id, username, password_hash
+    FROM users
+    WHERE username = :username 
+    """,
+)
+
+
+async def find_user(username: str):
+    async with db.begin() as connection:
+        return (await connection.execute(FIND_USER, {"username": username})).first()
+
+
+async def start_session(user_id: int) -> str:
+    async with db.begin() as connection:
+        # Database-backed or signed token, depending on SESSION_TOKEN_MODE
+        return await sessions.create_session(connection, user_id)
+
+
 @router.post("/login", response_model=LoginResponse)
-def login(login_info: UserLogin):
+async def login(login_info: UserLogin):
     """
-    Validates a user's login information, returns the salted password hash 
+    Validates a user's login information, returns the salted password hash
     to use for accessing account's portfolios, buying, and selling
     """
 
-    with db.engine.begin() as connection:
-        user = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT id, username, password_hash
-                FROM users
-                WHERE username = :username 
-                """
-            ),
-            {"username": login_info.username}
-        ).first()
-
-        # Check if user exists, then compares password hashes
-        if not user or not bcrypt.checkpw(login_info.password.encode(), user.password_hash.encode()):
-            raise HTTPException(status_code=401, detail="Invalid username or password")
-
-        # Generate temporary token & insert into temp_user_tokens table
-        token = str(uuid.uuid4())
-        connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO temp_user_tokens (token, user_id) 
-                VALUES (:token, :user_id)
-                """
-            ),
-            {
-                "token": token,
-                "user_id": user.id
-            }
-        )
+    user = await find_user(login_info.username)
 
-        # Successful login 
-        return LoginResponse(
-            message="Credentials verified",
-            user_id=user.id,
-            username=user.username,
-            session_token=token
-        )
+    # Check if user exists, then compares password hashes (in the hashing pool)
+    if not user or not await hashing.check_password(
+        login_info.password, user.password_hash
+    ):
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+
+    token = await start_session(user.id)
+
+    # Successful login
+    return LoginResponse(
+        message="Credentials verified",
+        user_id=user.id,
+        username=user.username,
+        session_token=token,
+    )
 
 
 class UserLogout(BaseModel):
-    username: str 
+    username: str
     session_token: str
 
+
 class LogoutResponse(BaseModel):
     message: str
     user_id: int
     username: str
     session_token: str
 
+
 @router.post("/logout", response_model=LogoutResponse)
-def logout(logout_info: UserLogout):
+async def logout(logout_info: UserLogout):
     """
     Logs user out by deleting their session token
     """
 
-    with db.engine.begin() as connection:
-        res = connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM temp_user_tokens
-                WHERE token = :token AND user_id = (
-                    SELECT id FROM users WHERE username = :username
-                )
-                RETURNING token, user_id
-                """
-            ),
-            {
-                "username": logout_info.username,
-                "token": logout_info.session_token
-            }
-        ).first()
+    async with db.begin() as connection:
+        user_id = await sessions.end_session(
+            connection, logout_info.session_token, username=logout_info.username
+        )
 
         # Checks if session exists
-        if not res:
-            raise HTTPException(status_code=404, detail="Session not found or already logged out")
+        if user_id is None:
+            raise HTTPException(
+                status_code=404, detail="Session not found or already logged out"
+            )
 
         # Successful logout
         return LogoutResponse(
             message="Successfully logged out",
-            user_id=res.user_id,
+            user_id=user_id,
             username=logout_info.username,
-            session_token=res.token
+            session_token=logout_info.session_token,
         )
@@ -5,9 +5,8 @@ from typing import List, Optional
 from collections import defaultdict
 from datetime import datetime
 
-import sqlalchemy
-from src.api import auth
-from src import database as db
+from src import statements
+from src.api import auth, retry, sessions
 
 
 router = APIRouter(
@@ -20,127 +19,119 @@ class CreateSwitchWatchlistRequest(BaseModel):
     session_token: str
     watchlist_name: str
 
+
 class CreateSwitchWatchlistResponse(BaseModel):
     message: str
     watchlist_id: int
     watchlist_name: str
 
+
+WATCHLIST_NAME_TAKEN = statements.register(
+    "watchlists.watchlist_name_taken",
+    """
+    SELECT 1 from watchlists 
+    WHERE user_id = :user_id AND name = :name 
+    """,
+)
+
+INSERT_WATCHLIST = statements.register(
+    "watchlists.insert_watchlist",
+    """
+    INSERT INTO watchlists (user_id, name)
+    VALUES (:user_id, :name)
+    RETURNING watchlist_id, name
+    """,
+)
+
+
 @router.post("/create", response_model=CreateSwitchWatchlistResponse)
-def create_watchlist(request: CreateSwitchWatchlistRequest) -> CreateSwitchWatchlistResponse:
+@retry.on_conflict
+async def create_watchlist(
+    request: CreateSwitchWatchlistRequest,
+    ctx: sessions.SessionContext = Depends(sessions.write_session_context),
+) -> CreateSwitchWatchlistResponse:
     """
     Creates a watchlist where users can add specific stocks to monitor
     """
-    
-    with db.engine.begin() as connection:
-        # Authenticate user w/ session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        # Check for existing watchlist name per user
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT 1 from watchlists 
-                WHERE user_id = :user_id AND name = :name 
-                """
-            ),
-            {
-                "user_id": logged_in.user_id,
-                "name": request.watchlist_name
-            }
-        ).first()
-
-        if existing:
-            raise HTTPException(status_code=400, detail="You already have a watchlist with the same name")
-
-        # Insert new entry into watchlist table 
-        res = connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO watchlists (user_id, name)
-                VALUES (:user_id, :name)
-                RETURNING watchlist_id, name
-                """
-            ),
-            {
-                "user_id": logged_in.user_id,
-                "name": request.watchlist_name
-            }
-        ).first()
-
-        if res:
-            return CreateSwitchWatchlistResponse(
-                message="Watchlist successfully created!",
-                watchlist_id=res.watchlist_id,
-                watchlist_name=res.name
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to create portfolio")
+
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Check for existing watchlist name per user
+    existing = (
+        await connection.execute(
+            WATCHLIST_NAME_TAKEN, {"user_id": user_id, "name": request.watchlist_name}
+        )
+    ).first()
+
+    if existing:
+        raise HTTPException(
+            status_code=400, detail="You already have a watchlist with the same name"
+        )
+
+    # Insert new entry into watchlist table
+    res = (
+        await connection.execute(
+            INSERT_WATCHLIST, {"user_id": user_id, "name": request.watchlist_name}
+        )
+    ).first()
+
+    if res:
+        return CreateSwitchWatchlistResponse(
+            message="Watchlist successfully created!",
+            watchlist_id=res.watchlist_id,
+            watchlist_name=res.name,
+        )
+    else:
+        raise HTTPException(status_code=500, detail="Failed to create portfolio")
 
 
 class GetSessionToken(BaseModel):
     session_token: str
 
+
 class Watchlist(BaseModel):
-    watchlist_id: int 
+    watchlist_id: int
     name: str
 
+
 class ListResponse(BaseModel):
-    watchlists: List[Watchlist] 
+    watchlists: List[Watchlist]
+
+
+LIST_WATCHLISTS = statements.register(
+    "watchlists.list_watchlists",
+    """
+    SELECT
+    watchlist_id, name
+    FROM watchlists
+    WHERE user_id = :user_id
+    """,
+)
+
 
 @router.post("/list_watchlists", response_model=ListResponse)
-def list_watchlists(request: GetSessionToken) -> ListResponse:
+async def list_watchlists(
+    request: GetSessionToken,
+    ctx: sessions.SessionContext = Depends(sessions.session_context),
+) -> ListResponse:
     """
     List the watchlists under user's ownership
     """
 
-    with db.engine.begin() as connection:
-        # Authenticate session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        # Get all watchlists for user
-        watchlists = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT
-                watchlist_id, name
-                FROM watchlists
-                WHERE user_id = :user_id
-                """
-            ),
-            {"user_id": logged_in.user_id}
-        ).fetchall()
-
-        watchlists_list=[
-            Watchlist(
-                watchlist_id = w.watchlist_id,
-                name = w.name
-            )
-            for w in watchlists
-        ]
-
-        return ListResponse(watchlists=watchlists_list)
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Get all watchlists for user
+    watchlists = (
+        await connection.execute(LIST_WATCHLISTS, {"user_id": user_id})
+    ).fetchall()
+
+    watchlists_list = [
+        Watchlist(watchlist_id=w.watchlist_id, name=w.name) for w in watchlists
+    ]
+
+    return ListResponse(watchlists=watchlists_list)
 
 
 class FindCurrWatchlistResponse(BaseModel):
@@ -148,319 +139,253 @@ class FindCurrWatchlistResponse(BaseModel):
     watchlist_id: Optional[int] = None
     name: Optional[str] = None
 
+
+FIND_WATCHLIST = statements.register(
+    "watchlists.find_watchlist",
+    """
+    SELECT watchlist_id, name FROM watchlists
+    WHERE watchlist_id = :watchlist_id
+    """,
+)
+
+
 @router.post("/find_current_watchlist", response_model=FindCurrWatchlistResponse)
-def find_current_watchlist(request: GetSessionToken) -> FindCurrWatchlistResponse:
+async def find_current_watchlist(
+    request: GetSessionToken,
+    ctx: sessions.SessionContext = Depends(sessions.session_context),
+) -> FindCurrWatchlistResponse:
     """
     Returns the ID and name of the watchlist the user is currently in
     """
 
-    with db.engine.begin() as connection:
-        # Authenticate session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        user_id = logged_in.user_id
-
-        # Retrieve user's current watchlist
-        res = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT
-                ucw.current_watchlist, w.name
-                FROM user_current_watchlist ucw
-                LEFT JOIN watchlists w ON ucw.current_watchlist = w.watchlist_id
-                WHERE ucw.user_id = :user_id
-                """
-            ),
-            {"user_id": user_id}
-        ).first()
-
-        if not res.current_watchlist:
-            return FindCurrWatchlistResponse(
-                message="No current watchlist set",
-                watchlist_id=None,
-                name=None
-            )
+    connection = ctx.connection
 
+    if ctx.watchlist_id is None:
         return FindCurrWatchlistResponse(
-            message="Current watchlist found",
-            watchlist_id=res.current_watchlist,
-            name=res.name
+            message="No current watchlist set", watchlist_id=None, name=None
         )
 
+    # Retrieve the current watchlist's name
+    res = (
+        await connection.execute(FIND_WATCHLIST, {"watchlist_id": ctx.watchlist_id})
+    ).first()
+
+    return FindCurrWatchlistResponse(
+        message="Current watchlist found", watchlist_id=res.watchlist_id, name=res.name
+    )
+
+
+FIND_WATCHLIST_BY_NAME = statements.register(
+    "watchlists.find_watchlist_by_name",
+    """
+    SELECT watchlist_id FROM watchlists
+    WHERE user_id = :user_id AND name = :name 
+    """,
+)
+
+SET_CURRENT_WATCHLIST = statements.register(
+    "watchlists.set_current_watchlist",
+    """
+    UPDATE user_current_watchlist
+    SET current_watchlist = :watchlist_id
+    WHERE user_id = :user_id
+    RETURNING current_watchlist
+    """,
+)
+
 
 @router.post("/switch", response_model=CreateSwitchWatchlistResponse)
-def switch_watchlist(request: CreateSwitchWatchlistRequest) -> CreateSwitchWatchlistResponse:
+@retry.on_conflict
+async def switch_watchlist(
+    request: CreateSwitchWatchlistRequest,
+    ctx: sessions.SessionContext = Depends(sessions.write_session_context),
+) -> CreateSwitchWatchlistResponse:
     """
     Allows a user to switch their current active portfolio
     """
 
-    with db.engine.begin() as connection:
-        # Authenticate user w/ session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        user_id = logged_in.user_id
-
-        # Get watchlist_id for given user & watchlist name 
-        watchlist = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT watchlist_id FROM watchlists
-                WHERE user_id = :user_id AND name = :name 
-                """
-            ),
-            {
-                "user_id": user_id,
-                "name": request.watchlist_name
-            }
-        ).first()
-
-        if not watchlist:
-            raise HTTPException(status_code=400, detail="Watchlist not found")
-
-        watchlist_id = watchlist.watchlist_id
-
-        # Update user_current_watchlist
-        update = connection.execute(
-            sqlalchemy.text(
-                """
-                UPDATE user_current_watchlist
-                SET current_watchlist = :watchlist_id
-                WHERE user_id = :user_id
-                RETURNING current_watchlist
-                """
-            ),
-            {
-                "watchlist_id": watchlist_id,
-                "user_id": user_id
-            }
-        ).first()
-
-        if update:
-            return CreateSwitchWatchlistResponse(
-                message="Active watchlist switched successfully!",
-                watchlist_id=update.current_watchlist,
-                watchlist_name=request.watchlist_name
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Failed to switch active watchlist")
+    connection = ctx.connection
+    user_id = ctx.user_id
+
+    # Get watchlist_id for given user & watchlist name
+    watchlist = (
+        await connection.execute(
+            FIND_WATCHLIST_BY_NAME, {"user_id": user_id, "name": request.watchlist_name}
+        )
+    ).first()
+
+    if not watchlist:
+        raise HTTPException(status_code=400, detail="Watchlist not found")
+
+    watchlist_id = watchlist.watchlist_id
+
+    # Update user_current_watchlist
+    update = (
+        await connection.execute(
+            SET_CURRENT_WATCHLIST, {"watchlist_id": watchlist_id, "user_id": user_id}
+        )
+    ).first()
+
+    if update:
+        return CreateSwitchWatchlistResponse(
+            message="Active watchlist switched successfully!",
+            watchlist_id=update.current_watchlist,
+            watchlist_name=request.watchlist_name,
+        )
+    else:
+        raise HTTPException(status_code=400, detail="Failed to switch active watchlist")
 
 
 class AddRemoveRequest(BaseModel):
     session_token: str
     stock_ticker: str
 
+
 class AddRemoveResponse(BaseModel):
     message: str
     stock_ticker: str
     stock_name: str
 
+
+FIND_STOCK = statements.register(
+    "watchlists.find_stock",
+    """
+    SELECT stock_id, ticker_symbol, stock_name FROM stocks
+    WHERE ticker_symbol = :ticker_symbol
+    """,
+)
+
+WATCHLIST_ITEM_EXISTS = statements.register(
+    "watchlists.watchlist_item_exists",
+    """
+    SELECT 1 FROM watchlist_items
+    WHERE watchlist_id = :watchlist_id AND stock_id = :stock_id
+    """,
+)
+
+INSERT_WATCHLIST_ITEM = statements.register(
+    "watchlists.insert_watchlist_item",
+    """
+    INSERT INTO watchlist_items (watchlist_id, stock_id)
+    VALUES (:watchlist_id, :stock_id)
+    """,
+)
+
+
 @router.post("/add_stock", response_model=AddRemoveResponse)
-def add_stock(request: AddRemoveRequest) -> AddRemoveResponse:
+@retry.on_conflict
+async def add_stock(
+    request: AddRemoveRequest,
+    ctx: sessions.SessionContext = Depends(sessions.write_session_context),
+) -> AddRemoveResponse:
     """
     Allows a user to add a stock into their current watchlist
     Throws an error if stock is already in the watchlist
     """
 
-    with db.engine.begin() as connection:
-        # Authenticate session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-
-        user_id = logged_in.user_id
-
-        # Retrieve user's current watchlist
-        watchlist = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT current_watchlist FROM user_current_watchlist
-                WHERE user_id = :user_id
-                """
-            ),
-            {"user_id": user_id}
-        ).first()
-
-        if not watchlist or not watchlist.current_watchlist:
-            raise HTTPException(status_code=400, detail="No current watchlist set")
-
-        watchlist_id = watchlist.current_watchlist
-
-        # Validate existence of requested stock
-        stock = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT stock_id, ticker_symbol, stock_name FROM stocks
-                WHERE ticker_symbol = :ticker_symbol
-                """
-            ),
-            {"ticker_symbol": request.stock_ticker.upper()}
-        ).first()
-
-        if not stock:
-            raise HTTPException(status_code=404, detail="Stock not found")
-
-        stock_id = stock.stock_id
-
-        # Checks if stock is already in watchlist
-        exists = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT 1 FROM watchlist_items
-                WHERE watchlist_id = :watchlist_id AND stock_id = :stock_id
-                """
-            ),
-            {
-                "watchlist_id": watchlist_id,
-                "stock_id": stock_id
-            }
-        ).first()
-
-        if exists:
-            raise HTTPException(status_code=400, detail="Stock is already in watchlist")
-
-        # Add stock into watchlist
-        connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO watchlist_items (watchlist_id, stock_id)
-                VALUES (:watchlist_id, :stock_id)
-                """
-            ),
-            {
-                "watchlist_id": watchlist_id,
-                "stock_id": stock.stock_id
-            }
+    connection = ctx.connection
+
+    # Current watchlist was resolved with the session
+    if ctx.watchlist_id is None:
+        raise HTTPException(status_code=400, detail="No current watchlist set")
+
+    watchlist_id = ctx.watchlist_id
+
+    # Validate existence of requested stock
+    stock = (
+        await connection.execute(
+            FIND_STOCK, {"ticker_symbol": request.stock_ticker.upper()}
         )
+    ).first()
+
+    if not stock:
+        raise HTTPException(status_code=404, detail="Stock not found")
+
+    stock_id = stock.stock_id
 
-        return AddRemoveResponse(
-            message="Stock successfully added to watchlist",
-            stock_ticker=stock.ticker_symbol,
-            stock_name=stock.stock_name
+    # Checks if stock is already in watchlist
+    exists = (
+        await connection.execute(
+            WATCHLIST_ITEM_EXISTS, {"watchlist_id": watchlist_id, "stock_id": stock_id}
         )
+    ).first()
+
+    if exists:
+        raise HTTPException(status_code=400, detail="Stock is already in watchlist")
+
+    # Add stock into watchlist
+    await connection.execute(
+        INSERT_WATCHLIST_ITEM,
+        {"watchlist_id": watchlist_id, "stock_id": stock.stock_id},
+    )
+
+    return AddRemoveResponse(
+        message="Stock successfully added to watchlist",
+        stock_ticker=stock.ticker_symbol,
+        stock_name=stock.stock_name,
+    )
+
+
+DELETE_WATCHLIST_ITEM = statements.register(
+    "watchlists.delete_watchlist_item",
+    """
+    DELETE FROM watchlist_items 
+    WHERE watchlist_id = :watchlist_id AND stock_id = :stock_id
+    """,
+)
 
 
 @router.post("/remove_stock", response_model=AddRemoveResponse)
-def remove_stock(request: AddRemoveRequest) -> AddRemoveResponse:
+@retry.on_conflict
+async def remove_stock(
+    request: AddRemoveRequest,
+    ctx: sessions.SessionContext = Depends(sessions.write_session_context),
+) -> AddRemoveResponse:
     """
     Allows a user to remove a stock into their current watchlist
     """
-    
-    with db.engine.begin() as connection:
-        # Authenticate session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-
-        user_id = logged_in.user_id
-
-        # Retrieve user's current watchlist
-        watchlist = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT current_watchlist FROM user_current_watchlist
-                WHERE user_id = :user_id
-                """
-            ),
-            {"user_id": user_id}
-        ).first()
-
-        if not watchlist or not watchlist.current_watchlist:
-            raise HTTPException(status_code=400, detail="No current watchlist set")
-
-        watchlist_id = watchlist.current_watchlist
-
-        # Validate existence of requested stock
-        stock = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT stock_id, ticker_symbol, stock_name FROM stocks
-                WHERE ticker_symbol = :ticker_symbol
-                """
-            ),
-            {"ticker_symbol": request.stock_ticker.upper()}
-        ).first()
-
-        if not stock:
-            raise HTTPException(status_code=404, detail="Stock not found")
-
-        stock_id = stock.stock_id
-
-        # Checks if stock is already in watchlist
-        exists = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT 1 FROM watchlist_items
-                WHERE watchlist_id = :watchlist_id AND stock_id = :stock_id
-                """
-            ),
-            {
-                "watchlist_id": watchlist_id,
-                "stock_id": stock_id
-            }
-        ).first()
-
-        if not exists:
-            raise HTTPException(status_code=400, detail="Stock is not in watchlist")
-
-        # Add stock into watchlist
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM watchlist_items 
-                WHERE watchlist_id = :watchlist_id AND stock_id = :stock_id
-                """
-            ),
-            {
-                "watchlist_id": watchlist_id,
-                "stock_id": stock.stock_id
-            }
+
+    connection = ctx.connection
+
+    # Current watchlist was resolved with the session
+    if ctx.watchlist_id is None:
+        raise HTTPException(status_code=400, detail="No current watchlist set")
+
+    watchlist_id = ctx.watchlist_id
+
+    # Validate existence of requested stock
+    stock = (
+        await connection.execute(
+            FIND_STOCK, {"ticker_symbol": request.stock_ticker.upper()}
         )
+    ).first()
+
+    if not stock:
+        raise HTTPException(status_code=404, detail="Stock not found")
 
-        return AddRemoveResponse(
-            message="Stock successfully removed from watchlist",
-            stock_ticker=stock.ticker_symbol,
-            stock_name=stock.stock_name
+    stock_id = stock.stock_id
+
+    # Checks if stock is already in watchlist
+    exists = (
+        await connection.execute(
+            WATCHLIST_ITEM_EXISTS, {"watchlist_id": watchlist_id, "stock_id": stock_id}
         )
+    ).first()
+
+    if not exists:
+        raise HTTPException(status_code=400, detail="Stock is not in watchlist")
+
+    # Add stock into watchlist
+    await connection.execute(
+        DELETE_WATCHLIST_ITEM,
+        {"watchlist_id": watchlist_id, "stock_id": stock.stock_id},
+    )
+
+    return AddRemoveResponse(
+        message="Stock successfully removed from watchlist",
+        stock_ticker=stock.ticker_symbol,
+        stock_name=stock.stock_name,
+    )
 
 
 class StockItem(BaseModel):
@@ -469,84 +394,77 @@ class StockItem(BaseModel):
     stock_name: str
     price_per_share: float
 
+
 class GetWatchlistItemsResponse(BaseModel):
     message: str
     watchlist_id: int
     watchlist_name: str
     items: List[StockItem]
 
+
+GET_WATCHLIST_NAME = statements.register(
+    "watchlists.get_watchlist_name",
+    """
+    SELECT name FROM watchlists
+    WHERE watchlist_id = :watchlist_id
+    """,
+)
+
+GET_WATCHLIST_ITEMS = statements.register(
+    "watchlists.get_watchlist_items",
+    """
+    SELECT
+    s.stock_id, s.ticker_symbol, s.stock_name, ss.price_per_share
+    FROM watchlist_items wi
+    JOIN stocks s ON wi.stock_id = s.stock_id
+    JOIN stock_state ss ON s.stock_id = ss.stock_id
+    WHERE wi.watchlist_id = :watchlist_id
+    ORDER BY s.ticker_symbol
+    """,
+)
+
+
 @router.post("/get_watchlist_items", response_model=GetWatchlistItemsResponse)
-def get_watchlist_items(request: GetSessionToken) -> GetWatchlistItemsResponse:
+async def get_watchlist_items(
+    request: GetSessionToken,
+    ctx: sessions.SessionContext = Depends(sessions.read_session_context),
+) -> GetWatchlistItemsResponse:
     """
     Returns all stocks in the user's current watchlist
     """
 
-    with db.engine.begin() as connection:
-        # Authenticate session token
-        logged_in = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT user_id FROM temp_user_tokens
-                WHERE token = :token
-                """
-            ),
-            {"token": request.session_token}
-        ).first()
-        
-        if not logged_in:
-            raise HTTPException(status_code=401, detail="Invalid session")
-
-        user_id = logged_in.user_id
-
-        # Retrieve user's current watchlist
-        watchlist = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT ucw.current_watchlist, w.name
-                FROM user_current_watchlist ucw
-                JOIN watchlists w ON ucw.current_watchlist = w.watchlist_id
-                WHERE ucw.user_id = :user_id
-                """
-            ),
-            {"user_id": user_id}
-        ).first()
-
-        if not watchlist or not watchlist.current_watchlist:
-            raise HTTPException(status_code=400, detail="No current watchlist set")
-
-        watchlist_id = watchlist.current_watchlist
-        watchlist_name = watchlist.name
-
-        # Get all stocks in the current watchlist
-        rows = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT
-                s.stock_id, s.ticker_symbol, s.stock_name, ss.price_per_share
-                FROM watchlist_items wi
-                JOIN stocks s ON wi.stock_id = s.stock_id
-                JOIN stock_state ss ON s.stock_id = ss.stock_id
-                WHERE wi.watchlist_id = :watchlist_id
-                ORDER BY s.ticker_symbol
-                """
-            ),
-            {"watchlist_id": watchlist_id}
-        ).fetchall()
-
-        # Store watchlist items into StockItem list
-        stocks = [
-            StockItem(
-                stock_id=row.stock_id,
-                ticker_symbol=row.ticker_symbol,
-                stock_name=row.stock_name,
-                price_per_share=row.price_per_share
-            )
-            for row in rows
-        ]
-        
-        return GetWatchlistItemsResponse(
-            message="Stocks retreived successfully",
-            watchlist_id=watchlist_id,
-            watchlist_name=watchlist_name,
-            items=stocks
+    connection = ctx.connection
+
+    # Current watchlist was resolved with the session
+    if ctx.watchlist_id is None:
+        raise HTTPException(status_code=400, detail="No current watchlist set")
+
+    watchlist_id = ctx.watchlist_id
+
+    # Retrieve the current watchlist's name
+    watchlist_name = (
+        await connection.execute(GET_WATCHLIST_NAME, {"watchlist_id": watchlist_id})
+    ).scalar_one()
+
+    # Get all stocks in the current watchlist
+    rows = (
+        await connection.execute(GET_WATCHLIST_ITEMS, {"watchlist_id": watchlist_id})
+    ).fetchall()
+
+    # Store watchlist items into StockItem list
+    stocks = [
+        StockItem(
+            stock_id=row.stock_id,
+            ticker_symbol=row.ticker_symbol,
+            stock_name=row.stock_name,
+            price_per_share=row.price_per_share,
         )
+        for row in rows
+    ]
+
+    return GetWatchlistItemsResponse(
+        message="Stocks retreived successfully",
+        watchlist_id=watchlist_id,
+        watchlist_name=watchlist_name,
+        items=stocks,
+    )
@@ -13,11 +13,188 @@ class Settings:
     API_KEY: str | None = os.getenv("API_KEY")
     POSTGRES_URI: str | None = os.getenv("POSTGRES_URI")
 
+    # Comma separated read replica URIs for read-only handlers (empty = primary only)
+    POSTGRES_READ_URIS: list[str] = [
+        uri.strip()
+        for uri in os.getenv("POSTGRES_READ_URIS", "").split(",")
+        if uri.strip()
+    ]
+    # After a write, the same session reads from the primary for this long (0 disables)
+    READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+    # "async" serves requests from psycopg's async driver, "sync" runs the
+    # sync engine's statements in the threadpool instead
+    DB_MODE: str = os.getenv("DB_MODE", "async")
+
+    # Connection pool, applied to both the async and the sync engine (per worker process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "-1"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+    # Executions after which psycopg prepares any other statement server-side ("off" disables)
+    DB_PREPARE_THRESHOLD: int | None = (
+        None
+        if os.getenv("DB_PREPARE_THRESHOLD", "5").lower() in ("off", "none")
+        else int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+    )
+
+    # "pessimistic" trades lock the portfolio row up front; "optimistic" trades
+    # read without locks and only write if the rows' versions are unchanged
+    TRADE_CONCURRENCY_MODE: str = os.getenv("TRADE_CONCURRENCY_MODE", "pessimistic")
+
+    # Write endpoints retry serialization failures (40001) and deadlocks (40P01)
+    # this many times in total, sleeping a jittered exponential backoff in between
+    RETRY_MAX_ATTEMPTS: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+    RETRY_BASE_DELAY_MS: float = float(os.getenv("RETRY_BASE_DELAY_MS", "10"))
+    RETRY_MAX_DELAY_MS: float = float(os.getenv("RETRY_MAX_DELAY_MS", "1000"))
+
+    # Group commit: trades arriving within this many milliseconds of each other
+    # share one transaction, each under its own savepoint (0 disables). A batch
+    # is committed early once it reaches the max batch size.
+    TRADE_GROUP_COMMIT_WINDOW_MS: float = float(
+        os.getenv("TRADE_GROUP_COMMIT_WINDOW_MS", "0")
+    )
+    TRADE_GROUP_COMMIT_MAX_BATCH: int = int(
+        os.getenv("TRADE_GROUP_COMMIT_MAX_BATCH", "100")
+    )
+
+    # Stored responses for requests sent with an Idempotency-Key header; the most
+    # recent ones are also kept in memory
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+    # Background random walk of stock prices; every move also fills the resting
+    # limit orders it crosses
+    PRICE_UPDATER_ENABLED: bool = os.getenv(
+        "PRICE_UPDATER_ENABLED", "true"
+    ).lower() in ("1", "true", "yes")
+    PRICE_UPDATE_INTERVAL_SECONDS: float = float(
+        os.getenv("PRICE_UPDATE_INTERVAL_SECONDS", "60")
+    )
+
+    # Price model (src/price_model.py): per-stock drift and volatility live in
+    # stock_state. Shocks share one market factor with this pairwise
+    # correlation, unless PRICE_CORRELATION_FILE (CSV, tickers as header) gives
+    # the matrix for its tickers. Each tick a stock jumps with
+    # PRICE_JUMP_PROBABILITY, by a log return ~ N(PRICE_JUMP_MEAN, PRICE_JUMP_STDDEV).
+    PRICE_CORRELATION: float = float(os.getenv("PRICE_CORRELATION", "0.3"))
+    PRICE_CORRELATION_FILE: str | None = os.getenv("PRICE_CORRELATION_FILE")
+    PRICE_JUMP_PROBABILITY: float = float(os.getenv("PRICE_JUMP_PROBABILITY", "0"))
+    PRICE_JUMP_MEAN: float = float(os.getenv("PRICE_JUMP_MEAN", "0"))
+    PRICE_JUMP_STDDEV: float = float(os.getenv("PRICE_JUMP_STDDEV", "0.05"))
+    PRICE_SEED: int | None = (
+        int(os.environ["PRICE_SEED"]) if os.getenv("PRICE_SEED") else None
+    )
+
+    # Every tick is kept in price_history for this many days (0 keeps it
+    # forever); /stocks/{ticker}/history returns at most PRICE_HISTORY_MAX_POINTS
+    PRICE_HISTORY_RETENTION_DAYS: int = int(
+        os.getenv("PRICE_HISTORY_RETENTION_DAYS", "30")
+    )
+    PRICE_HISTORY_MAX_POINTS: int = int(os.getenv("PRICE_HISTORY_MAX_POINTS", "1000"))
+
+    # /stocks/price and /stocks/prices are served from an in-process copy of the
+    # prices, reloaded on every price tick (LISTEN/NOTIFY) and never older than
+    # the max age if notifications stop arriving
+    PRICE_CACHE_ENABLED: bool = os.getenv("PRICE_CACHE_ENABLED", "true").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    PRICE_CACHE_MAX_AGE_SECONDS: float = float(
+        os.getenv("PRICE_CACHE_MAX_AGE_SECONDS", "5")
+    )
+
+    # Orders submitted to /orders/submit are executed by this many background
+    # tasks per worker (0 leaves them to other workers), a batch of up to
+    # ORDER_QUEUE_BATCH_SIZE orders of one portfolio at a time. Idle tasks look
+    # for new orders every poll interval. Long polls wait at most
+    # ORDER_STATUS_MAX_WAIT_SECONDS.
+    ORDER_QUEUE_WORKERS: int = int(os.getenv("ORDER_QUEUE_WORKERS", "2"))
+    ORDER_QUEUE_BATCH_SIZE: int = int(os.getenv("ORDER_QUEUE_BATCH_SIZE", "100"))
+    ORDER_QUEUE_POLL_SECONDS: float = float(
+        os.getenv("ORDER_QUEUE_POLL_SECONDS", "0.5")
+    )
+    ORDER_STATUS_MAX_WAIT_SECONDS: float = float(
+        os.getenv("ORDER_STATUS_MAX_WAIT_SECONDS", "30")
+    )
+
+    # In-process token -> user_id cache (size 0 disables it)
+    SESSION_CACHE_SIZE: int = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+    SESSION_CACHE_TTL_SECONDS: float = float(
+        os.getenv("SESSION_CACHE_TTL_SECONDS", "30")
+    )
+
+    # Database sessions expire this long after login; the sweeper deletes them in batches
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+    SESSION_SWEEP_INTERVAL_SECONDS: float = float(
+        os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60")
+    )
+    SESSION_SWEEP_BATCH_SIZE: int = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "1000"))
+
+    # "database" keeps tokens in temp_user_tokens, "signed" issues HMAC-signed tokens
+    SESSION_TOKEN_MODE: str = os.getenv("SESSION_TOKEN_MODE", "database")
+    SESSION_SECRET: str | None = os.getenv("SESSION_SECRET")
+    SIGNED_TOKEN_TTL_SECONDS: int = int(os.getenv("SIGNED_TOKEN_TTL_SECONDS", "86400"))
+    REVOCATION_REFRESH_SECONDS: float = float(
+        os.getenv("REVOCATION_REFRESH_SECONDS", "5")
+    )
+
+    # Password hashing process pool for /users/create and /users/login
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    HASH_POOL_WORKERS: int = int(
+        os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 2))
+    )
+    HASH_QUEUE_LIMIT: int = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+
     def __init__(self):
         if not self.API_KEY:
             raise ValueError("API_KEY is missing in the environment variables.")
         if not self.POSTGRES_URI:
             raise ValueError("POSTGRES_URI is missing in the environment variables.")
+        if self.DB_MODE not in ("async", "sync"):
+            raise ValueError("DB_MODE must be either 'async' or 'sync'.")
+        if self.TRADE_CONCURRENCY_MODE not in ("pessimistic", "optimistic"):
+            raise ValueError(
+                "TRADE_CONCURRENCY_MODE must be either 'pessimistic' or 'optimistic'."
+            )
+        if self.RETRY_MAX_ATTEMPTS < 1:
+            raise ValueError("RETRY_MAX_ATTEMPTS must be at least 1.")
+        if self.TRADE_GROUP_COMMIT_WINDOW_MS < 0:
+            raise ValueError("TRADE_GROUP_COMMIT_WINDOW_MS cannot be negative.")
+        if self.TRADE_GROUP_COMMIT_MAX_BATCH < 1:
+            raise ValueError("TRADE_GROUP_COMMIT_MAX_BATCH must be at least 1.")
+        if not 0 <= self.PRICE_CORRELATION <= 1:
+            raise ValueError("PRICE_CORRELATION must be between 0 and 1.")
+        if not 0 <= self.PRICE_JUMP_PROBABILITY <= 1:
+            raise ValueError("PRICE_JUMP_PROBABILITY must be between 0 and 1.")
+        if self.PRICE_JUMP_STDDEV < 0:
+            raise ValueError("PRICE_JUMP_STDDEV cannot be negative.")
+        if self.PRICE_HISTORY_RETENTION_DAYS < 0:
+            raise ValueError("PRICE_HISTORY_RETENTION_DAYS cannot be negative.")
+        if self.PRICE_HISTORY_MAX_POINTS < 2:
+            raise ValueError("PRICE_HISTORY_MAX_POINTS must be at least 2.")
+        if self.PRICE_CACHE_MAX_AGE_SECONDS <= 0:
+            raise ValueError("PRICE_CACHE_MAX_AGE_SECONDS must be greater than 0.")
+        if self.ORDER_QUEUE_WORKERS < 0:
+            raise ValueError("ORDER_QUEUE_WORKERS cannot be negative.")
+        if self.ORDER_QUEUE_BATCH_SIZE < 1:
+            raise ValueError("ORDER_QUEUE_BATCH_SIZE must be at least 1.")
+        if self.SESSION_TOKEN_MODE not in ("database", "signed"):
+            raise ValueError(
+                "SESSION_TOKEN_MODE must be either 'database' or 'signed'."
+            )
+        if self.SESSION_TOKEN_MODE == "signed" and not self.SESSION_SECRET:
+            raise ValueError(
+                "SESSION_SECRET is required when SESSION_TOKEN_MODE is 'signed'."
+            )
 
 
 @lru_cache()
@@ -1,7 +1,241 @@
-from src import config
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+import itertools
+import time
+from typing import Any, AsyncIterator
+
+from fastapi.concurrency import run_in_threadpool
+from src import config, statements
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.metrics import Histogram
+
+settings = config.get_settings()
+
+
+class PoolMetrics:
+    def __init__(self):
+        # Time spent inside the pool getting a connection: waiting for one to be
+        # returned, or opening a new one while under pool_size + max_overflow
+        self.wait_time = Histogram()
+        # Whole checkout as seen by the caller, including the pre-ping
+        self.checkout_latency = Histogram()
+        self.timeouts = 0
+
+
+# AsyncAdaptedQueuePool is a QueuePool too, so both pools share this base
+class _InstrumentedPool(QueuePool):
+    metrics: PoolMetrics
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.metrics.checkout_latency.observe(
+                (time.perf_counter() - started) * 1000
+            )
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.wait_time.observe((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            # overflow() counts up from -pool_size, only positive values are extra connections
+            "overflow": max(self.overflow(), 0),
+            "timeouts": self.metrics.timeouts,
+            "wait_ms": self.metrics.wait_time.snapshot(),
+            "checkout_latency_ms": self.metrics.checkout_latency.snapshot(),
+        }
+
+
+# Metrics live on the class so they survive the pool being recreated by dispose()
+class InstrumentedQueuePool(_InstrumentedPool):
+    metrics = PoolMetrics()
+
+
+class InstrumentedAsyncPool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+def _engine_options() -> dict:
+    connect_args = {"prepare_threshold": settings.DB_PREPARE_THRESHOLD}
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = (
+            f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        )
+
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def _pool_class(base: type) -> type:
+    # A subclass per engine so every engine keeps its own pool metrics
+    return type(base.__name__, (base,), {"metrics": PoolMetrics()})
+
+
+def _create_engine(url: str):
+    sync_engine = create_engine(
+        url, poolclass=_pool_class(InstrumentedQueuePool), **_engine_options()
+    )
+    event.listen(sync_engine, "do_execute", statements.do_execute)
+    return sync_engine
+
+
+def _create_async_engine(url: str):
+    if settings.DB_MODE != "async":
+        return None
+    engine = create_async_engine(
+        url, poolclass=_pool_class(InstrumentedAsyncPool), **_engine_options()
+    )
+    event.listen(engine.sync_engine, "do_execute", statements.do_execute)
+    return engine
+
 
-connection_url = config.get_settings().POSTGRES_URI
-engine = create_engine(connection_url, pool_pre_ping=True)
+connection_url = settings.POSTGRES_URI
+engine = _create_engine(connection_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Request handlers use the async engine (psycopg's async driver) unless DB_MODE=sync.
+# The sync engine is always available for migrations and the background threads.
+async_engine = _create_async_engine(connection_url)
+
+# Optional read replicas for read-only handlers, used round-robin
+read_engines = [_create_engine(url) for url in settings.POSTGRES_READ_URIS]
+async_read_engines = [_create_async_engine(url) for url in settings.POSTGRES_READ_URIS]
+_next_replica = itertools.count()
+
+# Where read-only transactions went, for /admin/metrics/pool
+read_routing = {"replica": 0, "primary": 0, "session_fallbacks": 0}
+
+SET_READ_ONLY = statements.register(
+    "database.set_read_only",
+    """
+    SET TRANSACTION READ ONLY
+    """,
+)
+
+
+class ThreadedConnection:
+    """
+    Gives a sync Connection the awaitable execute() of an AsyncConnection by
+    running each statement in the threadpool. Used when DB_MODE=sync.
+    """
+
+    def __init__(self, connection: Connection):
+        self.sync_connection = connection
+
+    async def execute(self, statement, parameters: Any = None):
+        return await run_in_threadpool(
+            self.sync_connection.execute, statement, parameters
+        )
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_connection, *args, **kwargs)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_connection.rollback)
+
+
+@asynccontextmanager
+async def _begin(
+    async_target: AsyncEngine | None,
+    sync_target: Engine,
+    isolation_level: str | None = None,
+) -> AsyncIterator[AsyncConnection | ThreadedConnection]:
+    # Commits / rolls back whatever transaction is current when the block exits,
+    # which is not necessarily the first one: retry.on_conflict rolls back and
+    # re-runs a handler on the same connection
+    if async_target is not None:
+        async with async_target.connect() as connection:
+            if isolation_level:
+                await connection.execution_options(isolation_level=isolation_level)
+            await connection.begin()
+            try:
+                yield connection
+            except BaseException:
+                await connection.rollback()
+                raise
+            await connection.commit()
+        return
+
+    sync_connection: Connection = await run_in_threadpool(sync_target.connect)
+    try:
+        if isolation_level:
+            sync_connection.execution_options(isolation_level=isolation_level)
+        sync_connection.begin()
+        try:
+            yield ThreadedConnection(sync_connection)
+        except BaseException:
+            await run_in_threadpool(sync_connection.rollback)
+            raise
+        await run_in_threadpool(sync_connection.commit)
+    finally:
+        await run_in_threadpool(sync_connection.close)
+
+
+def begin(isolation_level: str | None = None):
+    """
+    Async counterpart of engine.begin(): yields a connection to the primary with
+    an open transaction, commits when the block exits and rolls back if it raises
+    """
+    return _begin(async_engine, engine, isolation_level)
+
+
+@asynccontextmanager
+async def begin_read(
+    use_primary: bool = False,
+) -> AsyncIterator[AsyncConnection | ThreadedConnection]:
+    """
+    Like begin(), but for read-only handlers: the transaction is READ ONLY and
+    runs on the next read replica, or on the primary if there are no replicas
+    or use_primary is set (read-your-writes)
+    """
+
+    if read_engines and not use_primary:
+        replica = next(_next_replica) % len(read_engines)
+        read_routing["replica"] += 1
+        target = _begin(async_read_engines[replica], read_engines[replica])
+    else:
+        read_routing["primary"] += 1
+        target = _begin(async_engine, engine)
+
+    async with target as connection:
+        await connection.execute(SET_READ_ONLY)
+        yield connection
+
+
+async def dispose() -> None:
+    for target in [async_engine, *async_read_engines]:
+        if target is not None:
+            await target.dispose()
+
+
+def pool_stats() -> dict:
+    stats = {"sync": engine.pool.stats()}
+    if async_engine is not None:
+        stats["async"] = async_engine.sync_engine.pool.stats()
+    for i, read_engine in enumerate(read_engines):
+        stats[f"read_{i}_sync"] = read_engine.pool.stats()
+        if async_read_engines[i] is not None:
+            stats[f"read_{i}_async"] = async_read_engines[i].sync_engine.pool.stats()
+    return stats
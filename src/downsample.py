@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks `points` of the series (x ascending)
+    that keep its visual shape, and returns their indices in order. The first
+    and last points are always kept; every bucket in between contributes the
+    point forming the largest triangle with the point picked before it and the
+    average of the next bucket, so spikes survive where averaging would flatten
+    them. O(n).
+    """
+
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1][: max(points, 0)])
+
+    every = (n - 2) / (points - 2)
+    picked = np.empty(points, dtype=np.int64)
+    picked[0] = 0
+    previous = 0
+    for bucket in range(points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # Twice the triangle areas; only the largest matters
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        picked[bucket + 1] = previous
+
+    picked[-1] = n - 1
+    return picked
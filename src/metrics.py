@@ -0,0 +1,59 @@
+import bisect
+import threading
+
+# Upper bounds (milliseconds) of the latency buckets; anything slower lands in "+Inf"
+DEFAULT_BUCKETS_MS = (
+    0.1,
+    0.5,
+    1,
+    2,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of observations (milliseconds by default).
+    Counts are cumulative for the life of the worker process.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            count = sum(self._counts)
+            # Each bucket counts observations above the previous bound, up to its own
+            labels = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+            return {
+                "count": count,
+                "sum": round(self._sum, 3),
+                "mean": round(self._sum / count, 3) if count else 0.0,
+                "max": round(self._max, 3),
+                "buckets": dict(zip(labels, self._counts)),
+            }
@@ -0,0 +1,84 @@
+import heapq
+
+
+class OrderBook:
+    """
+    Resting limit orders for one stock in price-time priority. Bids are a max
+    heap on limit price, asks a min heap, both tie-broken by order_id (placement
+    order). Prices are integer cents.
+
+    Cancelled orders are only marked dead and dropped when they reach the top of
+    their heap; the heaps are rebuilt once dead entries outnumber live ones.
+    Not thread safe, callers hold their own lock.
+    """
+
+    def __init__(self):
+        # (-limit_cents, order_id) and (limit_cents, order_id)
+        self._bids: list[tuple[int, int]] = []
+        self._asks: list[tuple[int, int]] = []
+        self._live: set[int] = set()
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._live
+
+    def add(self, order_id: int, side: str, limit_cents: int) -> None:
+        if order_id in self._live:
+            return
+        self._live.add(order_id)
+        if side == "buy":
+            heapq.heappush(self._bids, (-limit_cents, order_id))
+        else:
+            heapq.heappush(self._asks, (limit_cents, order_id))
+
+    def discard(self, order_id: int) -> None:
+        if order_id not in self._live:
+            return
+        self._live.remove(order_id)
+        self._dead += 1
+        if self._dead > len(self._live):
+            self._compact()
+
+    def crossed(self, price_cents: int) -> list[int]:
+        """
+        Removes and returns every order the price crosses, best price first:
+        bids with a limit at or above the price, then asks at or below it.
+        O(log n) per order returned.
+        """
+
+        filled: list[int] = []
+        while self._bids and -self._bids[0][0] >= price_cents:
+            self._take(heapq.heappop(self._bids)[1], filled)
+        while self._asks and self._asks[0][0] <= price_cents:
+            self._take(heapq.heappop(self._asks)[1], filled)
+        return filled
+
+    def best_bid(self) -> int | None:
+        self._skip_dead(self._bids)
+        return -self._bids[0][0] if self._bids else None
+
+    def best_ask(self) -> int | None:
+        self._skip_dead(self._asks)
+        return self._asks[0][0] if self._asks else None
+
+    def _take(self, order_id: int, filled: list[int]) -> None:
+        if order_id in self._live:
+            self._live.remove(order_id)
+            filled.append(order_id)
+        else:
+            self._dead -= 1
+
+    def _skip_dead(self, heap: list[tuple[int, int]]) -> None:
+        while heap and heap[0][1] not in self._live:
+            heapq.heappop(heap)
+            self._dead -= 1
+
+    def _compact(self) -> None:
+        self._bids = [entry for entry in self._bids if entry[1] in self._live]
+        self._asks = [entry for entry in self._asks if entry[1] in self._live]
+        heapq.heapify(self._bids)
+        heapq.heapify(self._asks)
+        self._dead = 0
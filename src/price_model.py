@@ -0,0 +1,137 @@
+import csv
+
+import numpy as np
+
+
+def load_correlation(path: str) -> tuple[list[str], np.ndarray]:
+    """
+    Reads a correlation matrix from a CSV file whose header row is the ticker
+    symbols, followed by one row of the matrix per ticker in the same order.
+    Returns the tickers and the matrix. Raises ValueError if the matrix is not
+    a valid correlation matrix.
+    """
+
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    tickers = [ticker.strip().upper() for ticker in rows[0]]
+    matrix = np.array(
+        [[float(value) for value in row] for row in rows[1:] if row], dtype=np.float64
+    )
+
+    if len(set(tickers)) != len(tickers):
+        raise ValueError(f"{path}: duplicate tickers")
+    if matrix.shape != (len(tickers), len(tickers)):
+        raise ValueError(
+            f"{path}: expected a {len(tickers)}x{len(tickers)} matrix, got {matrix.shape}"
+        )
+    if not np.allclose(matrix, matrix.T) or not np.allclose(np.diag(matrix), 1.0):
+        raise ValueError(f"{path}: matrix must be symmetric with a unit diagonal")
+    try:
+        np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        raise ValueError(f"{path}: matrix is not positive definite") from None
+    return tickers, matrix
+
+
+class PriceModel:
+    """
+    Multi-asset geometric Brownian motion with optional Merton jumps, one step
+    per price tick. A stock's log return over a tick is
+
+        drift - volatility^2 / 2 - jump compensation + volatility * z + jump
+
+    where z is a standard normal shock correlated across stocks and jump is
+    N(jump_mean, jump_stddev) with probability jump_probability, else 0. The
+    compensation keeps the expected price change at drift whatever the jumps.
+
+    Shocks are correlated through one market factor shared by every stock
+    (pairwise correlation `correlation`), or, for the tickers of a correlation
+    matrix, through its Cholesky factor; tickers outside the matrix then move
+    independently. The one-factor form costs O(n) per tick, so it scales to
+    any number of stocks.
+    """
+
+    def __init__(
+        self,
+        correlation: float = 0.0,
+        matrix: tuple[list[str], np.ndarray] | None = None,
+        jump_probability: float = 0.0,
+        jump_mean: float = 0.0,
+        jump_stddev: float = 0.0,
+        seed: int | None = None,
+    ):
+        if not 0.0 <= correlation <= 1.0:
+            raise ValueError("correlation must be between 0 and 1")
+        if not 0.0 <= jump_probability <= 1.0:
+            raise ValueError("jump_probability must be between 0 and 1")
+        if jump_stddev < 0:
+            raise ValueError("jump_stddev cannot be negative")
+
+        self.correlation = correlation
+        self.jump_probability = jump_probability
+        self.jump_mean = jump_mean
+        self.jump_stddev = jump_stddev
+        self._rng = np.random.default_rng(seed)
+
+        self._matrix: np.ndarray | None = None
+        self._matrix_tickers: dict[str, int] = {}
+        # Cholesky factors of the sub-matrices seen so far, by matrix indices
+        self._factors: dict[tuple[int, ...], np.ndarray] = {}
+        if matrix is not None:
+            tickers, self._matrix = matrix
+            self._matrix_tickers = {ticker: i for i, ticker in enumerate(tickers)}
+
+    def shocks(self, tickers: list[str]) -> np.ndarray:
+        """
+        One correlated standard normal shock per ticker
+        """
+
+        n = len(tickers)
+        if self._matrix is None:
+            market = self._rng.standard_normal()
+            return np.sqrt(self.correlation) * market + np.sqrt(
+                1.0 - self.correlation
+            ) * self._rng.standard_normal(n)
+
+        z = self._rng.standard_normal(n)
+        positions = [
+            (i, self._matrix_tickers[ticker])
+            for i, ticker in enumerate(tickers)
+            if ticker in self._matrix_tickers
+        ]
+        if positions:
+            rows, columns = np.array(positions).T
+            # The listed tickers present this tick, in this tick's order
+            key = tuple(columns.tolist())
+            factor = self._factors.get(key)
+            if factor is None:
+                factor = self._factors[key] = np.linalg.cholesky(
+                    self._matrix[np.ix_(columns, columns)]
+                )
+            z[rows] = factor @ self._rng.standard_normal(len(rows))
+        return z
+
+    def step(
+        self,
+        tickers: list[str],
+        prices: np.ndarray,
+        drift: np.ndarray,
+        volatility: np.ndarray,
+    ) -> np.ndarray:
+        """
+        The prices one tick later; every argument is per stock, in the same
+        order
+        """
+
+        log_return = drift - 0.5 * volatility**2 + volatility * self.shocks(tickers)
+
+        if self.jump_probability > 0:
+            n = len(tickers)
+            jumped = self._rng.random(n) < self.jump_probability
+            jumps = self._rng.normal(self.jump_mean, self.jump_stddev, n)
+            compensation = self.jump_probability * np.expm1(
+                self.jump_mean + 0.5 * self.jump_stddev**2
+            )
+            log_return += np.where(jumped, jumps, 0.0) - compensation
+
+        return prices * np.exp(log_return)
@@ -0,0 +1,52 @@
+import sqlalchemy
+from sqlalchemy.sql.elements import TextClause
+
+# Every SQL statement the API runs, by name. Statements are built once at
+# import time instead of on every request.
+_registry: dict[str, TextClause] = {}
+
+
+def register(name: str, sql: str, prepare: bool = False) -> TextClause:
+    """
+    Registers a named statement and returns it. Statements registered with
+    prepare=True are server-side prepared the first time a connection runs
+    them; the rest follow psycopg's prepare_threshold (DB_PREPARE_THRESHOLD).
+    """
+
+    if name in _registry:
+        raise ValueError(f"Statement '{name}' is already registered")
+
+    statement = sqlalchemy.text(sql)
+    if prepare:
+        statement = statement.execution_options(prepare=True)
+
+    _registry[name] = statement
+    return statement
+
+
+def get(name: str) -> TextClause:
+    return _registry[name]
+
+
+def names() -> list[str]:
+    return sorted(_registry)
+
+
+def prepared_names() -> list[str]:
+    return sorted(
+        name
+        for name, statement in _registry.items()
+        if statement.get_execution_options().get("prepare")
+    )
+
+
+def do_execute(cursor, statement, parameters, context) -> bool | None:
+    """
+    Engine "do_execute" hook: asks psycopg to prepare statements registered with prepare=True
+    """
+
+    if not context.execution_options.get("prepare"):
+        return None
+
+    cursor.execute(statement, parameters, prepare=True)
+    return True
@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+import pytest
+import sqlalchemy
+
+from src import database as db
+from src.api import candles
+
+TICK = sqlalchemy.text(
+    f"""
+    WITH ticks AS (
+        SELECT
+            CAST(:stock_id AS integer) AS stock_id,
+            CAST(:updated_at AS timestamp) AS updated_at,
+            CAST(:price AS numeric) AS price_per_share
+    )
+    {candles.UPSERT_CANDLES.format(ticks="ticks")}
+    """
+)
+
+CANDLES = sqlalchemy.text(
+    """
+    SELECT resolution, bucket, open, high, low, close, tick_count
+    FROM price_candles
+    WHERE stock_id = :stock_id
+    ORDER BY resolution, bucket
+    """
+)
+
+
+@pytest.fixture
+def connection():
+    # Needs the database in POSTGRES_URI; everything is rolled back. An engine
+    # of its own, as test_user replaces db.engine with a mock.
+    engine = sqlalchemy.create_engine(
+        db.connection_url, poolclass=sqlalchemy.pool.NullPool
+    )
+    try:
+        connection = engine.connect()
+    except sqlalchemy.exc.OperationalError:
+        pytest.skip("database not reachable")
+    with connection:
+        connection.begin()
+        yield connection
+        connection.rollback()
+
+
+def test_ticks_roll_over_into_new_buckets(connection):
+    stock_id = connection.execute(
+        sqlalchemy.text(
+            "INSERT INTO stocks (ticker_symbol, stock_name) VALUES ('TESTCANDLE', 'Candle test') RETURNING stock_id"
+        )
+    ).scalar_one()
+    ticks = [
+        ("2026-01-30 23:59:10", "100.00"),
+        ("2026-01-30 23:59:40", "105.00"),
+        ("2026-01-30 23:59:50", "95.00"),
+        # New minute, hour and day
+        ("2026-01-31 00:00:05", "101.00"),
+        # New minute only
+        ("2026-01-31 00:59:59", "99.00"),
+        # New minute and hour
+        ("2026-01-31 01:00:00", "102.00"),
+    ]
+    for updated_at, price in ticks:
+        connection.execute(
+            TICK, {"stock_id": stock_id, "updated_at": updated_at, "price": price}
+        )
+
+    rows = connection.execute(CANDLES, {"stock_id": stock_id}).fetchall()
+    got = {
+        (row.resolution, row.bucket.isoformat(" ")): (
+            row.open,
+            row.high,
+            row.low,
+            row.close,
+            row.tick_count,
+        )
+        for row in rows
+    }
+
+    def candle(open_, high, low, close, count):
+        return tuple(Decimal(value) for value in (open_, high, low, close)) + (count,)
+
+    assert got == {
+        ("1m", "2026-01-30 23:59:00"): candle("100", "105", "95", "95", 3),
+        ("1m", "2026-01-31 00:00:00"): candle("101", "101", "101", "101", 1),
+        ("1m", "2026-01-31 00:59:00"): candle("99", "99", "99", "99", 1),
+        ("1m", "2026-01-31 01:00:00"): candle("102", "102", "102", "102", 1),
+        ("1h", "2026-01-30 23:00:00"): candle("100", "105", "95", "95", 3),
+        ("1h", "2026-01-31 00:00:00"): candle("101", "101", "99", "99", 2),
+        ("1h", "2026-01-31 01:00:00"): candle("102", "102", "102", "102", 1),
+        ("1d", "2026-01-30 00:00:00"): candle("100", "105", "95", "95", 3),
+        ("1d", "2026-01-31 00:00:00"): candle("101", "102", "99", "102", 3),
+    }
@@ -0,0 +1,92 @@
+from email.utils import formatdate
+
+import pytest
+from fastapi import Request, Response
+
+from src.api import conditional
+
+TICKED_AT = 1_760_000_000.25
+
+
+@pytest.fixture(autouse=True)
+def tick_interval(monkeypatch):
+    monkeypatch.setattr(conditional.settings, "PRICE_UPDATE_INTERVAL_SECONDS", 60)
+
+
+def request_with(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def validate(
+    request: Request, now: float = TICKED_AT + 10
+) -> tuple[Response | None, Response]:
+    response = Response()
+    return conditional.validate(request, response, TICKED_AT, now), response
+
+
+def test_full_response_gets_validators_and_max_age():
+    not_modified, response = validate(request_with())
+
+    assert not_modified is None
+    assert (
+        response.headers["etag"]
+        == conditional.etag(TICKED_AT)
+        == '"%x"' % 1_760_000_000_250_000
+    )
+    assert response.headers["last-modified"] == formatdate(TICKED_AT, usegmt=True)
+    # The next tick is due 50 seconds from now
+    assert response.headers["cache-control"] == "private, max-age=50"
+
+
+def test_max_age_never_goes_negative():
+    _, response = validate(request_with(), now=TICKED_AT + 300)
+    assert response.headers["cache-control"] == "private, max-age=0"
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    [
+        conditional.etag(TICKED_AT),
+        f"W/{conditional.etag(TICKED_AT)}",
+        f'"stale", {conditional.etag(TICKED_AT)}',
+        "*",
+    ],
+)
+def test_matching_etag_is_not_modified(if_none_match):
+    not_modified, _ = validate(request_with(if_none_match=if_none_match))
+
+    assert not_modified is not None
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == conditional.etag(TICKED_AT)
+
+
+def test_other_etag_gets_the_full_response():
+    not_modified, _ = validate(
+        request_with(if_none_match=conditional.etag(TICKED_AT - 1))
+    )
+    assert not_modified is None
+
+
+def test_if_modified_since_compares_whole_seconds():
+    same_second = formatdate(TICKED_AT, usegmt=True)
+    earlier = formatdate(TICKED_AT - 1, usegmt=True)
+
+    assert validate(request_with(if_modified_since=same_second))[0] is not None
+    assert validate(request_with(if_modified_since=earlier))[0] is None
+    assert validate(request_with(if_modified_since="not a date"))[0] is None
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    request = request_with(
+        if_none_match='"stale"',
+        if_modified_since=formatdate(TICKED_AT, usegmt=True),
+    )
+    assert validate(request)[0] is None
@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+
+from src.api import group_commit, sessions, trade_engine
+
+
+class StubConnection:
+    """
+    Records the writes of a batch; rolling back to the savepoint drops the
+    writes made since it, committing keeps whatever is left
+    """
+
+    def __init__(self):
+        self.writes: list[str] = []
+        self.savepoint = 0
+
+    async def execute(self, statement, parameters=None):
+        if statement is trade_engine.SAVEPOINT:
+            self.savepoint = len(self.writes)
+        elif statement is trade_engine.ROLLBACK_TO_SAVEPOINT:
+            del self.writes[self.savepoint :]
+        elif statement is not trade_engine.RELEASE_SAVEPOINT:
+            self.writes.append(statement.text)
+
+
+class StubDatabase:
+    def __init__(self):
+        self.transactions = 0
+        self.committed: list[str] = []
+        self.fail_commit: Exception | None = None
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = StubDatabase()
+
+    @asynccontextmanager
+    async def begin(isolation_level=None):
+        database.transactions += 1
+        connection = StubConnection()
+        yield connection
+        if database.fail_commit is not None:
+            raise database.fail_commit
+        database.committed.extend(connection.writes)
+
+    async def resolve_session(connection, token):
+        if token == "expired":
+            return None
+        return sessions.SessionContext(
+            token=token,
+            user_id=1,
+            portfolio_id=int(token),
+            watchlist_id=None,
+            connection=connection,
+        )
+
+    monkeypatch.setattr(group_commit.db, "begin", begin)
+    monkeypatch.setattr(group_commit.sessions, "resolve_session", resolve_session)
+    monkeypatch.setattr(group_commit.settings, "TRADE_GROUP_COMMIT_WINDOW_MS", 5)
+    monkeypatch.setattr(group_commit.settings, "TRADE_GROUP_COMMIT_MAX_BATCH", 100)
+    return database
+
+
+def trade(write: str, fail: bool = False):
+    async def run(ctx: sessions.SessionContext):
+        await ctx.connection.execute(sqlalchemy.text(write))
+        if fail:
+            raise HTTPException(status_code=400, detail="Insufficient funds")
+        return (ctx.portfolio_id, write)
+
+    return run
+
+
+async def submit_all(*requests):
+    return await asyncio.gather(
+        *(group_commit.submit(token, run) for token, run in requests),
+        return_exceptions=True,
+    )
+
+
+def test_trades_in_one_window_share_a_transaction(database):
+    results = asyncio.run(
+        submit_all(("3", trade("c")), ("1", trade("a")), ("2", trade("b")))
+    )
+
+    assert results == [(3, "c"), (1, "a"), (2, "b")]
+    assert database.transactions == 1
+    # Run in port_id order, whatever order they arrived in
+    assert database.committed == ["a", "b", "c"]
+
+
+def test_a_failing_trade_is_rolled_back_alone(database):
+    results = asyncio.run(
+        submit_all(
+            ("1", trade("a")),
+            ("2", trade("b", fail=True)),
+            ("expired", trade("x")),
+            ("3", trade("c")),
+        )
+    )
+
+    assert results[0] == (1, "a")
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 400
+    assert isinstance(results[2], HTTPException) and results[2].status_code == 401
+    assert results[3] == (3, "c")
+    assert database.committed == ["a", "c"]
+
+
+def test_a_failed_commit_fails_every_trade(database):
+    database.fail_commit = ConnectionError("server closed the connection")
+
+    results = asyncio.run(submit_all(("1", trade("a")), ("2", trade("b"))))
+
+    assert all(result is database.fail_commit for result in results)
+    assert database.committed == []
@@ -0,0 +1,57 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from src.api import idempotency
+
+ENDPOINT = "transactions.buy_shares"
+
+
+class BuyShares(BaseModel):
+    session_token: str
+    stock_ticker: str
+    num_shares: float
+
+
+def stored_for(request_hash: bytes) -> idempotency.StoredResponse:
+    return idempotency.StoredResponse(
+        ENDPOINT, request_hash, 200, {"message": "Shares successfully bought"}
+    )
+
+
+def test_same_body_replays_the_stored_response():
+    first = idempotency._request_hash(
+        ENDPOINT,
+        {"request": BuyShares(session_token="a", stock_ticker="AAPL", num_shares=1)},
+    )
+    # Logging in again changes the token, not the request
+    retried = idempotency._request_hash(
+        ENDPOINT,
+        {"request": BuyShares(session_token="b", stock_ticker="AAPL", num_shares=1)},
+    )
+    assert retried == first
+
+    response = idempotency._replay(stored_for(first), ENDPOINT, retried)
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert response.body == b'{"message":"Shares successfully bought"}'
+
+
+def test_different_body_or_endpoint_is_rejected():
+    first = idempotency._request_hash(
+        ENDPOINT,
+        {"request": BuyShares(session_token="a", stock_ticker="AAPL", num_shares=1)},
+    )
+    changed = idempotency._request_hash(
+        ENDPOINT,
+        {"request": BuyShares(session_token="a", stock_ticker="AAPL", num_shares=2)},
+    )
+    assert changed != first
+
+    with pytest.raises(HTTPException) as raised:
+        idempotency._replay(stored_for(first), ENDPOINT, changed)
+    assert raised.value.status_code == 422
+
+    with pytest.raises(HTTPException) as raised:
+        idempotency._replay(stored_for(first), "transactions.sell_shares", first)
+    assert raised.value.status_code == 422
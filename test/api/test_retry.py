@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+
+from src.api import retry
+
+
+class FakeDriverError(Exception):
+    def __init__(self, sqlstate: str):
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def conflict(sqlstate: str) -> DBAPIError:
+    return DBAPIError("UPDATE portfolios ...", {}, FakeDriverError(sqlstate))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(retry.settings, "RETRY_BASE_DELAY_MS", 0)
+    monkeypatch.setattr(retry.settings, "RETRY_MAX_ATTEMPTS", 3)
+
+
+def test_retries_until_the_handler_succeeds():
+    failures = [conflict("40P01"), conflict("40001")]
+
+    async def flaky_write():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    handler = retry.on_conflict(flaky_write)
+    assert asyncio.run(handler()) == "ok"
+
+    stats = retry.counters["test_retry.flaky_write"]
+    assert stats["deadlocks"] == 1
+    assert stats["serialization_failures"] == 1
+    assert stats["retries"] == 2
+    assert stats["recovered"] == 1
+
+
+@pytest.mark.parametrize("sqlstate", ["40001", "40P01"])
+def test_gives_up_with_409(sqlstate):
+    calls = []
+
+    async def always_conflicts():
+        calls.append(1)
+        raise conflict(sqlstate)
+
+    exhausted = retry.counters.get("test_retry.always_conflicts", {}).get(
+        "exhausted", 0
+    )
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(retry.on_conflict(always_conflicts)())
+    assert raised.value.status_code == 409
+    assert len(calls) == 3
+    assert retry.counters["test_retry.always_conflicts"]["exhausted"] == exhausted + 1
+
+
+def test_does_not_retry_other_errors():
+    calls = []
+
+    async def unique_violation():
+        calls.append(1)
+        raise conflict("23505")
+
+    with pytest.raises(DBAPIError):
+        asyncio.run(retry.on_conflict(unique_violation)())
+    assert len(calls) == 1
@@ -0,0 +1,47 @@
+import time
+
+from src.api.signed_tokens import BloomFilter, RevocationSet, decode, issue
+
+SECRET = "test-secret"
+
+
+def test_signed_token_round_trip():
+    token = issue(42, secret=SECRET, ttl_seconds=60)
+    claims = decode(token, secret=SECRET)
+    assert claims is not None
+    assert claims.user_id == 42
+    assert claims.expires_at > time.time()
+
+
+def test_signed_token_rejects_tampering_and_wrong_secret():
+    token = issue(42, secret=SECRET, ttl_seconds=60)
+    user_id, rest = token.split(".", 1)
+    assert decode(f"43.{rest}", secret=SECRET) is None
+    assert decode(token, secret="other-secret") is None
+    assert decode("not-a-token", secret=SECRET) is None
+
+
+def test_signed_token_expires():
+    token = issue(42, secret=SECRET, ttl_seconds=-1)
+    assert decode(token, secret=SECRET) is None
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000)
+    keys = [f"jti-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+
+def test_revocation_set_grows_and_forgets_expired():
+    revocations = RevocationSet(min_capacity=4)
+    future = int(time.time()) + 60
+    for i in range(10):
+        revocations.add(f"jti-{i}", future)
+    assert all(f"jti-{i}" in revocations for i in range(10))
+    assert "jti-unknown" not in revocations
+
+    revocations.merge({"jti-old": int(time.time()) - 1})
+    assert "jti-old" not in revocations
+    assert len(revocations) == 10
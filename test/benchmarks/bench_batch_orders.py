@@ -0,0 +1,92 @@
+"""
+Compares one /transactions/batch call with N legs against the same N legs sent
+as separate /transactions/buy_shares and /transactions/sell_shares calls.
+
+Start the API first (python main.py or uvicorn src.api.server:app), then:
+    python -m test.benchmarks.bench_batch_orders --legs 2 10 50 --rounds 20
+
+Legs alternate buying and selling 0.01 shares of --ticker, so every round
+leaves the portfolio where it started. Prints the median wall time per round
+for both ways and the speedup.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from test.benchmarks.bench_login_flood import BASE_URL, HEADERS, setup_trader
+
+
+def make_legs(count: int, ticker: str) -> list[dict]:
+    return [
+        {
+            "side": "buy" if i % 2 == 0 else "sell",
+            "stock_ticker": ticker,
+            "num_shares": 0.01,
+        }
+        for i in range(count)
+    ]
+
+
+async def run_separate(
+    client: httpx.AsyncClient, token: str, legs: list[dict]
+) -> float:
+    started = time.perf_counter()
+    for leg in legs:
+        res = await client.post(
+            f"/transactions/{leg['side']}_shares",
+            json={
+                "session_token": token,
+                "stock_ticker": leg["stock_ticker"],
+                "num_shares": leg["num_shares"],
+            },
+        )
+        res.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def run_batch(client: httpx.AsyncClient, token: str, legs: list[dict]) -> float:
+    started = time.perf_counter()
+    res = await client.post(
+        "/transactions/batch", json={"session_token": token, "legs": legs}
+    )
+    res.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def main(leg_counts: list[int], rounds: int, ticker: str):
+    async with httpx.AsyncClient(
+        base_url=BASE_URL, headers=HEADERS, timeout=60
+    ) as client:
+        token = await setup_trader(client)
+
+        print(f"{'legs':>6}{'separate ms':>14}{'batch ms':>12}{'speedup':>10}")
+        for count in leg_counts:
+            legs = make_legs(count, ticker)
+            separate = [await run_separate(client, token, legs) for _ in range(rounds)]
+            batched = [await run_batch(client, token, legs) for _ in range(rounds)]
+            separate_ms = statistics.median(separate)
+            batch_ms = statistics.median(batched)
+            print(
+                f"{count:>6}{separate_ms:>14.2f}{batch_ms:>12.2f}{separate_ms / batch_ms:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--legs",
+        type=int,
+        nargs="+",
+        default=[2, 10, 50],
+        help="legs per round (even numbers)",
+    )
+    parser.add_argument("--rounds", type=int, default=20, help="rounds per leg count")
+    parser.add_argument("--ticker", default="RIOT", help="stock to trade")
+    args = parser.parse_args()
+    asyncio.run(main(args.legs, args.rounds, args.ticker))
@@ -0,0 +1,168 @@
+"""
+Candle queries over a year of ticks: aggregating price_history with
+date_trunc on every request versus reading price_candles.
+
+Runs against the database configured in POSTGRES_URI. Creates a throwaway
+stock with one tick per --tick-seconds for the past year (creating the
+daily price_history partitions that are missing), builds its candles with
+the rebuild command, then times both queries --repeat times for a day of 1m
+candles, a month of 1h candles and a year of 1d candles. Everything it
+created is removed afterwards. Keep the price updater off while it runs: its
+partition maintenance drops days older than PRICE_HISTORY_RETENTION_DAYS.
+
+    python -m test.benchmarks.bench_candles --tick-seconds 60
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy
+
+from src import database as db
+from src.api import candles
+from test.benchmarks.bench_login_flood import percentile
+
+TICKER = "BENCHCANDLE"
+DAYS = 365
+
+# Candles as they would be computed without price_candles
+RAW_CANDLES = sqlalchemy.text(
+    """
+    SELECT
+        date_trunc(:unit, ts) AS bucket,
+        (array_agg(price ORDER BY ts))[1] AS open,
+        MAX(price) AS high,
+        MIN(price) AS low,
+        (array_agg(price ORDER BY ts DESC))[1] AS close,
+        COUNT(*) AS tick_count
+    FROM price_history
+    WHERE stock_id = :stock_id AND ts >= :start AND ts <= :end
+    GROUP BY 1
+    ORDER BY 1
+    """
+)
+
+
+def create_history(engine, tick_seconds: int) -> tuple[int, list[str]]:
+    """
+    Returns the throwaway stock's id and the partitions created for it
+    """
+
+    today = datetime.now().date()
+    created = []
+    with engine.begin() as connection:
+        existing = set(
+            connection.execute(
+                sqlalchemy.text(
+                    "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'price_history'::regclass"
+                )
+            ).scalars()
+        )
+        for offset in range(DAYS + 1):
+            day = today - timedelta(days=offset)
+            name = f"price_history_{day:%Y%m%d}"
+            if name not in existing:
+                connection.execute(
+                    sqlalchemy.text(
+                        f"CREATE TABLE {name} PARTITION OF price_history "
+                        f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+                    )
+                )
+                created.append(name)
+
+        stock_id = connection.execute(
+            sqlalchemy.text(
+                "INSERT INTO stocks (ticker_symbol, stock_name) VALUES (:ticker, 'Benchmark stock') RETURNING stock_id"
+            ),
+            {"ticker": TICKER},
+        ).scalar_one()
+        # A slow wave plus noise, one tick per tick_seconds
+        connection.execute(
+            sqlalchemy.text(
+                """
+                INSERT INTO price_history (stock_id, ts, price)
+                SELECT :stock_id, ts,
+                       ROUND(CAST(100 + 20 * sin(EXTRACT(EPOCH FROM ts) / 86400) + random() * 5 AS numeric), 2)
+                FROM generate_series(
+                    date_trunc('day', LOCALTIMESTAMP) - make_interval(days => :days),
+                    LOCALTIMESTAMP,
+                    make_interval(secs => :tick_seconds)
+                ) AS ts
+                """
+            ),
+            {"stock_id": stock_id, "days": DAYS, "tick_seconds": tick_seconds},
+        )
+        connection.execute(sqlalchemy.text("ANALYZE price_history"))
+    return stock_id, created
+
+
+def drop_history(engine, stock_id: int, created: list[str]):
+    with engine.begin() as connection:
+        params = {"stock_id": stock_id}
+        connection.execute(
+            sqlalchemy.text("DELETE FROM price_candles WHERE stock_id = :stock_id"),
+            params,
+        )
+        connection.execute(
+            sqlalchemy.text("DELETE FROM price_history WHERE stock_id = :stock_id"),
+            params,
+        )
+        connection.execute(
+            sqlalchemy.text("DELETE FROM stocks WHERE stock_id = :stock_id"), params
+        )
+        for name in created:
+            connection.execute(sqlalchemy.text(f"DROP TABLE {name}"))
+
+
+def time_query(engine, statement, params: dict, repeat: int) -> tuple[list[float], int]:
+    samples = []
+    with engine.connect() as connection:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = connection.execute(statement, params).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+            connection.rollback()
+    return samples, len(rows)
+
+
+def main(args):
+    started = time.perf_counter()
+    stock_id, created = create_history(db.engine, args.tick_seconds)
+    print(f"a year of ticks written in {time.perf_counter() - started:.1f}s")
+    try:
+        print("rebuild:", candles.rebuild_all(stock_id))
+
+        now = datetime.now()
+        for resolution, days in (("1m", 1), ("1h", 30), ("1d", DAYS)):
+            params = {
+                "stock_id": stock_id,
+                "ticker_symbol": TICKER,
+                "resolution": resolution,
+                "unit": candles.RESOLUTIONS[resolution],
+                "start": now - timedelta(days=days),
+                "end": now,
+                "limit": 1_000_000,
+            }
+            print(f"{days} days of {resolution} candles")
+            for name, statement in (
+                ("raw ticks", RAW_CANDLES),
+                ("candles", candles.STOCK_CANDLES),
+            ):
+                samples, rows = time_query(db.engine, statement, params, args.repeat)
+                print(
+                    f"  {name:<10} {rows:6} rows  p50={percentile(samples, 50):9.2f} ms  p99={percentile(samples, 99):9.2f} ms"
+                )
+    finally:
+        drop_history(db.engine, stock_id, created)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--tick-seconds", type=int, default=60, help="seconds between ticks"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="runs of each query")
+    main(parser.parse_args())
@@ -0,0 +1,152 @@
+"""
+Compares TRADE_CONCURRENCY_MODE=pessimistic and optimistic under low, medium
+and high contention.
+
+Runs trade_engine.buy / trade_engine.sell directly against the database
+configured in POSTGRES_URI, from --clients concurrent connections. Each client
+randomly buys or sells 0.01 shares of --ticker. The contention level decides
+how many throwaway portfolios the clients share:
+
+    low     one portfolio per client
+    medium  --clients / 8 portfolios (at least 2)
+    high    every client on the same portfolio
+
+Conflicts (version conflicts, serialization failures, deadlocks) are retried
+with retry.backoff_seconds up to RETRY_MAX_ATTEMPTS, like the endpoints do.
+
+    python -m test.benchmarks.bench_concurrency_modes --clients 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import sqlalchemy
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src import database as db
+from src import statements
+from src.api import retry, sessions, trade_engine
+from test.benchmarks.bench_login_flood import percentile
+from test.benchmarks.bench_trade_contention import create_portfolio, drop_portfolio
+
+MODES = ("pessimistic", "optimistic")
+
+
+def portfolio_count(level: str, clients: int) -> int:
+    return {"low": clients, "medium": max(2, clients // 8), "high": 1}[level]
+
+
+async def client_loop(
+    engine, portfolio, ticker: str, stop_at: float, latencies: list, stats: dict
+):
+    async with engine.connect() as connection:
+        ctx = sessions.SessionContext(
+            token="bench",
+            user_id=portfolio.user_id,
+            portfolio_id=portfolio.port_id,
+            watchlist_id=None,
+            connection=connection,
+        )
+        while time.perf_counter() < stop_at:
+            trade = random.choice((trade_engine.buy, trade_engine.sell))
+            started = time.perf_counter()
+            for attempt in range(1, retry.settings.RETRY_MAX_ATTEMPTS + 1):
+                try:
+                    async with connection.begin():
+                        await trade(ctx, ticker, num_shares=0.01)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    break
+                except (retry.VersionConflict, DBAPIError) as e:
+                    if (
+                        isinstance(e, DBAPIError)
+                        and getattr(e.orig, "sqlstate", None)
+                        not in retry.RETRYABLE_SQLSTATES
+                    ):
+                        raise
+                    stats["conflicts"] += 1
+                    await asyncio.sleep(retry.backoff_seconds(attempt))
+            else:
+                stats["gave_up"] += 1
+
+
+async def run(
+    engine,
+    sync_engine,
+    mode: str,
+    level: str,
+    clients: int,
+    ticker: str,
+    duration: float,
+):
+    trade_engine.settings.TRADE_CONCURRENCY_MODE = mode
+    portfolios = [
+        create_portfolio(sync_engine, ticker)
+        for _ in range(portfolio_count(level, clients))
+    ]
+    try:
+        latencies: list[float] = []
+        stats = {"conflicts": 0, "gave_up": 0}
+        stop_at = time.perf_counter() + duration
+        await asyncio.gather(
+            *[
+                client_loop(
+                    engine,
+                    portfolios[i % len(portfolios)],
+                    ticker,
+                    stop_at,
+                    latencies,
+                    stats,
+                )
+                for i in range(clients)
+            ]
+        )
+    finally:
+        for portfolio in portfolios:
+            drop_portfolio(sync_engine, portfolio)
+
+    trades = len(latencies)
+    print(
+        f"{level:<8}{mode:<13}trades/s={trades / duration:8.1f}"
+        f"  p50={percentile(latencies, 50) if latencies else 0:8.2f} ms"
+        f"  p99={percentile(latencies, 99) if latencies else 0:8.2f} ms"
+        f"  conflicts/trade={stats['conflicts'] / max(trades, 1):6.3f}"
+        f"  gave_up={stats['gave_up']}"
+    )
+
+
+async def main(levels: list[str], clients: int, duration: float, ticker: str):
+    engine = create_async_engine(db.connection_url, pool_size=clients, max_overflow=0)
+    sqlalchemy.event.listen(engine.sync_engine, "do_execute", statements.do_execute)
+    sync_engine = sqlalchemy.create_engine(db.connection_url)
+
+    print(f"{clients} clients, {duration:g}s per run, trading {ticker}")
+    try:
+        for level in levels:
+            for mode in MODES:
+                await run(engine, sync_engine, mode, level, clients, ticker, duration)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--levels",
+        nargs="+",
+        choices=["low", "medium", "high"],
+        default=["low", "medium", "high"],
+    )
+    parser.add_argument(
+        "--clients", type=int, default=32, help="concurrent connections"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds per mode and level"
+    )
+    parser.add_argument("--ticker", default="RIOT", help="stock to trade")
+    args = parser.parse_args()
+    asyncio.run(main(args.levels, args.clients, args.duration, args.ticker))
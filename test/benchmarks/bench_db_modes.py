@@ -0,0 +1,112 @@
+"""
+Measures request throughput at increasing client concurrency.
+
+Run it once against a server started with DB_MODE=async and once with
+DB_MODE=sync to compare the async engine with the threadpool fallback:
+    DB_MODE=async uvicorn src.api.server:app
+    python -m test.benchmarks.bench_db_modes --clients 50 200 1000 --duration 15
+
+Each client loops over a mix of authenticated reads and small trades using
+one of --users shared sessions, and the script prints requests/s, p50/p99
+latency and the number of non-2xx responses for every concurrency level.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from test.benchmarks.bench_login_flood import (
+    BASE_URL,
+    HEADERS,
+    percentile,
+    setup_trader,
+)
+
+
+async def client_loop(
+    client: httpx.AsyncClient, token: str, stop_at: float, errors: dict
+) -> list[float]:
+    latencies = []
+    requests = [
+        ("/portfolio/find_current_portfolio", {"session_token": token}),
+        ("/portfolio/get_portfolio_holdings", {"session_token": token}),
+        (
+            "/transactions/buy_shares",
+            {"session_token": token, "stock_ticker": "RIOT", "num_shares": 0.01},
+        ),
+        ("/history/current_portfolio_transactions", {"session_token": token}),
+        (
+            "/transactions/sell_shares",
+            {"session_token": token, "stock_ticker": "RIOT", "num_shares": 0.01},
+        ),
+    ]
+    i = 0
+    while time.perf_counter() < stop_at:
+        path, body = requests[i % len(requests)]
+        started = time.perf_counter()
+        try:
+            res = await client.post(path, json=body)
+            if res.status_code >= 300:
+                errors[res.status_code] = errors.get(res.status_code, 0) + 1
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        latencies.append((time.perf_counter() - started) * 1000)
+        i += 1
+    return latencies
+
+
+async def main(base_url: str, clients: list[int], users: int, duration: float):
+    limits = httpx.Limits(max_connections=max(clients) + 10)
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=HEADERS, limits=limits, timeout=120
+    ) as client:
+        tokens = [await setup_trader(client) for _ in range(users)]
+
+        # Give every portfolio some shares so the sells have something to sell
+        for token in tokens:
+            await client.post(
+                "/transactions/buy_shares",
+                json={"session_token": token, "stock_ticker": "RIOT", "num_shares": 1},
+            )
+
+        for count in clients:
+            errors: dict = {}
+            stop_at = time.perf_counter() + duration
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    client_loop(client, tokens[i % users], stop_at, errors)
+                    for i in range(count)
+                )
+            )
+            elapsed = time.perf_counter() - started
+            latencies = [ms for r in results for ms in r]
+            print(
+                f"clients={count:<5} req/s={len(latencies) / elapsed:9.1f}"
+                f"  p50={percentile(latencies, 50):8.2f} ms  p99={percentile(latencies, 99):8.2f} ms"
+                f"  errors={errors}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[50, 200, 1000],
+        help="concurrency levels",
+    )
+    parser.add_argument(
+        "--users", type=int, default=20, help="sessions shared by the clients"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=15, help="seconds per concurrency level"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.clients, args.users, args.duration))
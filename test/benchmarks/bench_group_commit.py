@@ -0,0 +1,161 @@
+"""
+Trade throughput with 500+ concurrent traders, committing every trade on its
+own versus group commit at a few window sizes.
+
+Runs in-process against the database configured in POSTGRES_URI, through the
+same code the trade endpoints use (session resolution + trade_engine), minus
+HTTP. Each trader gets a throwaway user, portfolio and session and alternates
+buying and selling 0.01 shares for --duration seconds. Modes:
+
+    per_trade   one transaction (and one commit) per trade, like the endpoints
+                with TRADE_GROUP_COMMIT_WINDOW_MS=0
+    group_<ms>  group_commit.submit() with that window
+
+Both modes share the worker's connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW),
+so per_trade is bounded by it the same way the API is.
+
+    python -m test.benchmarks.bench_group_commit --traders 500 --windows 2 5
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import sqlalchemy
+
+from src import database as db
+from src.api import group_commit, sessions, trade_engine
+from test.benchmarks.bench_login_flood import percentile
+from test.benchmarks.bench_trade_contention import create_portfolio, drop_portfolio
+
+
+def create_traders(engine, count: int, ticker: str) -> list[tuple]:
+    traders = []
+    for _ in range(count):
+        portfolio = create_portfolio(engine, ticker)
+        token = str(uuid.uuid4())
+        with engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    "INSERT INTO user_current_portfolio (user_id, current_portfolio) VALUES (:user_id, :port_id)"
+                ),
+                {"user_id": portfolio.user_id, "port_id": portfolio.port_id},
+            )
+            connection.execute(
+                sqlalchemy.text(
+                    "INSERT INTO temp_user_tokens (token, user_id) VALUES (:token, :user_id)"
+                ),
+                {"token": token, "user_id": portfolio.user_id},
+            )
+        traders.append((portfolio, token))
+    return traders
+
+
+def drop_traders(engine, traders: list[tuple]):
+    with engine.begin() as connection:
+        for portfolio, token in traders:
+            connection.execute(
+                sqlalchemy.text("DELETE FROM temp_user_tokens WHERE token = :token"),
+                {"token": token},
+            )
+            connection.execute(
+                sqlalchemy.text(
+                    "DELETE FROM user_current_portfolio WHERE user_id = :user_id"
+                ),
+                {"user_id": portfolio.user_id},
+            )
+    for portfolio, _ in traders:
+        drop_portfolio(engine, portfolio)
+
+
+def trade(side: str, ticker: str):
+    execute = trade_engine.buy if side == "buy" else trade_engine.sell
+    return lambda ctx: execute(ctx, ticker, num_shares=0.01)
+
+
+async def per_trade(token: str, side: str, ticker: str):
+    async with db.begin() as connection:
+        ctx = await sessions.resolve_session(connection, token)
+        await trade(side, ticker)(ctx)
+
+
+async def grouped(token: str, side: str, ticker: str):
+    await group_commit.submit(token, trade(side, ticker))
+
+
+async def trader_loop(
+    execute, token: str, ticker: str, stop_at: float, latencies: list, errors: dict
+):
+    side = "buy"
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        try:
+            await execute(token, side, ticker)
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        side = "sell" if side == "buy" else "buy"
+
+
+async def run(name: str, execute, traders: list[tuple], ticker: str, duration: float):
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    batches_before, trades_before = (
+        group_commit.counters["batches"],
+        group_commit.counters["trades"],
+    )
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(
+        *(
+            trader_loop(execute, token, ticker, stop_at, latencies, errors)
+            for _, token in traders
+        )
+    )
+
+    batches = group_commit.counters["batches"] - batches_before
+    trades = group_commit.counters["trades"] - trades_before
+    print(
+        f"{name:>10}  {len(latencies) / duration:8.0f} trades/s"
+        f"  p50={percentile(latencies, 50):7.1f} ms  p99={percentile(latencies, 99):7.1f} ms"
+        f"  {f'{trades / batches:5.1f} trades/batch' if batches else ''}  errors={errors}"
+    )
+
+
+async def main(args):
+    traders = create_traders(db.engine, args.traders, args.ticker)
+    try:
+        await run("per_trade", per_trade, traders, args.ticker, args.duration)
+        for window in args.windows:
+            group_commit.settings.TRADE_GROUP_COMMIT_WINDOW_MS = window
+            group_commit.settings.TRADE_GROUP_COMMIT_MAX_BATCH = args.max_batch
+            await run(f"group_{window:g}", grouped, traders, args.ticker, args.duration)
+        print("batch sizes:", group_commit.batch_sizes.snapshot()["buckets"])
+    finally:
+        await db.dispose()
+        drop_traders(db.engine, traders)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--traders",
+        type=int,
+        default=500,
+        help="concurrent traders, one portfolio each",
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds per mode")
+    parser.add_argument(
+        "--windows",
+        type=float,
+        nargs="+",
+        default=[2, 5],
+        help="group commit windows to try, in ms",
+    )
+    parser.add_argument(
+        "--max-batch", type=int, default=100, help="TRADE_GROUP_COMMIT_MAX_BATCH"
+    )
+    parser.add_argument("--ticker", default="RIOT", help="stock to trade")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""
+Measures trade-endpoint latency while /users/login is flooded.
+
+Start the API first (python main.py or uvicorn src.api.server:app), then:
+    python -m test.benchmarks.bench_login_flood --logins 64 --duration 20
+
+Runs the trade loop twice, once alone and once next to the login flood, and
+prints p50/p99 for both so the effect of password hashing on trades is visible.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+HEADERS = {"access_token": "brat"}
+
+
+async def setup_trader(client: httpx.AsyncClient) -> str:
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+    await client.post(
+        "/users/create", json={"username": username, "password": "benchpass"}
+    )
+    login = await client.post(
+        "/users/login", json={"username": username, "password": "benchpass"}
+    )
+    token = login.json()["session_token"]
+    await client.post(
+        "/portfolio/create", json={"session_token": token, "portfolio_name": "bench"}
+    )
+    await client.post(
+        "/portfolio/switch", json={"session_token": token, "portfolio_name": "bench"}
+    )
+    return token
+
+
+async def trade_loop(
+    client: httpx.AsyncClient, token: str, stop_at: float
+) -> list[float]:
+    latencies = []
+    side = "buy_shares"
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        await client.post(
+            f"/transactions/{side}",
+            json={"session_token": token, "stock_ticker": "RIOT", "num_shares": 0.01},
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        side = "sell_shares" if side == "buy_shares" else "buy_shares"
+    return latencies
+
+
+async def login_loop(
+    client: httpx.AsyncClient, username: str, stop_at: float, statuses: dict
+):
+    while time.perf_counter() < stop_at:
+        res = await client.post(
+            "/users/login", json={"username": username, "password": "benchpass"}
+        )
+        statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+
+
+def percentile(values: list[float], pct: float) -> float:
+    return (
+        statistics.quantiles(values, n=100)[int(pct) - 1]
+        if len(values) > 1
+        else values[0]
+    )
+
+
+def report(label: str, latencies: list[float]):
+    print(
+        f"{label:<20} trades={len(latencies):>6}  p50={percentile(latencies, 50):8.2f} ms"
+        f"  p99={percentile(latencies, 99):8.2f} ms"
+    )
+
+
+async def main(base_url: str, logins: int, traders: int, duration: float):
+    limits = httpx.Limits(max_connections=logins + traders + 10)
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=HEADERS, limits=limits, timeout=60
+    ) as client:
+        tokens = [await setup_trader(client) for _ in range(traders)]
+        flood_user = f"flood_{uuid.uuid4().hex[:10]}"
+        await client.post(
+            "/users/create", json={"username": flood_user, "password": "benchpass"}
+        )
+
+        # Trades alone
+        stop_at = time.perf_counter() + duration
+        results = await asyncio.gather(
+            *(trade_loop(client, t, stop_at) for t in tokens)
+        )
+        report("trades alone", [ms for r in results for ms in r])
+
+        # Trades during a login flood
+        statuses: dict = {}
+        stop_at = time.perf_counter() + duration
+        results = await asyncio.gather(
+            *(trade_loop(client, t, stop_at) for t in tokens),
+            *(login_loop(client, flood_user, stop_at, statuses) for _ in range(logins)),
+        )
+        report("trades + logins", [ms for r in results[:traders] for ms in r])
+        print(f"login responses by status: {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument(
+        "--logins", type=int, default=64, help="concurrent login clients"
+    )
+    parser.add_argument(
+        "--traders", type=int, default=4, help="concurrent trading clients"
+    )
+    parser.add_argument("--duration", type=float, default=20, help="seconds per phase")
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.logins, args.traders, args.duration))
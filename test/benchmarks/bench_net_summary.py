@@ -0,0 +1,109 @@
+"""
+/transactions/net-transaction-summary: aggregating the whole ledger versus
+reading transaction_totals, for a user with a long trading history.
+
+Runs against the database configured in POSTGRES_URI. Creates a throwaway
+portfolio, writes --rows ledger rows for it spread over every stock, rebuilds
+that user's totals, then times each query --repeat times.
+
+    python -m test.benchmarks.bench_net_summary --rows 2500000
+"""
+
+import argparse
+import statistics
+import time
+
+import sqlalchemy
+
+from src import database as db
+from src.api import transaction_totals, transactions
+from test.benchmarks.bench_login_flood import percentile
+from test.benchmarks.bench_trade_contention import create_portfolio, drop_portfolio
+
+# The summary as it was computed before transaction_totals
+LEDGER_SUMMARY = sqlalchemy.text(
+    """
+    SELECT
+        t.stock_id,
+        s.ticker_symbol,
+        SUM(
+            CASE
+                WHEN t.transaction_type = 'buy' THEN t.change
+                WHEN t.transaction_type = 'sell' THEN -t.change
+                ELSE 0
+            END
+        ) AS net_amount
+    FROM transactions t
+    JOIN stocks s ON t.stock_id = s.stock_id
+    WHERE t.user_id = :user_id
+    GROUP BY t.stock_id, s.ticker_symbol
+    """
+)
+
+
+def seed_ledger(engine, portfolio, rows: int):
+    with engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text(
+                """
+                INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+                SELECT :port_id, :user_id, s.stock_id,
+                       CASE WHEN i % 2 = 0 THEN 'buy' ELSE 'sell' END,
+                       ROUND(CAST(random() * 100 AS numeric), 2)
+                FROM generate_series(1, :rows) AS i
+                JOIN (SELECT stock_id, row_number() OVER (ORDER BY stock_id) - 1 AS n FROM stocks) s
+                  ON s.n = i % (SELECT COUNT(*) FROM stocks)
+                """
+            ),
+            {"port_id": portfolio.port_id, "user_id": portfolio.user_id, "rows": rows},
+        )
+        transaction_totals.rebuild(connection, portfolio.user_id)
+        connection.execute(sqlalchemy.text("ANALYZE transactions"))
+        connection.execute(sqlalchemy.text("ANALYZE transaction_totals"))
+
+
+def time_query(engine, statement, user_id: int, repeat: int) -> list[float]:
+    samples = []
+    with engine.connect() as connection:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            connection.execute(statement, {"user_id": user_id}).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+            connection.rollback()
+    return samples
+
+
+def main(args):
+    portfolio = create_portfolio(db.engine, args.ticker)
+    try:
+        started = time.perf_counter()
+        seed_ledger(db.engine, portfolio, args.rows)
+        print(
+            f"{args.rows} ledger rows written and totals rebuilt in {time.perf_counter() - started:.1f}s"
+        )
+
+        for name, statement in (
+            ("ledger", LEDGER_SUMMARY),
+            ("totals", transactions.NET_TRANSACTION_SUMMARY),
+        ):
+            samples = time_query(db.engine, statement, portfolio.user_id, args.repeat)
+            print(
+                f"  {name}  p50={percentile(samples, 50):9.2f} ms  p99={percentile(samples, 99):9.2f} ms"
+                f"  mean={statistics.mean(samples):9.2f} ms"
+            )
+    finally:
+        drop_portfolio(db.engine, portfolio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--rows", type=int, default=2_500_000, help="ledger rows for the user"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="runs of each query")
+    parser.add_argument(
+        "--ticker", default="RIOT", help="stock the throwaway portfolio holds"
+    )
+    main(parser.parse_args())
@@ -0,0 +1,202 @@
+"""
+Matching cost with --orders resting limit orders (1M by default).
+
+In memory: fills an OrderBook with bids below and asks above a starting price
+of $100, then random-walks the price for --ticks ticks and times
+OrderBook.crossed() on each, against a linear scan over the same orders.
+
+With --db, also against the database configured in POSTGRES_URI: inserts the
+orders into limit_orders for a throwaway portfolio (without escrowing
+anything), times loading them into the books with matching.sync_books(), then
+times matching.match() for one price move that crosses --fill-percent of the
+bids. The match is rolled back and the portfolio dropped afterwards.
+
+    python -m test.benchmarks.bench_order_book --orders 1000000 --db
+"""
+
+import argparse
+import random
+import statistics
+import time
+from decimal import Decimal
+
+import sqlalchemy
+
+from src import database as db
+from src.api import matching
+from src.order_book import OrderBook
+from test.benchmarks.bench_trade_contention import create_portfolio, drop_portfolio
+
+START_CENTS = 10_000
+
+
+def resting_orders(count: int, spread_cents: int) -> list[tuple[int, str, int]]:
+    # Bids below the starting price and asks above it, so nothing crosses yet
+    orders = []
+    for order_id in range(1, count + 1):
+        offset = random.randint(1, spread_cents)
+        if order_id % 2:
+            orders.append((order_id, "buy", START_CENTS - offset))
+        else:
+            orders.append((order_id, "sell", START_CENTS + offset))
+    return orders
+
+
+def bench_memory(count: int, ticks: int, step_cents: int, spread_cents: int):
+    orders = resting_orders(count, spread_cents)
+
+    book = OrderBook()
+    started = time.perf_counter()
+    for order_id, side, limit_cents in orders:
+        book.add(order_id, side, limit_cents)
+    load_s = time.perf_counter() - started
+    print(
+        f"loaded {count} orders in {load_s:.2f}s ({load_s / count * 1e6:.2f} us/order)"
+    )
+
+    # The same walk for both, so both fill the same orders
+    walk = [START_CENTS]
+    for _ in range(ticks):
+        walk.append(walk[-1] + random.randint(-step_cents, step_cents))
+
+    heap_ms, filled = [], 0
+    for price in walk[1:]:
+        started = time.perf_counter()
+        filled += len(book.crossed(price))
+        heap_ms.append((time.perf_counter() - started) * 1000)
+
+    # Linear scan: every tick looks at every resting order
+    resting = {order_id: (side, limit_cents) for order_id, side, limit_cents in orders}
+    scan_ms = []
+    for price in walk[1:]:
+        started = time.perf_counter()
+        crossed = [
+            order_id
+            for order_id, (side, limit_cents) in resting.items()
+            if (limit_cents >= price if side == "buy" else limit_cents <= price)
+        ]
+        for order_id in crossed:
+            del resting[order_id]
+        scan_ms.append((time.perf_counter() - started) * 1000)
+
+    print(f"{ticks} ticks, {filled} orders filled, {len(book)} still resting")
+    print(
+        f"  heap  median {statistics.median(heap_ms):8.3f} ms/tick  total {sum(heap_ms):9.1f} ms"
+        f"  {sum(heap_ms) * 1000 / max(filled, 1):.2f} us/filled order"
+    )
+    print(
+        f"  scan  median {statistics.median(scan_ms):8.3f} ms/tick  total {sum(scan_ms):9.1f} ms"
+    )
+
+
+def bench_database(count: int, ticker: str, fill_percent: float, spread_cents: int):
+    engine = db.engine
+    portfolio = create_portfolio(engine, ticker)
+    try:
+        with engine.begin() as connection:
+            stock_id, price = connection.execute(
+                sqlalchemy.text(
+                    """
+                    SELECT s.stock_id, ss.price_per_share
+                    FROM stocks s JOIN stock_state ss ON ss.stock_id = s.stock_id
+                    WHERE s.ticker_symbol = :ticker
+                    """
+                ),
+                {"ticker": ticker},
+            ).one()
+
+            started = time.perf_counter()
+            # Odd rows are bids up to spread below the price, even rows asks above it
+            connection.execute(
+                sqlalchemy.text(
+                    """
+                    INSERT INTO limit_orders (user_id, port_id, stock_id, side, limit_price, num_shares, reserved)
+                    SELECT
+                        :user_id, :port_id, :stock_id,
+                        CASE WHEN i % 2 = 1 THEN 'buy' ELSE 'sell' END,
+                        GREATEST(
+                            :price + CASE WHEN i % 2 = 1 THEN -1 ELSE 1 END * (1 + floor(random() * :spread)) / 100,
+                            0.01
+                        ),
+                        0.01,
+                        ROUND(0.01 * :price, 2)
+                    FROM generate_series(1, :count) AS i
+                    """
+                ),
+                {
+                    "user_id": portfolio.user_id,
+                    "port_id": portfolio.port_id,
+                    "stock_id": stock_id,
+                    "price": price,
+                    "spread": spread_cents,
+                    "count": count,
+                },
+            )
+        print(f"inserted {count} orders in {time.perf_counter() - started:.2f}s")
+
+        matching.reset()
+        with engine.connect() as connection:
+            started = time.perf_counter()
+            loaded = matching.sync_books(connection)
+            connection.rollback()
+        print(
+            f"sync_books loaded {loaded} open orders in {time.perf_counter() - started:.2f}s"
+            f" ({len(matching.books[stock_id])} in the {ticker} book)"
+        )
+
+        # Deep enough that about fill_percent of the bids cross
+        new_price = price - Decimal(spread_cents * fill_percent / 100 / 100).quantize(
+            Decimal("0.01")
+        )
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            started = time.perf_counter()
+            filled = matching.match(connection, {stock_id: new_price})
+            elapsed = time.perf_counter() - started
+            transaction.rollback()
+        matching.reset()
+        print(
+            f"price {price} -> {new_price}: matched and wrote {filled} fills in {elapsed * 1000:.1f} ms"
+            f" ({elapsed * 1e6 / max(filled, 1):.2f} us/fill)"
+        )
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.text("DELETE FROM limit_orders WHERE port_id = :port_id"),
+                {"port_id": portfolio.port_id},
+            )
+        drop_portfolio(engine, portfolio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--orders", type=int, default=1_000_000, help="resting orders")
+    parser.add_argument(
+        "--ticks", type=int, default=200, help="price moves in the in-memory run"
+    )
+    parser.add_argument(
+        "--step", type=int, default=50, help="largest price move per tick, in cents"
+    )
+    parser.add_argument(
+        "--spread",
+        type=int,
+        default=2_000,
+        help="limits are up to this many cents from the price",
+    )
+    parser.add_argument(
+        "--db", action="store_true", help="also run against the database"
+    )
+    parser.add_argument("--ticker", default="RIOT", help="stock for the database run")
+    parser.add_argument(
+        "--fill-percent",
+        type=float,
+        default=1,
+        help="share of bids the database price move crosses",
+    )
+    args = parser.parse_args()
+
+    bench_memory(args.orders, args.ticks, args.step, args.spread)
+    if args.db:
+        bench_database(args.orders, args.ticker, args.fill_percent, args.spread)
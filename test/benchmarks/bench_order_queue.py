@@ -0,0 +1,107 @@
+"""
+How fast the order queue absorbs and drains a burst of submitted orders.
+
+Runs in-process against the database configured in POSTGRES_URI. Creates
+--portfolios throwaway portfolios, enqueues --orders alternating 0.01 share
+buys and sells spread over them (timing the submits, which is all a client of
+/orders/submit waits for), then times --workers drain tasks emptying the
+queue, each taking one portfolio's batch at a time like the API's workers.
+
+    python -m test.benchmarks.bench_order_queue --orders 20000 --portfolios 50 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+import sqlalchemy
+
+from src import database as db
+from src.api import order_queue
+from test.benchmarks.bench_group_commit import create_traders, drop_traders
+
+
+async def submit_burst(
+    portfolios: list, ticker: str, count: int, concurrency: int
+) -> float:
+    async def submitter(offset: int):
+        for i in range(offset, count, concurrency):
+            portfolio = portfolios[i % len(portfolios)]
+            async with db.begin() as connection:
+                await connection.execute(
+                    order_queue.ENQUEUE_ORDER,
+                    {
+                        "user_id": portfolio.user_id,
+                        "port_id": portfolio.port_id,
+                        "side": "buy" if i // len(portfolios) % 2 == 0 else "sell",
+                        "stock_ticker": ticker,
+                        "num_shares": Decimal("0.01"),
+                        "dollars": None,
+                    },
+                )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(submitter(offset) for offset in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def drain(workers: int) -> tuple[float, int]:
+    batches_before = order_queue.counters["batches"]
+
+    async def worker():
+        while await order_queue.drain_batch():
+            pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return time.perf_counter() - started, order_queue.counters[
+        "batches"
+    ] - batches_before
+
+
+async def main(args):
+    traders = create_traders(db.engine, args.portfolios, args.ticker)
+    portfolios = [portfolio for portfolio, _ in traders]
+    try:
+        for workers in args.workers:
+            submit_seconds = await submit_burst(
+                portfolios, args.ticker, args.orders, args.concurrency
+            )
+            drain_seconds, batches = await drain(workers)
+            print(
+                f"workers={workers}  submit {args.orders / submit_seconds:7.0f} orders/s"
+                f"  drain {args.orders / drain_seconds:7.0f} orders/s ({drain_seconds:.1f}s,"
+                f" {args.orders / max(batches, 1):.1f} orders/batch)"
+            )
+    finally:
+        await db.dispose()
+        with db.engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.text(
+                    "DELETE FROM queued_orders WHERE port_id = ANY(:port_ids)"
+                ),
+                {"port_ids": [portfolio.port_id for portfolio in portfolios]},
+            )
+        drop_traders(db.engine, traders)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--orders", type=int, default=20_000, help="orders per burst")
+    parser.add_argument(
+        "--portfolios",
+        type=int,
+        default=50,
+        help="portfolios the orders are spread over",
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4], help="drain tasks to try"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="concurrent submitters"
+    )
+    parser.add_argument("--ticker", default="RIOT", help="stock to trade")
+    asyncio.run(main(parser.parse_args()))
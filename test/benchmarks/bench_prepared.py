@@ -0,0 +1,133 @@
+"""
+Microbenchmark for the statement registry and server-side prepared statements.
+
+Runs the hot statements (session lookup, price lookup, buy and sell) directly against the database configured in POSTGRES_URI,
+in three ways, and prints the mean time per execution:
+
+    adhoc     a fresh sqlalchemy.text() per call, never prepared
+    registry  the registered statement, never prepared
+    prepared  the registered statement, prepared server-side on first use
+
+The difference between "registry" and "prepared" is the parse/plan work
+Postgres skips per execution. Writes run in a transaction that is rolled back.
+
+    python -m test.benchmarks.bench_prepared --iterations 5000
+"""
+
+import argparse
+import time
+
+import sqlalchemy
+
+from src import database as db
+from src import statements
+from src.api import sessions, stocks, trade_engine
+
+
+def make_engine():
+    # prepare_threshold=None turns off psycopg's automatic preparing, so only
+    # statements registered with prepare=True are prepared
+    engine = sqlalchemy.create_engine(
+        db.connection_url, connect_args={"prepare_threshold": None}
+    )
+    sqlalchemy.event.listen(engine, "do_execute", statements.do_execute)
+    return engine
+
+
+def time_calls(connection, make_statement, params: dict, iterations: int) -> float:
+    # Warm up so the prepared variant pays its PREPARE outside the timed loop
+    connection.execute(make_statement(), params)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        connection.execute(make_statement(), params)
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def main(iterations: int):
+    engine = make_engine()
+
+    with engine.connect() as connection:
+        fixture = connection.execute(
+            sqlalchemy.text(
+                """
+                SELECT p.port_id, p.user_id, s.ticker_symbol, t.token
+                FROM portfolios p
+                CROSS JOIN LATERAL (
+                    SELECT ticker_symbol FROM stocks JOIN stock_state USING (stock_id) LIMIT 1
+                ) s
+                LEFT JOIN temp_user_tokens t ON t.user_id = p.user_id
+                LIMIT 1
+                """
+            )
+        ).first()
+    if fixture is None:
+        raise SystemExit("Needs at least one portfolio and one stock in the database")
+
+    cases: list[tuple[str, sqlalchemy.TextClause, dict]] = [
+        (
+            "session lookup",
+            sessions.RESOLVE_SESSION_BY_TOKEN,
+            {"token": fixture.token or "missing", "ttl": 86400},
+        ),
+        (
+            "price lookup",
+            stocks.GET_PRICE,
+            {"ticker_symbol": "AAPL"},
+        ),
+        (
+            "buy",
+            trade_engine.BUY,
+            {
+                "port_id": fixture.port_id,
+                "user_id": fixture.user_id,
+                "ticker": fixture.ticker_symbol,
+                "num_shares": 0.01,
+                "dollars": None,
+            },
+        ),
+        (
+            "sell",
+            trade_engine.SELL,
+            {
+                "port_id": fixture.port_id,
+                "user_id": fixture.user_id,
+                "ticker": fixture.ticker_symbol,
+                "num_shares": 0.01,
+                "dollars": None,
+            },
+        ),
+    ]
+
+    print(
+        f"{'statement':<22}{'adhoc':>12}{'registry':>12}{'prepared':>12}   (us per execution)"
+    )
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            for label, statement, params in cases:
+                unprepared = statement.execution_options(prepare=False)
+                adhoc = time_calls(
+                    connection,
+                    lambda: sqlalchemy.text(statement.text),
+                    params,
+                    iterations,
+                )
+                registry = time_calls(
+                    connection, lambda: unprepared, params, iterations
+                )
+                prepared = time_calls(connection, lambda: statement, params, iterations)
+                print(f"{label:<22}{adhoc:>12.1f}{registry:>12.1f}{prepared:>12.1f}")
+        finally:
+            transaction.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=5000, help="executions per statement and mode"
+    )
+    args = parser.parse_args()
+    main(args.iterations)
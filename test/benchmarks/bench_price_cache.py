@@ -0,0 +1,86 @@
+"""
+Requests per second on /stocks/price and /stocks/prices with and without the
+in-process price cache.
+
+Drives the app in-process (httpx's ASGI transport, no network) with
+--clients concurrent clients for --duration seconds per run, against the
+database configured in POSTGRES_URI. The cached runs start the tick listener
+like the server does.
+
+    python -m test.benchmarks.bench_price_cache --clients 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from src import database as db
+from src.api import price_cache
+from src.api.server import app
+from test.benchmarks.bench_login_flood import HEADERS, percentile
+
+TICKERS = ["AAPL", "MSFT", "NVDA", "TSLA", "RIOT"]
+
+
+async def client_loop(
+    client: httpx.AsyncClient,
+    path: str,
+    stop_at: float,
+    latencies: list,
+    statuses: dict,
+):
+    while time.perf_counter() < stop_at:
+        params = (
+            {"stock_ticker": random.choice(TICKERS)}
+            if path == "/stocks/price"
+            else None
+        )
+        started = time.perf_counter()
+        res = await client.get(path, params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+
+
+async def run(path: str, cached: bool, clients: int, duration: float):
+    price_cache.settings.PRICE_CACHE_ENABLED = cached
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=HEADERS
+    ) as client:
+        stop_at = time.perf_counter() + duration
+        await asyncio.gather(
+            *(
+                client_loop(client, path, stop_at, latencies, statuses)
+                for _ in range(clients)
+            )
+        )
+
+    print(
+        f"{path:<14} {'cache' if cached else 'database':<8}  {len(latencies) / duration:8.0f} req/s"
+        f"  p50={percentile(latencies, 50):7.2f} ms  p99={percentile(latencies, 99):7.2f} ms  statuses={statuses}"
+    )
+
+
+async def main(args):
+    price_cache.start_listener()
+    try:
+        for path in ("/stocks/price", "/stocks/prices"):
+            for cached in (False, True):
+                await run(path, cached, args.clients, args.duration)
+        print("cache:", price_cache.stats())
+    finally:
+        await db.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,154 @@
+"""
+Time per price tick for large stock universes: reading the due prices,
+stepping the price model, and writing the tick back in one statement.
+
+Runs against the database configured in POSTGRES_URI. For each --stocks
+size, inserts that many throwaway stocks (tickers BENCH...), runs --ticks
+ticks of state.update_prices with every price due, and times each stage on a
+separate run. The previous uniform +-5 walk (one UPDATE, no model) is timed
+as a baseline for the write. Throwaway stocks are deleted afterwards, which
+takes a few minutes at 100k (every delete checks the tables referencing
+stocks).
+
+    python -m test.benchmarks.bench_price_ticks --stocks 10000 100000 --ticks 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+import sqlalchemy
+
+from src import database as db
+from src.api import state
+from test.benchmarks.bench_login_flood import percentile
+
+PREFIX = "BENCH"
+
+# The walk the price model replaced
+RANDOM_WALK = sqlalchemy.text(
+    """
+    UPDATE stock_state
+    SET price_per_share = GREATEST(price_per_share + ROUND(CAST(random() * 10 - 5 AS numeric), 2), 1.00),
+        updated_at = now()
+    RETURNING stock_id, price_per_share
+    """
+)
+
+
+def create_stocks(engine, count: int):
+    with engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text(
+                """
+                WITH created AS (
+                    INSERT INTO stocks (ticker_symbol, stock_name)
+                    SELECT :prefix || i, 'Benchmark stock ' || i
+                    FROM generate_series(1, :count) AS i
+                    RETURNING stock_id
+                )
+                INSERT INTO stock_state (stock_id, price_per_share, volatility)
+                SELECT stock_id, ROUND(CAST(10 + random() * 490 AS numeric), 2), 0.01 + random() * 0.03
+                FROM created
+                """
+            ),
+            {"prefix": PREFIX, "count": count},
+        )
+        connection.execute(sqlalchemy.text("ANALYZE stock_state"))
+
+
+def drop_stocks(engine):
+    with engine.begin() as connection:
+        for table in ("price_candles", "price_history", "stock_state"):
+            connection.execute(
+                sqlalchemy.text(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE stock_id IN (SELECT stock_id FROM stocks WHERE ticker_symbol LIKE :prefix || '%')
+                    """
+                ),
+                {"prefix": PREFIX},
+            )
+        connection.execute(
+            sqlalchemy.text(
+                "DELETE FROM stocks WHERE ticker_symbol LIKE :prefix || '%'"
+            ),
+            {"prefix": PREFIX},
+        )
+
+
+def time_stages(engine, ticks: int) -> dict[str, list[float]]:
+    samples: dict[str, list[float]] = {
+        "read": [],
+        "model": [],
+        "write": [],
+        "orders + triggers": [],
+        "baseline write": [],
+    }
+    model = state.build_model()
+    params = {"interval": 0}
+    for _ in range(ticks):
+        with engine.begin() as connection:
+            started = time.perf_counter()
+            due = connection.execute(state.DUE_PRICES, params).one()
+            samples["read"].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            prices = model.step(
+                due.tickers,
+                np.array(due.prices, dtype=np.float64),
+                np.array(due.drift, dtype=np.float64),
+                np.array(due.volatility, dtype=np.float64),
+            )
+            samples["model"].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            moved = connection.execute(
+                state.MOVE_PRICES,
+                {"stock_ids": due.stock_ids, "prices": prices.tolist(), "interval": 0},
+            ).one()
+            samples["write"].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            new_prices = dict(zip(moved.stock_ids, moved.prices))
+            state.fill_and_fire(connection, new_prices)
+            samples["orders + triggers"].append((time.perf_counter() - started) * 1000)
+
+        with engine.begin() as connection:
+            started = time.perf_counter()
+            connection.execute(RANDOM_WALK).fetchall()
+            samples["baseline write"].append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main(args):
+    state.settings.PRICE_UPDATE_INTERVAL_SECONDS = 0
+    drop_stocks(db.engine)
+    for count in args.stocks:
+        create_stocks(db.engine, count)
+        try:
+            ticks = []
+            for _ in range(args.ticks):
+                ticks.append(state.update_prices()["duration_ms"])
+            print(
+                f"{count} stocks  tick p50={percentile(ticks, 50):8.1f} ms  p99={percentile(ticks, 99):8.1f} ms"
+            )
+            for stage, samples in time_stages(db.engine, args.ticks).items():
+                print(f"  {stage:<17} p50={percentile(samples, 50):8.1f} ms")
+        finally:
+            drop_stocks(db.engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--stocks",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000],
+        help="stock universe sizes",
+    )
+    parser.add_argument("--ticks", type=int, default=10, help="ticks per size")
+    main(parser.parse_args())
@@ -0,0 +1,167 @@
+"""
+Per-tick cost of evaluating and firing stop-loss / take-profit triggers with
+100k and 1M active triggers on one stock.
+
+Runs against the database configured in POSTGRES_URI. For each --triggers
+count, creates a throwaway portfolio holding --ticker, adds that many 0.01
+share triggers (stop-losses below and take-profits above the current price,
+up to --spread cents away), then random-walks the price for --ticks ticks. Each
+tick times:
+
+    eval   the crossed-range lookup on the trigger indexes (locking the
+           portfolios, like the price updater does)
+    fire   the whole triggers.fire() batch, committed, so fired triggers
+           leave the active set as they would for real
+    scan   the same lookup with index scans disabled, i.e. looking at every
+           active trigger of the stock
+
+    python -m test.benchmarks.bench_sell_triggers --triggers 100000 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+from decimal import Decimal
+
+import sqlalchemy
+
+from src import database as db
+from src.api import triggers
+from test.benchmarks.bench_login_flood import percentile
+from test.benchmarks.bench_trade_contention import create_portfolio, drop_portfolio
+
+
+def add_triggers(
+    engine, portfolio, stock_id: int, price: Decimal, count: int, spread_cents: int
+):
+    with engine.begin() as connection:
+        # Odd rows are stop-losses below the price, even rows take-profits above it
+        connection.execute(
+            sqlalchemy.text(
+                """
+                INSERT INTO sell_triggers (user_id, port_id, stock_id, kind, trigger_price, num_shares)
+                SELECT
+                    :user_id, :port_id, :stock_id,
+                    CASE WHEN i % 2 = 1 THEN 'stop_loss' ELSE 'take_profit' END,
+                    GREATEST(
+                        :price + CASE WHEN i % 2 = 1 THEN -1 ELSE 1 END * (1 + floor(random() * :spread)) / 100,
+                        0.01
+                    ),
+                    0.01
+                FROM generate_series(1, :count) AS i
+                """
+            ),
+            {
+                "user_id": portfolio.user_id,
+                "port_id": portfolio.port_id,
+                "stock_id": stock_id,
+                "price": price,
+                "spread": spread_cents,
+                "count": count,
+            },
+        )
+        connection.execute(sqlalchemy.text("ANALYZE sell_triggers"))
+
+
+def timed(connection, statement, params) -> tuple[float, int]:
+    started = time.perf_counter()
+    rows = connection.execute(statement, params).fetchall()
+    return (time.perf_counter() - started) * 1000, len(rows)
+
+
+def run(
+    engine, ticker: str, count: int, ticks: int, step_cents: int, spread_cents: int
+):
+    portfolio = create_portfolio(engine, ticker)
+    try:
+        with engine.connect() as connection:
+            stock_id, price = connection.execute(
+                sqlalchemy.text(
+                    """
+                    SELECT s.stock_id, ss.price_per_share
+                    FROM stocks s JOIN stock_state ss ON ss.stock_id = s.stock_id
+                    WHERE s.ticker_symbol = :ticker
+                    """
+                ),
+                {"ticker": ticker},
+            ).one()
+
+        started = time.perf_counter()
+        add_triggers(engine, portfolio, stock_id, price, count, spread_cents)
+        print(f"{count} triggers added in {time.perf_counter() - started:.1f}s")
+
+        crossed_query = sqlalchemy.text(
+            f"SELECT trigger_id FROM ({triggers.CROSSED}) crossed"
+        )
+        eval_ms, fire_ms, scan_ms, fired = [], [], [], 0
+        tick_price = price
+        for _ in range(ticks):
+            tick_price = max(
+                Decimal("0.01"),
+                tick_price + Decimal(random.randint(-step_cents, step_cents)) / 100,
+            )
+            params = {"stock_ids": [stock_id], "prices": [tick_price]}
+
+            with engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(
+                        sqlalchemy.text("SET LOCAL enable_indexscan = off")
+                    )
+                    connection.execute(
+                        sqlalchemy.text("SET LOCAL enable_bitmapscan = off")
+                    )
+                    scan_ms.append(timed(connection, crossed_query, params)[0])
+
+                with connection.begin():
+                    elapsed, _ = timed(
+                        connection, triggers.LOCK_TRIGGER_PORTFOLIOS, params
+                    )
+                    eval_ms.append(elapsed)
+                    started = time.perf_counter()
+                    fired += triggers.fire(connection, {stock_id: tick_price})
+                    fire_ms.append((time.perf_counter() - started) * 1000)
+
+        print(
+            f"  {ticks} ticks, {fired} triggers fired ({fired / ticks:.1f} per tick), {ticker} {price} -> {tick_price}"
+        )
+        for name, samples in (("eval", eval_ms), ("fire", fire_ms), ("scan", scan_ms)):
+            print(
+                f"  {name}  p50={percentile(samples, 50):9.2f} ms  p99={percentile(samples, 99):9.2f} ms"
+                f"  mean={statistics.mean(samples):9.2f} ms"
+            )
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                sqlalchemy.text("DELETE FROM sell_triggers WHERE port_id = :port_id"),
+                {"port_id": portfolio.port_id},
+            )
+        drop_portfolio(engine, portfolio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--triggers",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000],
+        help="active triggers",
+    )
+    parser.add_argument("--ticks", type=int, default=50, help="price moves per run")
+    parser.add_argument(
+        "--step", type=int, default=20, help="largest price move per tick, in cents"
+    )
+    parser.add_argument(
+        "--spread",
+        type=int,
+        default=2_000,
+        help="triggers are up to this many cents from the price",
+    )
+    parser.add_argument("--ticker", default="RIOT", help="stock to put the triggers on")
+    args = parser.parse_args()
+
+    for count in args.triggers:
+        run(db.engine, args.ticker, count, args.ticks, args.step, args.spread)
@@ -0,0 +1,221 @@
+"""
+Fires concurrent, mixed buys and sells at a single portfolio and reports
+deadlocks, lock waits and throughput for each way of executing a trade.
+
+Runs directly against the database configured in POSTGRES_URI:
+    python -m test.benchmarks.bench_trade_contention --clients 16 --duration 10
+
+Modes:
+    legacy     the old per-endpoint statement sequence (REPEATABLE READ);
+               buys lock portfolios -> holdings, sells holdings -> portfolios
+    legacy_rc  the same sequence under READ COMMITTED, which isolates the
+               deadlocks from REPEATABLE READ's serialization failures
+    engine     trade_engine.BUY / trade_engine.SELL (READ COMMITTED),
+               always portfolios -> holdings
+
+A throwaway user and portfolio are created for the run and deleted afterwards.
+Lock waits are sampled from pg_stat_activity every few milliseconds.
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+
+import sqlalchemy
+
+from src import database as db
+from src import statements
+from src.api import trade_engine
+from test.benchmarks.bench_login_flood import percentile
+from test.benchmarks.bench_trade_statements import legacy_buy, legacy_sell, single_trade
+
+MODES = {
+    "legacy": ("REPEATABLE READ", legacy_buy, legacy_sell),
+    "legacy_rc": ("READ COMMITTED", legacy_buy, legacy_sell),
+    "engine": (
+        "READ COMMITTED",
+        single_trade(trade_engine.BUY),
+        single_trade(trade_engine.SELL),
+    ),
+}
+
+SQLSTATE_NAMES = {"40P01": "deadlock", "40001": "serialization_failure"}
+
+
+def create_portfolio(engine, ticker: str):
+    with engine.begin() as connection:
+        user_id = connection.execute(
+            sqlalchemy.text(
+                "INSERT INTO users (username, password_hash) VALUES (:username, '!') RETURNING id"
+            ),
+            {"username": f"bench_{uuid.uuid4().hex[:10]}"},
+        ).scalar_one()
+        port_id = connection.execute(
+            sqlalchemy.text(
+                """
+                INSERT INTO portfolios (user_id, buying_power, port_name)
+                VALUES (:user_id, 1000000, 'contention')
+                RETURNING port_id
+                """
+            ),
+            {"user_id": user_id},
+        ).scalar_one()
+        # Enough shares that sells never run the holding down to zero
+        connection.execute(
+            sqlalchemy.text(
+                """
+                INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+                SELECT :port_id, s.stock_id, 10000, 10000 * ss.price_per_share
+                FROM stocks s JOIN stock_state ss ON ss.stock_id = s.stock_id
+                WHERE s.ticker_symbol = :ticker
+                """
+            ),
+            {"port_id": port_id, "ticker": ticker},
+        )
+        return connection.execute(
+            sqlalchemy.text(
+                "SELECT port_id, user_id FROM portfolios WHERE port_id = :port_id"
+            ),
+            {"port_id": port_id},
+        ).one()
+
+
+def drop_portfolio(engine, portfolio):
+    with engine.begin() as connection:
+        for table, column in (
+            ("transactions", "port_id"),
+            ("transaction_totals", "port_id"),
+            ("portfolio_holdings", "port_id"),
+            ("portfolios", "port_id"),
+        ):
+            connection.execute(
+                sqlalchemy.text(f"DELETE FROM {table} WHERE {column} = :port_id"),
+                {"port_id": portfolio.port_id},
+            )
+        connection.execute(
+            sqlalchemy.text("DELETE FROM users WHERE id = :user_id"),
+            {"user_id": portfolio.user_id},
+        )
+
+
+def deadlock_count(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text(
+                "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+            )
+        ).scalar_one()
+
+
+def sample_lock_waits(engine, stop: threading.Event, samples: list):
+    with engine.connect() as connection:
+        while not stop.is_set():
+            samples.append(
+                connection.execute(
+                    sqlalchemy.text(
+                        """
+                        SELECT COUNT(*) FROM pg_stat_activity
+                        WHERE datname = current_database() AND wait_event_type = 'Lock'
+                        """
+                    )
+                ).scalar_one()
+            )
+            connection.rollback()
+            time.sleep(0.005)
+
+
+def client_loop(
+    engine,
+    mode: str,
+    portfolio,
+    ticker: str,
+    stop_at: float,
+    latencies: list,
+    errors: dict,
+):
+    isolation_level, buy, sell = MODES[mode]
+    with engine.connect().execution_options(
+        isolation_level=isolation_level
+    ) as connection:
+        while time.perf_counter() < stop_at:
+            trade = random.choice((buy, sell))
+            started = time.perf_counter()
+            try:
+                with connection.begin():
+                    trade(connection, portfolio, ticker)
+                latencies.append((time.perf_counter() - started) * 1000)
+            except sqlalchemy.exc.DBAPIError as e:
+                sqlstate = getattr(e.orig, "sqlstate", "")
+                name = SQLSTATE_NAMES.get(sqlstate, sqlstate or type(e).__name__)
+                errors[name] = errors.get(name, 0) + 1
+
+
+def run(engine, mode: str, clients: int, ticker: str, duration: float):
+    portfolio = create_portfolio(engine, ticker)
+    try:
+        latencies: list[float] = []
+        errors: dict = {}
+        waits: list[int] = []
+        deadlocks_before = deadlock_count(engine)
+
+        stop_sampling = threading.Event()
+        sampler = threading.Thread(
+            target=sample_lock_waits, args=(engine, stop_sampling, waits)
+        )
+        sampler.start()
+
+        stop_at = time.perf_counter() + duration
+        threads = [
+            threading.Thread(
+                target=client_loop,
+                args=(engine, mode, portfolio, ticker, stop_at, latencies, errors),
+            )
+            for _ in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stop_sampling.set()
+        sampler.join()
+        deadlocks = deadlock_count(engine) - deadlocks_before
+    finally:
+        drop_portfolio(engine, portfolio)
+
+    print(
+        f"{mode:<10} trades/s={len(latencies) / duration:8.1f}"
+        f"  p50={percentile(latencies, 50) if latencies else 0:8.2f} ms"
+        f"  p99={percentile(latencies, 99) if latencies else 0:8.2f} ms"
+        f"  deadlocks={deadlocks:>4}"
+        f"  lock_waiters(mean/max)={sum(waits) / max(len(waits), 1):5.2f}/{max(waits, default=0):>3}"
+        f"  errors={errors}"
+    )
+
+
+def main(modes: list[str], clients: int, duration: float, ticker: str):
+    # One connection per client plus the lock-wait sampler and setup/teardown
+    engine = sqlalchemy.create_engine(
+        db.connection_url, pool_size=clients + 2, max_overflow=0
+    )
+    sqlalchemy.event.listen(engine, "do_execute", statements.do_execute)
+
+    print(f"{clients} clients, {duration:g}s per mode, trading {ticker}")
+    for mode in modes:
+        run(engine, mode, clients, ticker, duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument(
+        "--clients", type=int, default=16, help="concurrent connections"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds per mode")
+    parser.add_argument("--ticker", default="RIOT", help="stock to trade")
+    args = parser.parse_args()
+    main(args.modes, args.clients, args.duration, args.ticker)
@@ -0,0 +1,278 @@
+"""
+Compares the old multi-statement trade path with the single-statement one.
+
+Runs directly against the database configured in POSTGRES_URI. Every client
+thread owns one existing portfolio (buying power >= 10) and repeatedly buys
+and then sells 0.01 shares of --ticker inside one transaction, which is rolled
+back so the database is left as it was. Reported per buy+sell pair:
+
+    legacy  the statement sequence the endpoints used to run (copied below),
+            under REPEATABLE READ: 6 round trips per buy, 7 per sell
+    single  trade_engine.BUY / trade_engine.SELL under READ COMMITTED:
+            1 round trip each
+
+    python -m test.benchmarks.bench_trade_statements --clients 1 8 32 --duration 10
+"""
+
+import argparse
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Sequence
+
+import sqlalchemy
+
+from src import database as db
+from src import statements
+from src.api import trade_engine
+from test.benchmarks.bench_login_flood import percentile
+
+LEGACY_FIND_STOCK = sqlalchemy.text(
+    "SELECT stock_id, ticker_symbol FROM stocks WHERE ticker_symbol = :ticker"
+)
+LEGACY_GET_PRICE = sqlalchemy.text(
+    "SELECT price_per_share FROM stock_state WHERE stock_id = :stock_id"
+)
+LEGACY_FIND_STOCK_PRICE = sqlalchemy.text(
+    """
+    SELECT ss.stock_id, ss.price_per_share, s.ticker_symbol
+    FROM stock_state ss
+    JOIN stocks s ON ss.stock_id = s.stock_id
+    WHERE s.ticker_symbol = :ticker
+    """
+)
+LEGACY_LOCK_BUYING_POWER = sqlalchemy.text(
+    "SELECT buying_power FROM portfolios WHERE port_id = :port_id FOR UPDATE"
+)
+LEGACY_DEBIT_BUYING_POWER = sqlalchemy.text(
+    "UPDATE portfolios SET buying_power = buying_power - :cost WHERE port_id = :port_id"
+)
+LEGACY_CREDIT_BUYING_POWER = sqlalchemy.text(
+    "UPDATE portfolios SET buying_power = buying_power + :proceeds WHERE port_id = :port_id"
+)
+LEGACY_LOCK_HOLDING = sqlalchemy.text(
+    "SELECT * FROM portfolio_holdings WHERE port_id = :port_id AND stock_id = :stock_id FOR UPDATE"
+)
+LEGACY_UPSERT_HOLDING = sqlalchemy.text(
+    """
+    INSERT INTO portfolio_holdings (port_id, stock_id, num_shares, total_shares_value)
+    VALUES (:port_id, :stock_id, :num_shares, :total_value)
+    ON CONFLICT (port_id, stock_id) DO UPDATE
+    SET num_shares = portfolio_holdings.num_shares + EXCLUDED.num_shares,
+        total_shares_value = portfolio_holdings.total_shares_value + EXCLUDED.total_shares_value
+    """
+)
+LEGACY_REDUCE_HOLDING = sqlalchemy.text(
+    """
+    UPDATE portfolio_holdings
+    SET num_shares = num_shares - :requested_shares,
+        total_shares_value = total_shares_value - :value
+    WHERE port_id = :port_id AND stock_id = :stock_id
+    """
+)
+LEGACY_DELETE_HOLDING = sqlalchemy.text(
+    "DELETE FROM portfolio_holdings WHERE port_id = :port_id AND stock_id = :stock_id"
+)
+LEGACY_INSERT_TRANSACTION = sqlalchemy.text(
+    """
+    INSERT INTO transactions (port_id, user_id, stock_id, transaction_type, change)
+    VALUES (:port_id, :user_id, :stock_id, :transaction_type, :change)
+    RETURNING transaction_id
+    """
+)
+
+SHARES = Decimal("0.01")
+
+
+def legacy_buy(connection, portfolio, ticker: str):
+    stock = connection.execute(LEGACY_FIND_STOCK, {"ticker": ticker}).first()
+    price = (
+        connection.execute(LEGACY_GET_PRICE, {"stock_id": stock.stock_id})
+        .first()
+        .price_per_share
+    )
+    total_cost = (SHARES * price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    connection.execute(LEGACY_LOCK_BUYING_POWER, {"port_id": portfolio.port_id}).first()
+    connection.execute(
+        LEGACY_DEBIT_BUYING_POWER, {"cost": total_cost, "port_id": portfolio.port_id}
+    )
+    connection.execute(
+        LEGACY_LOCK_HOLDING, {"port_id": portfolio.port_id, "stock_id": stock.stock_id}
+    )
+    connection.execute(
+        LEGACY_UPSERT_HOLDING,
+        {
+            "port_id": portfolio.port_id,
+            "stock_id": stock.stock_id,
+            "num_shares": SHARES,
+            "total_value": total_cost,
+        },
+    )
+    connection.execute(
+        LEGACY_INSERT_TRANSACTION,
+        {
+            "port_id": portfolio.port_id,
+            "user_id": portfolio.user_id,
+            "stock_id": stock.stock_id,
+            "transaction_type": "buy",
+            "change": total_cost,
+        },
+    ).first()
+
+
+def legacy_sell(connection, portfolio, ticker: str):
+    stock = connection.execute(LEGACY_FIND_STOCK_PRICE, {"ticker": ticker}).first()
+    proceeds = (SHARES * stock.price_per_share).quantize(
+        Decimal("0.01"), rounding=ROUND_HALF_UP
+    )
+    holding = connection.execute(
+        LEGACY_LOCK_HOLDING, {"port_id": portfolio.port_id, "stock_id": stock.stock_id}
+    ).first()
+    if holding.num_shares - SHARES > 0:
+        connection.execute(
+            LEGACY_REDUCE_HOLDING,
+            {
+                "requested_shares": SHARES,
+                "value": proceeds,
+                "port_id": portfolio.port_id,
+                "stock_id": stock.stock_id,
+            },
+        )
+    else:
+        connection.execute(
+            LEGACY_DELETE_HOLDING,
+            {"port_id": portfolio.port_id, "stock_id": stock.stock_id},
+        )
+    connection.execute(LEGACY_LOCK_BUYING_POWER, {"port_id": portfolio.port_id}).first()
+    connection.execute(
+        LEGACY_CREDIT_BUYING_POWER, {"proceeds": proceeds, "port_id": portfolio.port_id}
+    )
+    connection.execute(
+        LEGACY_INSERT_TRANSACTION,
+        {
+            "port_id": portfolio.port_id,
+            "user_id": portfolio.user_id,
+            "stock_id": stock.stock_id,
+            "transaction_type": "sell",
+            "change": proceeds,
+        },
+    ).first()
+
+
+def single_trade(statement):
+    def run(connection, portfolio, ticker: str):
+        trade = connection.execute(
+            statement,
+            {
+                "port_id": portfolio.port_id,
+                "user_id": portfolio.user_id,
+                "ticker": ticker,
+                "num_shares": SHARES,
+                "dollars": None,
+            },
+        ).one()
+        assert trade.status == "ok", trade.status
+
+    return run
+
+
+MODES = {
+    "legacy": ("REPEATABLE READ", legacy_buy, legacy_sell),
+    "single": (
+        "READ COMMITTED",
+        single_trade(trade_engine.BUY),
+        single_trade(trade_engine.SELL),
+    ),
+}
+
+
+def client_loop(
+    engine,
+    mode: str,
+    portfolio,
+    ticker: str,
+    stop_at: float,
+    latencies: list,
+    errors: dict,
+):
+    isolation_level, buy, sell = MODES[mode]
+    with engine.connect().execution_options(
+        isolation_level=isolation_level
+    ) as connection:
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            transaction = connection.begin()
+            try:
+                buy(connection, portfolio, ticker)
+                sell(connection, portfolio, ticker)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            finally:
+                transaction.rollback()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+def run(engine, mode: str, portfolios: Sequence, ticker: str, duration: float):
+    latencies: list[float] = []
+    errors: dict = {}
+    stop_at = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=client_loop,
+            args=(engine, mode, portfolio, ticker, stop_at, latencies, errors),
+        )
+        for portfolio in portfolios
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(
+        f"{mode:<8}clients={len(portfolios):>4}  pairs/s={len(latencies) / duration:9.1f}"
+        f"  p50={percentile(latencies, 50):8.2f} ms  p99={percentile(latencies, 99):8.2f} ms  errors={errors}"
+    )
+
+
+def main(clients: list[int], duration: float, ticker: str):
+    engine = sqlalchemy.create_engine(
+        db.connection_url, pool_size=max(clients), max_overflow=0
+    )
+    sqlalchemy.event.listen(engine, "do_execute", statements.do_execute)
+
+    with engine.connect() as connection:
+        portfolios = connection.execute(
+            sqlalchemy.text(
+                "SELECT port_id, user_id FROM portfolios WHERE buying_power >= 10 LIMIT :limit"
+            ),
+            {"limit": max(clients)},
+        ).fetchall()
+    if len(portfolios) < max(clients):
+        raise SystemExit(
+            f"Needs {max(clients)} portfolios with buying power >= 10, found {len(portfolios)}"
+        )
+
+    for count in clients:
+        for mode in MODES:
+            run(engine, mode, portfolios[:count], ticker, duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[1, 8, 32],
+        help="concurrent connections",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds per mode and client count"
+    )
+    parser.add_argument(
+        "--ticker", default="RIOT", help="stock to trade, needs a price under 1000"
+    )
+    args = parser.parse_args()
+    main(args.clients, args.duration, args.ticker)
@@ -0,0 +1,41 @@
+import time
+
+from src.cache import TTLCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is now the least recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_expires_entries():
+    cache = TTLCache(max_size=10, ttl_seconds=0.01)
+    cache.set("token", 42)
+    time.sleep(0.02)
+    assert cache.get("token") is None
+
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 1
+
+
+def test_cache_invalidate_where():
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+    cache.set("t1", 1)
+    cache.set("t2", 1)
+    cache.set("t3", 2)
+
+    assert cache.invalidate_where(lambda user_id: user_id == 1) == 2
+    assert cache.get("t1") is None
+    assert cache.get("t3") == 2
+    assert cache.invalidate("t3")
+    assert not cache.invalidate("t3")
@@ -0,0 +1,24 @@
+import numpy as np
+
+from src.downsample import lttb
+
+
+def test_keeps_ends_and_spikes():
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.zeros(10_000)
+    y[4_321] = 50.0
+    y[7_000] = -30.0
+
+    picked = lttb(x, y, 100)
+
+    assert len(picked) == 100
+    assert picked[0] == 0 and picked[-1] == 9_999
+    assert np.all(np.diff(picked) > 0)
+    assert 4_321 in picked and 7_000 in picked
+
+
+def test_short_series_are_returned_whole():
+    x = np.arange(5, dtype=np.float64)
+
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x, 2).tolist() == [0, 4]
@@ -0,0 +1,12 @@
+from src.metrics import Histogram
+
+
+def test_histogram_buckets_observations():
+    histogram = Histogram(buckets=(1, 10, 100))
+    for value in (0.5, 1, 5, 50, 500):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 5
+    assert snapshot["max"] == 500
+    assert snapshot["buckets"] == {"1": 2, "10": 1, "100": 1, "+Inf": 1}
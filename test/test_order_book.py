@@ -0,0 +1,35 @@
+from src.order_book import OrderBook
+
+
+def test_crossed_orders_come_out_in_price_time_priority():
+    book = OrderBook()
+    book.add(1, "buy", 10_000)
+    book.add(2, "buy", 10_500)
+    book.add(3, "buy", 10_500)
+    book.add(4, "buy", 9_000)
+    book.add(5, "sell", 11_000)
+
+    # Best bid first, earlier order first at the same price
+    assert book.crossed(10_000) == [2, 3, 1]
+    assert book.best_bid() == 9_000
+    assert len(book) == 2
+
+    assert book.crossed(11_000) == [5]
+    assert book.best_ask() is None
+
+
+def test_discarded_orders_are_skipped():
+    book = OrderBook()
+    for order_id in range(1, 6):
+        book.add(order_id, "sell", 100 * order_id)
+    book.discard(1)
+    book.discard(3)
+
+    assert 3 not in book
+    assert book.best_ask() == 200
+    assert book.crossed(400) == [2, 4]
+
+    # Dead entries outnumbering live ones rebuild the heaps
+    book.discard(5)
+    assert len(book) == 0
+    assert book.crossed(1_000) == []
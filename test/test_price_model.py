@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.price_model import PriceModel, load_correlation
+
+
+def test_matrix_correlates_only_its_tickers(tmp_path):
+    path = tmp_path / "correlation.csv"
+    path.write_text("AAPL,MSFT\n1,0.8\n0.8,1\n")
+    model = PriceModel(matrix=load_correlation(str(path)), seed=1)
+
+    # Tickers in a different order than the file, plus one it does not list
+    shocks = np.array([model.shocks(["TSLA", "MSFT", "AAPL"]) for _ in range(20_000)])
+    correlation = np.corrcoef(shocks.T)
+
+    assert correlation[1, 2] == pytest.approx(0.8, abs=0.03)
+    assert correlation[0, 1] == pytest.approx(0.0, abs=0.03)
+    assert shocks.std(axis=0) == pytest.approx(np.ones(3), abs=0.03)
+
+
+def test_jumps_keep_the_expected_price():
+    model = PriceModel(
+        correlation=0.3, jump_probability=0.1, jump_mean=-0.2, jump_stddev=0.05, seed=2
+    )
+    prices = np.full(1_000, 100.0)
+
+    moved = np.concatenate(
+        [
+            model.step(["X"] * 1_000, prices, np.zeros(1_000), np.full(1_000, 0.02))
+            for _ in range(50)
+        ]
+    )
+
+    assert moved.mean() == pytest.approx(100.0, rel=0.005)
+    assert moved.min() > 0
+
+
+def test_invalid_matrix_is_rejected(tmp_path):
+    path = tmp_path / "correlation.csv"
+    path.write_text("AAPL,MSFT\n1,1.5\n1.5,1\n")
+
+    with pytest.raises(ValueError, match="positive definite"):
+        load_correlation(str(path))